@@ -0,0 +1,89 @@
+from asgiref.sync import sync_to_async
+from django.utils.functional import cached_property
+from .models import UserProfile, DoctorProfile, PatientProfile
+from . import profile_cache
+
+
+class Actor:
+    """The profile chain (UserProfile -> DoctorProfile/PatientProfile) of the requesting user.
+
+    Nothing is looked up until an attribute is first read; the whole chain is then
+    taken from the profile cache (or loaded with a single select_related query on a
+    miss) and reused for the rest of the request.
+    """
+
+    def __init__(self, user):
+        self.user = user
+
+    @cached_property
+    def _profile(self):
+        if not self.user.is_authenticated:
+            return None
+        profile = profile_cache.get_profile(self.user.pk)
+        if profile is None:
+            return None
+        # Reuse the already loaded auth user instead of joining it again
+        profile.user = self.user
+        return profile
+
+    @property
+    def has_profile(self):
+        return self._profile is not None
+
+    @property
+    def user_profile(self):
+        """The user's UserProfile; raises UserProfile.DoesNotExist if there is none"""
+        if self._profile is None:
+            raise UserProfile.DoesNotExist('User has no profile.')
+        return self._profile
+
+    @property
+    def user_type(self):
+        return self._profile.user_type if self._profile is not None else None
+
+    @property
+    def is_doctor(self):
+        return self.user_type == 'doctor'
+
+    @property
+    def is_patient(self):
+        return self.user_type == 'patient'
+
+    @property
+    def doctor_profile(self):
+        """The user's DoctorProfile; raises DoctorProfile.DoesNotExist if there is none"""
+        try:
+            return self.user_profile.doctor_info
+        except UserProfile.DoesNotExist:
+            raise DoctorProfile.DoesNotExist('User has no profile.')
+
+    @property
+    def patient_profile(self):
+        """The user's PatientProfile; raises PatientProfile.DoesNotExist if there is none"""
+        try:
+            return self.user_profile.patient_info
+        except UserProfile.DoesNotExist:
+            raise PatientProfile.DoesNotExist('User has no profile.')
+
+
+def get_actor(request):
+    """Return the request's Actor, creating it when ActorMiddleware has not run"""
+    actor = getattr(request, 'actor', None)
+    if actor is None:
+        actor = request.actor = Actor(request.user)
+    return actor
+
+
+def _resolve_actor(request):
+    actor = get_actor(request)
+    actor.has_profile  # loads the auth user and the profile chain
+    return actor
+
+
+async def aget_actor(request):
+    """get_actor for async views.
+
+    The user and profile chain are loaded in a worker thread; afterwards
+    request.user and the actor's attributes can be read without queries.
+    """
+    return await sync_to_async(_resolve_actor)(request)
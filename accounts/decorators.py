@@ -0,0 +1,18 @@
+from functools import wraps
+from django.contrib.auth.views import redirect_to_login
+from .actor import aget_actor
+
+
+def async_login_required(view):
+    """login_required for async views (Django 4.2's decorator only supports sync ones).
+
+    The user and profile chain are resolved before the view runs, so it can use
+    request.user and request.actor freely.
+    """
+    @wraps(view)
+    async def wrapper(request, *args, **kwargs):
+        actor = await aget_actor(request)
+        if not actor.user.is_authenticated:
+            return redirect_to_login(request.get_full_path())
+        return await view(request, *args, **kwargs)
+    return wrapper
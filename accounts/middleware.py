@@ -0,0 +1,28 @@
+from asgiref.sync import iscoroutinefunction, markcoroutinefunction
+from .actor import Actor
+
+
+class ActorMiddleware:
+    """Attach a lazily resolved profile chain to every request as ``request.actor``.
+
+    Must be placed after AuthenticationMiddleware. Supports both sync and async
+    requests, so it does not force ASGI requests through a worker thread.
+    """
+
+    sync_capable = True
+    async_capable = True
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+        if iscoroutinefunction(get_response):
+            markcoroutinefunction(self)
+
+    def __call__(self, request):
+        if iscoroutinefunction(self):
+            return self.__acall__(request)
+        request.actor = Actor(request.user)
+        return self.get_response(request)
+
+    async def __acall__(self, request):
+        request.actor = Actor(request.user)
+        return await self.get_response(request)
@@ -0,0 +1,70 @@
+import threading
+from django.conf import settings
+from django.core.cache import caches
+from .models import UserProfile
+
+# Bump the version whenever the cached profile models change shape
+CACHE_KEY = 'accounts:profile:v1:{}'
+
+_MISSING = object()
+
+
+class ProfileCacheStats:
+    """Process-wide hit/miss counters for the profile cache"""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+
+    def record(self, hit):
+        with self._lock:
+            if hit:
+                self.hits += 1
+            else:
+                self.misses += 1
+
+    def reset(self):
+        with self._lock:
+            self.hits = 0
+            self.misses = 0
+
+    def as_dict(self):
+        with self._lock:
+            total = self.hits + self.misses
+            return {
+                'hits': self.hits,
+                'misses': self.misses,
+                'hit_rate': self.hits / total if total else 0.0,
+            }
+
+
+stats = ProfileCacheStats()
+
+
+def _cache():
+    return caches[getattr(settings, 'PROFILE_CACHE_ALIAS', 'default')]
+
+
+def get_profile(user_id):
+    """Return the UserProfile (with doctor_info/patient_info loaded) for a user id, or None.
+
+    Users without a profile are cached as well so that staff accounts do not
+    query on every request either.
+    """
+    cache = _cache()
+    key = CACHE_KEY.format(user_id)
+    profile = cache.get(key, _MISSING)
+    if profile is not _MISSING:
+        stats.record(hit=True)
+        return profile
+
+    stats.record(hit=False)
+    profile = UserProfile.objects.select_related('doctor_info', 'patient_info').filter(user_id=user_id).first()
+    cache.set(key, profile, getattr(settings, 'PROFILE_CACHE_TIMEOUT', 3600))
+    return profile
+
+
+def invalidate(user_id):
+    """Drop the cached profile chain for a user id"""
+    _cache().delete(CACHE_KEY.format(user_id))
@@ -0,0 +1,41 @@
+from django.contrib.auth.models import User
+from django.db import transaction
+from django.db.models.signals import post_save, post_delete
+from django.dispatch import receiver
+from .models import UserProfile, DoctorProfile, PatientProfile
+from . import profile_cache
+
+
+def _invalidate(user_id):
+    if user_id is None:
+        return
+    profile_cache.invalidate(user_id)
+    # Drop it again once the transaction commits, in case a concurrent request
+    # re-cached the old rows before the write became visible
+    transaction.on_commit(lambda: profile_cache.invalidate(user_id))
+
+
+@receiver(post_save, sender=User)
+@receiver(post_delete, sender=User)
+def invalidate_user(sender, instance, **kwargs):
+    """Invalidate when a user row is (re)created or removed, since ids can be reused"""
+    if kwargs.get('created', True):
+        _invalidate(instance.pk)
+
+
+@receiver(post_save, sender=UserProfile)
+@receiver(post_delete, sender=UserProfile)
+def invalidate_user_profile(sender, instance, **kwargs):
+    _invalidate(instance.user_id)
+
+
+@receiver(post_save, sender=DoctorProfile)
+@receiver(post_delete, sender=DoctorProfile)
+@receiver(post_save, sender=PatientProfile)
+@receiver(post_delete, sender=PatientProfile)
+def invalidate_role_profile(sender, instance, **kwargs):
+    if sender.user_profile.is_cached(instance):
+        user_id = instance.user_profile.user_id
+    else:
+        user_id = UserProfile.objects.filter(pk=instance.user_profile_id).values_list('user_id', flat=True).first()
+    _invalidate(user_id)
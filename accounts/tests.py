@@ -1,7 +1,9 @@
 from django.test import TestCase, Client
-from django.contrib.auth.models import User
+from django.contrib.auth.models import User, AnonymousUser
 from django.urls import reverse
 from accounts.models import UserProfile, DoctorProfile, PatientProfile
+from accounts.actor import Actor
+from accounts import profile_cache
 
 
 class LoginRedirectTests(TestCase):
@@ -274,3 +276,123 @@ class LoginRedirectTests(TestCase):
         # Should redirect to dashboard, not admin
         self.assertRedirects(response, reverse('dashboard:home'))
 
+
+class ActorTests(TestCase):
+    """Test cases for the request-scoped profile chain resolver"""
+    
+    def setUp(self):
+        """Set up test data"""
+        self.doctor_user = User.objects.create_user(
+            username='doctoruser',
+            password='testpass123',
+            first_name='Doctor',
+            last_name='User'
+        )
+        self.doctor_user_profile = UserProfile.objects.create(
+            user=self.doctor_user,
+            user_type='doctor'
+        )
+        self.doctor_profile = DoctorProfile.objects.create(
+            user_profile=self.doctor_user_profile,
+            specialization='Cardiology',
+            qualification='MD',
+            license_number='DOC123'
+        )
+        self.user_without_profile = User.objects.create_user(
+            username='incompleteuser',
+            password='testpass123'
+        )
+    
+    def test_profile_chain_resolved_in_one_query(self):
+        """Test that the whole profile chain is loaded with a single query"""
+        actor = Actor(self.doctor_user)
+        with self.assertNumQueries(1):
+            self.assertTrue(actor.is_doctor)
+            self.assertEqual(actor.user_profile, self.doctor_user_profile)
+            self.assertEqual(actor.doctor_profile, self.doctor_profile)
+            self.assertEqual(actor.user_profile.user, self.doctor_user)
+        with self.assertRaises(PatientProfile.DoesNotExist):
+            actor.patient_profile
+    
+    def test_missing_profile(self):
+        """Test that a user without profile has no profile chain"""
+        actor = Actor(self.user_without_profile)
+        self.assertFalse(actor.has_profile)
+        self.assertIsNone(actor.user_type)
+        with self.assertRaises(UserProfile.DoesNotExist):
+            actor.user_profile
+        with self.assertRaises(DoctorProfile.DoesNotExist):
+            actor.doctor_profile
+    
+    def test_anonymous_user_does_not_query(self):
+        """Test that anonymous users never hit the database"""
+        actor = Actor(AnonymousUser())
+        with self.assertNumQueries(0):
+            self.assertFalse(actor.has_profile)
+    
+    def test_dashboard_resolves_profile_once(self):
+        """Test that the dashboard does not repeat profile lookups"""
+        self.client.force_login(self.doctor_user)
+        with self.assertNumQueries(7):
+            # session + auth user + profile chain + stats aggregate + DoctorStats + 2 lists
+            response = self.client.get(reverse('dashboard:home'))
+        self.assertEqual(response.status_code, 200)
+
+
+class ProfileCacheTests(TestCase):
+    """Test cases for the cached per-user profile chain"""
+    
+    def setUp(self):
+        """Set up test data"""
+        self.patient_user = User.objects.create_user(
+            username='patientuser',
+            password='testpass123',
+            first_name='Patient',
+            last_name='User'
+        )
+        self.patient_user_profile = UserProfile.objects.create(
+            user=self.patient_user,
+            user_type='patient'
+        )
+        self.patient_profile = PatientProfile.objects.create(
+            user_profile=self.patient_user_profile,
+            blood_group='O+'
+        )
+        profile_cache.stats.reset()
+    
+    def test_second_lookup_is_served_from_cache(self):
+        """Test that a cached profile chain resolves without queries"""
+        with self.assertNumQueries(1):
+            Actor(self.patient_user).patient_profile
+        with self.assertNumQueries(0):
+            actor = Actor(self.patient_user)
+            self.assertTrue(actor.is_patient)
+            self.assertEqual(actor.patient_profile, self.patient_profile)
+        self.assertEqual(profile_cache.stats.as_dict()['hits'], 1)
+        self.assertEqual(profile_cache.stats.as_dict()['misses'], 1)
+    
+    def test_profile_save_invalidates_cache(self):
+        """Test that saving any part of the profile chain invalidates the cache"""
+        Actor(self.patient_user).user_profile
+        self.patient_profile.blood_group = 'A-'
+        self.patient_profile.save()
+        with self.assertNumQueries(1):
+            self.assertEqual(Actor(self.patient_user).patient_profile.blood_group, 'A-')
+        
+        self.patient_user_profile.phone_number = '5550100'
+        self.patient_user_profile.save()
+        self.assertEqual(Actor(self.patient_user).user_profile.phone_number, '5550100')
+    
+    def test_profile_delete_invalidates_cache(self):
+        """Test that deleting a profile invalidates the cache"""
+        Actor(self.patient_user).user_profile
+        self.patient_user_profile.delete()
+        self.assertFalse(Actor(self.patient_user).has_profile)
+    
+    def test_steady_state_dashboard_skips_profile_query(self):
+        """Test that repeated page loads resolve the profile from cache"""
+        self.client.force_login(self.patient_user)
+        self.client.get(reverse('dashboard:home'))
+        profile_cache.stats.reset()
+        self.client.get(reverse('dashboard:home'))
+        self.assertEqual(profile_cache.stats.as_dict(), {'hits': 1, 'misses': 0, 'hit_rate': 1.0})
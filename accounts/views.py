@@ -12,16 +12,14 @@ def root_redirect(request):
     """Redirect root URL to dashboard for authenticated users with valid profiles, login otherwise"""
     if request.user.is_authenticated:
         # Check if user has a valid profile before redirecting to dashboard
-        try:
-            UserProfile.objects.get(user=request.user)
+        if request.actor.has_profile:
             return redirect('dashboard:home')
-        except UserProfile.DoesNotExist:
-            # No profile - check if admin/staff
-            if request.user.is_superuser or request.user.is_staff:
-                return redirect(reverse('admin:index'))
-            # User is authenticated but has no profile - redirect to login
-            # The login view will handle logging them out
-            return redirect('accounts:login')
+        # No profile - check if admin/staff
+        if request.user.is_superuser or request.user.is_staff:
+            return redirect(reverse('admin:index'))
+        # User is authenticated but has no profile - redirect to login
+        # The login view will handle logging them out
+        return redirect('accounts:login')
     return redirect('accounts:login')
 
 
@@ -96,16 +94,14 @@ def user_login(request):
     """User login view"""
     if request.user.is_authenticated:
         # Check if user has a valid profile before redirecting to dashboard
-        try:
-            UserProfile.objects.get(user=request.user)
+        if request.actor.has_profile:
             return redirect('dashboard:home')
-        except UserProfile.DoesNotExist:
-            # No profile - check if admin/staff
-            if request.user.is_superuser or request.user.is_staff:
-                return redirect(reverse('admin:index'))
-            # User is authenticated but has no profile - log them out
-            logout(request)
-            messages.error(request, 'Your account profile could not be found. Please contact administrator.')
+        # No profile - check if admin/staff
+        if request.user.is_superuser or request.user.is_staff:
+            return redirect(reverse('admin:index'))
+        # User is authenticated but has no profile - log them out
+        logout(request)
+        messages.error(request, 'Your account profile could not be found. Please contact administrator.')
     
     if request.method == 'POST':
         username = request.POST.get('username')
@@ -144,19 +140,18 @@ def user_logout(request):
 @login_required
 def profile(request):
     """User profile view"""
-    user_profile = UserProfile.objects.get(user=request.user)
+    actor = request.actor
+    user_profile = actor.user_profile
     
-    if user_profile.user_type == 'doctor':
-        doctor_profile = DoctorProfile.objects.get(user_profile=user_profile)
+    if actor.is_doctor:
         context = {
             'user_profile': user_profile,
-            'doctor_profile': doctor_profile,
+            'doctor_profile': actor.doctor_profile,
         }
     else:
-        patient_profile = PatientProfile.objects.get(user_profile=user_profile)
         context = {
             'user_profile': user_profile,
-            'patient_profile': patient_profile,
+            'patient_profile': actor.patient_profile,
         }
     
     return render(request, 'accounts/profile.html', context)
@@ -0,0 +1,127 @@
+"""
+Booking service: reserves appointment slots atomically.
+
+The availability check alone is not enough: two concurrent requests may both
+see a slot as free. The unique_active_appointment_slot constraint lets only one
+of them write it, and the loser retries its check and gets SlotConflict instead
+of a double booking or a raw IntegrityError. Lock errors from a busy database
+are retried the same way, with jittered backoff.
+"""
+import random
+import time
+from datetime import timedelta
+from django.conf import settings
+from django.db import IntegrityError, OperationalError, transaction
+from django.utils import timezone
+from .models import BLOCKING_STATUSES, Appointment
+from .slots import SlotIndex, get_booking_days
+
+
+class SlotConflict(Exception):
+    """The requested slot cannot be booked"""
+
+    def __init__(self, message='This time slot is not available. Please choose another time.'):
+        super().__init__(message)
+
+
+def _slot_taken(doctor, day, start, exclude=None):
+    taken = Appointment.objects.filter(
+        doctor=doctor,
+        appointment_date=day,
+        appointment_time=start,
+        status__in=BLOCKING_STATUSES,
+    )
+    if exclude is not None:
+        taken = taken.exclude(pk=exclude)
+    return taken.exists()
+
+
+def check_slot(doctor, day, start, exclude=None, now=None):
+    """Raise SlotConflict unless ``start`` on ``day`` is bookable with ``doctor``.
+
+    Doctors with a published schedule must be booked on a free slot within the
+    booking horizon; doctors without one only need the exact time to be free.
+    """
+    now = now or timezone.localtime()
+    index = SlotIndex.build([doctor.id], start_date=day, days=1, now=now, exclude=exclude)
+    if index.has_availability(doctor.id):
+        horizon = now.date() + timedelta(days=get_booking_days() - 1)
+        if day > horizon or not index.is_free(doctor.id, day, start):
+            raise SlotConflict()
+    elif _slot_taken(doctor, day, start, exclude):
+        raise SlotConflict()
+
+
+def _reserve(check, operation):
+    """Run ``check`` then ``operation`` in one transaction, retrying lock errors and constraint clashes.
+
+    A clash means another request wrote the slot after our check; the retry
+    re-runs the check, which now raises SlotConflict.
+    """
+    attempts = getattr(settings, 'APPOINTMENT_BOOKING_ATTEMPTS', 10)
+    for attempt in range(attempts):
+        try:
+            with transaction.atomic():
+                check()
+                return operation()
+        except (IntegrityError, OperationalError):
+            # IntegrityError: the slot was taken concurrently; OperationalError: the database was locked
+            if attempt == attempts - 1:
+                raise
+            time.sleep(random.uniform(0, min(0.1, 0.002 * 2 ** attempt)))
+
+
+def book(patient, doctor, day, start, reason):
+    """Create a scheduled appointment; raises SlotConflict if the slot is taken"""
+    return _reserve(
+        lambda: check_slot(doctor, day, start),
+        lambda: Appointment.objects.create(
+            patient=patient,
+            doctor=doctor,
+            appointment_date=day,
+            appointment_time=start,
+            reason=reason,
+            status='scheduled',
+        ),
+    )
+
+
+def reschedule(appointment, day, start):
+    """Move an appointment to a new slot; raises SlotConflict and leaves it unchanged if taken"""
+    previous = (appointment.appointment_date, appointment.appointment_time, appointment.status)
+
+    def move():
+        appointment.appointment_date = day
+        appointment.appointment_time = start
+        appointment.status = 'rescheduled'
+        appointment.save()
+        return appointment
+
+    try:
+        return _reserve(lambda: check_slot(appointment.doctor, day, start, exclude=appointment.pk), move)
+    except Exception:
+        appointment.appointment_date, appointment.appointment_time, appointment.status = previous
+        raise
+
+
+def change_status(appointment, status, notes=''):
+    """Update an appointment's status; raises SlotConflict when reactivating a slot that was rebooked"""
+    previous = (appointment.status, appointment.notes)
+
+    def check():
+        if status in BLOCKING_STATUSES and _slot_taken(appointment.doctor, appointment.appointment_date,
+                                                       appointment.appointment_time, exclude=appointment.pk):
+            raise SlotConflict()
+
+    def update():
+        appointment.status = status
+        if notes:
+            appointment.notes = notes
+        appointment.save()
+        return appointment
+
+    try:
+        return _reserve(check, update)
+    except Exception:
+        appointment.status, appointment.notes = previous
+        raise
@@ -0,0 +1,17 @@
+# Generated by Django 4.2.28 on 2026-10-17 17:39
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('appointments', '0004_query_indexes'),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='appointment',
+            index=models.Index(fields=['doctor', 'patient'], name='appt_doctor_patient_idx'),
+        ),
+    ]
@@ -4,6 +4,13 @@ from accounts.models import DoctorProfile, PatientProfile
 
 # Create your models here.
 
+# Appointment statuses that occupy their time slot
+BLOCKING_STATUSES = ['scheduled', 'confirmed', 'rescheduled']
+
+# Appointment statuses listed as upcoming on the dashboards
+UPCOMING_STATUSES = ['scheduled', 'confirmed']
+
+
 class Appointment(models.Model):
     """Appointment model for managing patient-doctor appointments"""
     STATUS_CHOICES = [
@@ -26,7 +33,36 @@ class Appointment(models.Model):
     
     class Meta:
         ordering = ['-appointment_date', '-appointment_time']
-        unique_together = ['doctor', 'appointment_date', 'appointment_time']
+        indexes = [
+            # Keyset pagination of a doctor's or patient's appointment history
+            models.Index(fields=['doctor', 'appointment_date', 'appointment_time', 'id'], name='appt_doctor_seek_idx'),
+            models.Index(fields=['patient', 'appointment_date', 'appointment_time', 'id'], name='appt_patient_seek_idx'),
+            # Per-status lists, e.g. a patient's completed appointments
+            models.Index(fields=['doctor', 'status', 'appointment_date', 'appointment_time'], name='appt_doctor_status_idx'),
+            models.Index(fields=['patient', 'status', 'appointment_date', 'appointment_time'], name='appt_patient_status_idx'),
+            # Whether a doctor has seen a patient before (distinct patient counts)
+            models.Index(fields=['doctor', 'patient'], name='appt_doctor_patient_idx'),
+            # Upcoming appointments on the dashboards; partial where the backend supports it
+            models.Index(
+                fields=['doctor', 'appointment_date', 'appointment_time'],
+                condition=models.Q(status__in=UPCOMING_STATUSES),
+                name='appt_doctor_upcoming_idx',
+            ),
+            models.Index(
+                fields=['patient', 'appointment_date', 'appointment_time'],
+                condition=models.Q(status__in=UPCOMING_STATUSES),
+                name='appt_patient_upcoming_idx',
+            ),
+        ]
+        constraints = [
+            # Only active appointments reserve a slot, so a cancelled or completed
+            # booking does not keep the slot from being booked again
+            models.UniqueConstraint(
+                fields=['doctor', 'appointment_date', 'appointment_time'],
+                condition=models.Q(status__in=BLOCKING_STATUSES),
+                name='unique_active_appointment_slot',
+            ),
+        ]
     
     def __str__(self):
         return f"{self.patient} - {self.doctor} on {self.appointment_date} at {self.appointment_time}"
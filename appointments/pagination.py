@@ -0,0 +1,102 @@
+"""
+Keyset (seek) pagination.
+
+Pages are addressed by the sort key of their boundary row instead of an
+OFFSET, so every page is a single index seek plus ``per_page`` rows no matter
+how deep into the history it is. The sort key must be unique, which is why it
+always ends in the primary key.
+"""
+import base64
+import json
+from django.db.models import Q
+
+
+class KeysetPage:
+    """One page of results plus the cursors of its neighbours"""
+
+    def __init__(self, object_list, next_cursor=None, previous_cursor=None):
+        self.object_list = object_list
+        self.next_cursor = next_cursor
+        self.previous_cursor = previous_cursor
+
+    @property
+    def has_next(self):
+        return self.next_cursor is not None
+
+    @property
+    def has_previous(self):
+        return self.previous_cursor is not None
+
+    def __iter__(self):
+        return iter(self.object_list)
+
+    def __len__(self):
+        return len(self.object_list)
+
+
+class KeysetPaginator:
+    """Paginate ``queryset`` by ``keys`` (field names, '-' prefix for descending)"""
+
+    def __init__(self, queryset, keys, per_page=25):
+        self.queryset = queryset
+        self.keys = [(key.lstrip('-'), key.startswith('-')) for key in keys]
+        self.per_page = per_page
+
+    def encode(self, obj):
+        values = [str(getattr(obj, name)) for name, _ in self.keys]
+        return base64.urlsafe_b64encode(json.dumps(values).encode()).decode().rstrip('=')
+
+    def decode(self, cursor):
+        """Return the key values stored in ``cursor``; raises ValueError if it is malformed"""
+        try:
+            values = json.loads(base64.urlsafe_b64decode(cursor + '=' * (-len(cursor) % 4)))
+        except (TypeError, ValueError) as e:
+            raise ValueError('Invalid cursor') from e
+        if not isinstance(values, list) or len(values) != len(self.keys):
+            raise ValueError('Invalid cursor')
+        opts = self.queryset.model._meta
+        try:
+            return [opts.get_field(name).to_python(value) for (name, _), value in zip(self.keys, values)]
+        except Exception as e:
+            raise ValueError('Invalid cursor') from e
+
+    def _seek(self, values, forward):
+        """Rows strictly after (``forward``) or before the row whose keys are ``values``"""
+        condition = Q()
+        equal = Q()
+        for (name, descending), value in zip(self.keys, values):
+            lookup = 'lt' if descending == forward else 'gt'
+            condition |= equal & Q(**{f'{name}__{lookup}': value})
+            equal &= Q(**{name: value})
+        # The OR chain alone is no index range; this bound on the first key makes the seek one
+        (name, descending), value = self.keys[0], values[0]
+        return Q(**{f"{name}__{'lte' if descending == forward else 'gte'}": value}) & condition
+
+    def _ordering(self, forward):
+        return [f"{'-' if descending == forward else ''}{name}" for name, descending in self.keys]
+
+    def page(self, after=None, before=None):
+        """Return the page following cursor ``after`` or preceding cursor ``before``.
+
+        With neither, the first page is returned. Malformed cursors raise ValueError.
+        """
+        forward = before is None
+        queryset = self.queryset
+        cursor = after if forward else before
+        if cursor:
+            queryset = queryset.filter(self._seek(self.decode(cursor), forward))
+        rows = list(queryset.order_by(*self._ordering(forward))[:self.per_page + 1])
+        has_more = len(rows) > self.per_page
+        rows = rows[:self.per_page]
+
+        if not forward:
+            rows.reverse()
+        if not rows:
+            return KeysetPage(rows)
+        has_next = has_more if forward else True
+        has_previous = bool(cursor) if forward else has_more
+        return KeysetPage(
+            rows,
+            next_cursor=self.encode(rows[-1]) if has_next else None,
+            previous_cursor=self.encode(rows[0]) if has_previous else None,
+        )
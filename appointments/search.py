@@ -0,0 +1,59 @@
+"""
+Earliest-available-slot search across many doctors.
+
+Matching doctors are never loaded one by one: availability and bookings for
+all of them come from the two SlotIndex queries (filtered by a subquery), the
+per-doctor free-slot streams are merged lazily with a heap, and only the
+doctors that make it into the top-k are fetched for display. The date range is
+scanned in doubling windows, so the query count grows with log(days) at most
+and never with the number of doctors.
+"""
+import heapq
+from collections import namedtuple
+from datetime import timedelta
+from itertools import islice
+from django.utils import timezone
+from accounts.models import DoctorProfile
+from .slots import SlotIndex, get_booking_days
+
+SlotMatch = namedtuple('SlotMatch', ['doctor', 'date', 'time'])
+
+
+def matching_doctors(specialization=None, max_fee=None):
+    """Available doctors filtered by specialization (case-insensitive) and maximum fee"""
+    doctors = DoctorProfile.objects.filter(available=True)
+    if specialization:
+        doctors = doctors.filter(specialization__iexact=specialization)
+    if max_fee is not None:
+        doctors = doctors.filter(consultation_fee__lte=max_fee)
+    return doctors
+
+
+def _tagged_slots(index, doctor_id):
+    for day, start in index.iter_free_slots(doctor_id):
+        yield day, start, doctor_id
+
+
+def earliest_slots(specialization=None, start_date=None, end_date=None, max_fee=None, limit=10, now=None):
+    """Return up to ``limit`` SlotMatch tuples, earliest first, across all matching doctors"""
+    now = now or timezone.localtime()
+    start_date = start_date or now.date()
+    end_date = end_date or start_date + timedelta(days=get_booking_days() - 1)
+    if end_date < start_date or limit <= 0:
+        return []
+
+    # Search a doubling date window so that a busy calendar only loads the
+    # bookings of the first few days when those already hold enough free slots
+    doctor_ids = matching_doctors(specialization, max_fee).values('id')
+    found = []
+    window_start, window_days = start_date, 1
+    while window_start <= end_date and len(found) < limit:
+        window_end = min(window_start + timedelta(days=window_days - 1), end_date)
+        index = SlotIndex.build(doctor_ids, start_date=window_start, days=(window_end - window_start).days + 1, now=now)
+        streams = [_tagged_slots(index, doctor_id) for doctor_id in index.weekly]
+        found.extend(islice(heapq.merge(*streams), limit - len(found)))
+        window_start = window_end + timedelta(days=1)
+        window_days *= 2
+
+    doctors = DoctorProfile.objects.select_related('user_profile__user').in_bulk({doctor_id for _, _, doctor_id in found})
+    return [SlotMatch(doctors[doctor_id], day, start) for day, start, doctor_id in found]
@@ -0,0 +1,175 @@
+"""
+Slot engine: expands DoctorAvailability windows into bookable slots and
+subtracts booked appointments.
+
+A SlotIndex is built for a set of doctors and a date range with exactly two
+queries (one for availability, one for appointments). After that every lookup
+is answered from sorted per-doctor arrays with bisect, so listing the free
+slots of hundreds of doctors costs no further database work.
+"""
+from bisect import bisect_left, bisect_right
+from collections import defaultdict
+from datetime import time, timedelta
+from django.conf import settings
+from django.utils import timezone
+from django.utils.dateparse import parse_date, parse_time
+from .models import BLOCKING_STATUSES, Appointment, DoctorAvailability
+
+
+def get_slot_minutes():
+    return getattr(settings, 'APPOINTMENT_SLOT_MINUTES', 30)
+
+
+def get_booking_days():
+    return getattr(settings, 'APPOINTMENT_BOOKING_DAYS', 14)
+
+
+def parse_slot(date_value, time_value):
+    """Parse posted date/time strings into a (date, time) pair, or None when invalid"""
+    try:
+        day = parse_date(date_value or '')
+        start = parse_time(time_value or '')
+    except ValueError:
+        return None
+    if day is None or start is None:
+        return None
+    return day, start.replace(second=0, microsecond=0)
+
+
+def _to_minutes(value):
+    return value.hour * 60 + value.minute
+
+
+def _to_time(minutes):
+    return time(minutes // 60, minutes % 60)
+
+
+def _merge_windows(windows):
+    """Merge overlapping (start, end) minute windows into a sorted disjoint list"""
+    merged = []
+    for start, end in sorted(windows):
+        if merged and start <= merged[-1][1]:
+            merged[-1] = (merged[-1][0], max(merged[-1][1], end))
+        else:
+            merged.append((start, end))
+    return merged
+
+
+def expand_windows(windows, slot_minutes):
+    """Expand availability windows into sorted slot start offsets (minutes after midnight)"""
+    starts = []
+    for start, end in _merge_windows(windows):
+        starts.extend(range(start, end - slot_minutes + 1, slot_minutes))
+    return starts
+
+
+class SlotIndex:
+    """Free-slot lookup structure for a set of doctors over a fixed date range"""
+
+    def __init__(self, start_date, end_date, slot_minutes=None, now=None):
+        self.start_date = start_date
+        self.end_date = end_date
+        self.slot_minutes = slot_minutes or get_slot_minutes()
+        self.now = now or timezone.localtime()
+        # doctor_id -> weekday -> sorted slot starts (minutes)
+        self.weekly = defaultdict(dict)
+        # doctor_id -> date -> sorted booked start offsets (minutes)
+        self.booked = defaultdict(lambda: defaultdict(list))
+
+    @classmethod
+    def build(cls, doctors, start_date=None, days=None, slot_minutes=None, now=None, exclude=None):
+        """Load availability and bookings for ``doctors`` (ids or queryset) over ``days`` days.
+
+        ``exclude`` is an appointment id whose booking is ignored, e.g. the one being rescheduled.
+        """
+        now = now or timezone.localtime()
+        start_date = start_date or now.date()
+        end_date = start_date + timedelta(days=(days or get_booking_days()) - 1)
+        index = cls(start_date, end_date, slot_minutes, now)
+
+        windows = defaultdict(lambda: defaultdict(list))
+        availability = DoctorAvailability.objects.filter(
+            doctor__in=doctors,
+            is_available=True,
+        ).values_list('doctor_id', 'day_of_week', 'start_time', 'end_time')
+        for doctor_id, day, start, end in availability:
+            windows[doctor_id][day].append((_to_minutes(start), _to_minutes(end)))
+        for doctor_id, days_map in windows.items():
+            for day, day_windows in days_map.items():
+                index.weekly[doctor_id][day] = expand_windows(day_windows, index.slot_minutes)
+
+        booked = Appointment.objects.filter(
+            doctor__in=doctors,
+            appointment_date__range=(start_date, end_date),
+            status__in=BLOCKING_STATUSES,
+        )
+        if exclude is not None:
+            booked = booked.exclude(pk=exclude)
+        booked = booked.values_list('doctor_id', 'appointment_date', 'appointment_time')
+        for doctor_id, day, start in booked:
+            index.add_booking(doctor_id, day, start)
+        return index
+
+    def add_booking(self, doctor_id, day, start):
+        """Mark ``start`` on ``day`` as taken for a doctor"""
+        day_bookings = self.booked[doctor_id][day]
+        minutes = _to_minutes(start)
+        day_bookings.insert(bisect_left(day_bookings, minutes), minutes)
+
+    def has_availability(self, doctor_id):
+        return bool(self.weekly.get(doctor_id))
+
+    def _is_booked(self, doctor_id, day, minutes):
+        day_bookings = self.booked.get(doctor_id, {}).get(day)
+        if not day_bookings:
+            return False
+        # A booking at t occupies [t, t + slot); it overlaps a slot starting at s when |s - t| < slot
+        lo = bisect_right(day_bookings, minutes - self.slot_minutes)
+        return lo < len(day_bookings) and day_bookings[lo] < minutes + self.slot_minutes
+
+    def is_free(self, doctor_id, day, start):
+        """Whether ``start`` on ``day`` is a bookable, unbooked slot for the doctor"""
+        if not (max(self.start_date, self.now.date()) <= day <= self.end_date):
+            return False
+        minutes = _to_minutes(start)
+        starts = self.weekly.get(doctor_id, {}).get(day.weekday(), [])
+        i = bisect_left(starts, minutes)
+        if i == len(starts) or starts[i] != minutes:
+            return False
+        if day == self.now.date() and minutes <= _to_minutes(self.now):
+            return False
+        return not self._is_booked(doctor_id, day, minutes)
+
+    def iter_free_slots(self, doctor_id, start_date=None, end_date=None):
+        """Yield free (date, time) slots for a doctor in chronological order"""
+        weekly = self.weekly.get(doctor_id)
+        if not weekly:
+            return
+        day = max(start_date or self.start_date, self.start_date)
+        end_date = min(end_date or self.end_date, self.end_date)
+        today = self.now.date()
+        now_minutes = _to_minutes(self.now)
+        while day <= end_date:
+            starts = weekly.get(day.weekday())
+            if starts and day >= today:
+                i = bisect_right(starts, now_minutes) if day == today else 0
+                for minutes in starts[i:]:
+                    if not self._is_booked(doctor_id, day, minutes):
+                        yield day, _to_time(minutes)
+            day += timedelta(days=1)
+
+    def free_slots(self, doctor_id, start_date=None, end_date=None, limit=None):
+        """Return free (date, time) slots for a doctor as a list, at most ``limit`` long"""
+        slots = []
+        for slot in self.iter_free_slots(doctor_id, start_date, end_date):
+            slots.append(slot)
+            if limit is not None and len(slots) >= limit:
+                break
+        return slots
+
+
+def free_slots_for_doctor(doctor, days=None, limit=None):
+    """Convenience wrapper: free slots for one doctor over the next ``days`` days"""
+    doctor_id = getattr(doctor, 'pk', doctor)
+    index = SlotIndex.build([doctor_id], days=days or get_booking_days())
+    return index.free_slots(doctor_id, limit=limit)
@@ -1,3 +1,427 @@
-from django.test import TestCase
+import threading
+import time as clock
+from datetime import date, datetime, time, timedelta
+from django.db import connection
+from django.test import TestCase, TransactionTestCase, Client
+from django.contrib.auth.models import User
+from django.urls import reverse
+from django.utils import timezone
+from accounts.models import UserProfile, DoctorProfile, PatientProfile
+from .models import Appointment, DoctorAvailability
+from . import booking
+from .booking import SlotConflict
+from .pagination import KeysetPaginator
+from .search import earliest_slots
+from .slots import SlotIndex, expand_windows, parse_slot
 
-# Create your tests here.
+
+def create_doctor(username, license_number, **kwargs):
+    user = User.objects.create_user(username=username, password='testpass123', first_name='Doc', last_name=username)
+    user_profile = UserProfile.objects.create(user=user, user_type='doctor')
+    return DoctorProfile.objects.create(
+        user_profile=user_profile,
+        specialization=kwargs.pop('specialization', 'General Medicine'),
+        qualification='MD',
+        license_number=license_number,
+        **kwargs
+    )
+
+
+def create_patient(username):
+    user = User.objects.create_user(username=username, password='testpass123', first_name='Pat', last_name=username)
+    user_profile = UserProfile.objects.create(user=user, user_type='patient')
+    return PatientProfile.objects.create(user_profile=user_profile)
+
+
+class SlotEngineTests(TestCase):
+    """Test cases for expanding availability into free slots"""
+
+    def setUp(self):
+        """Set up a doctor available Monday 09:00-11:00 and Wednesday 14:00-15:00"""
+        self.doctor = create_doctor('drslots', 'LIC-SLOT-1')
+        self.patient = create_patient('patslots')
+        DoctorAvailability.objects.create(doctor=self.doctor, day_of_week=0, start_time=time(9, 0), end_time=time(11, 0))
+        DoctorAvailability.objects.create(doctor=self.doctor, day_of_week=2, start_time=time(14, 0), end_time=time(15, 0))
+        # A Monday far enough ahead that "now" never interferes
+        self.monday = date(2030, 1, 7)
+        self.now = timezone.make_aware(datetime(2030, 1, 6, 12, 0))
+
+    def build(self, **kwargs):
+        return SlotIndex.build([self.doctor.id], start_date=self.monday, days=7, slot_minutes=30, now=self.now, **kwargs)
+
+    def test_expand_windows_merges_overlaps(self):
+        """Test that overlapping windows are merged before slicing"""
+        self.assertEqual(expand_windows([(540, 600), (570, 630)], 30), [540, 570, 600])
+        self.assertEqual(expand_windows([(540, 580)], 30), [540])
+
+    def test_free_slots_over_week(self):
+        """Test that all configured windows are expanded in order"""
+        slots = self.build().free_slots(self.doctor.id)
+        self.assertEqual(slots, [
+            (self.monday, time(9, 0)),
+            (self.monday, time(9, 30)),
+            (self.monday, time(10, 0)),
+            (self.monday, time(10, 30)),
+            (self.monday + timedelta(days=2), time(14, 0)),
+            (self.monday + timedelta(days=2), time(14, 30)),
+        ])
+
+    def test_booked_and_cancelled_appointments(self):
+        """Test that active bookings block their slot and cancelled ones do not"""
+        Appointment.objects.create(patient=self.patient, doctor=self.doctor, appointment_date=self.monday,
+                                   appointment_time=time(9, 30), reason='Checkup')
+        Appointment.objects.create(patient=self.patient, doctor=self.doctor, appointment_date=self.monday,
+                                   appointment_time=time(10, 0), reason='Checkup', status='cancelled')
+        index = self.build()
+        self.assertFalse(index.is_free(self.doctor.id, self.monday, time(9, 30)))
+        self.assertTrue(index.is_free(self.doctor.id, self.monday, time(10, 0)))
+        self.assertNotIn((self.monday, time(9, 30)), index.free_slots(self.doctor.id))
+
+    def test_off_grid_booking_blocks_overlapping_slots(self):
+        """Test that a booking between slot starts blocks both slots it overlaps"""
+        Appointment.objects.create(patient=self.patient, doctor=self.doctor, appointment_date=self.monday,
+                                   appointment_time=time(9, 15), reason='Checkup')
+        index = self.build()
+        self.assertFalse(index.is_free(self.doctor.id, self.monday, time(9, 0)))
+        self.assertFalse(index.is_free(self.doctor.id, self.monday, time(9, 30)))
+        self.assertTrue(index.is_free(self.doctor.id, self.monday, time(10, 0)))
+
+    def test_slots_outside_schedule_are_not_free(self):
+        """Test that times off the slot grid or outside availability are rejected"""
+        index = self.build()
+        self.assertFalse(index.is_free(self.doctor.id, self.monday, time(9, 10)))
+        self.assertFalse(index.is_free(self.doctor.id, self.monday, time(11, 0)))
+        self.assertFalse(index.is_free(self.doctor.id, self.monday + timedelta(days=1), time(9, 0)))
+
+    def test_past_slots_are_not_free(self):
+        """Test that slots earlier today are skipped"""
+        now = timezone.make_aware(datetime(2030, 1, 7, 9, 45))
+        index = SlotIndex.build([self.doctor.id], start_date=self.monday, days=1, slot_minutes=30, now=now)
+        self.assertEqual(index.free_slots(self.doctor.id), [(self.monday, time(10, 0)), (self.monday, time(10, 30))])
+
+    def test_build_uses_two_queries_for_many_doctors(self):
+        """Test that building and querying the index does not scale queries with doctors or days"""
+        doctors = [self.doctor] + [create_doctor(f'drslots{i}', f'LIC-SLOT-{i + 2}') for i in range(5)]
+        for doctor in doctors[1:]:
+            DoctorAvailability.objects.create(doctor=doctor, day_of_week=0, start_time=time(9, 0), end_time=time(12, 0))
+        with self.assertNumQueries(2):
+            index = SlotIndex.build(doctors, start_date=self.monday, days=28, now=self.now)
+            for doctor in doctors:
+                index.free_slots(doctor.id)
+        self.assertEqual(len(index.free_slots(doctors[1].id)), 4 * 6)
+
+    def test_parse_slot(self):
+        """Test that posted date/time strings are validated"""
+        self.assertEqual(parse_slot('2030-01-07', '09:30'), (date(2030, 1, 7), time(9, 30)))
+        self.assertIsNone(parse_slot('2030-02-30', '09:30'))
+        self.assertIsNone(parse_slot('', '09:30'))
+        self.assertIsNone(parse_slot('2030-01-07', None))
+
+
+class BookAppointmentTests(TestCase):
+    """Test cases for booking against the doctor's schedule"""
+
+    def setUp(self):
+        """Set up a scheduled doctor, an unscheduled doctor and a patient"""
+        self.client = Client()
+        self.doctor = create_doctor('drbook', 'LIC-BOOK-1')
+        self.unscheduled_doctor = create_doctor('drfree', 'LIC-BOOK-2')
+        self.patient = create_patient('patbook')
+        self.client.force_login(self.patient.user_profile.user)
+        self.day = timezone.localdate() + timedelta(days=1)
+        DoctorAvailability.objects.create(doctor=self.doctor, day_of_week=self.day.weekday(),
+                                          start_time=time(9, 0), end_time=time(10, 0))
+
+    def book(self, doctor, appointment_time):
+        return self.client.post(reverse('appointments:book'), {
+            'doctor': doctor.id,
+            'appointment_date': self.day.isoformat(),
+            'appointment_time': appointment_time,
+            'reason': 'Checkup',
+        })
+
+    def test_booking_page_lists_free_slots(self):
+        """Test that the booking page lists the scheduled doctor's free slots"""
+        response = self.client.get(reverse('appointments:book'))
+        self.assertEqual(response.status_code, 200)
+        doctor_slots = dict(response.context['doctor_slots'])
+        self.assertEqual(doctor_slots[self.doctor][:2], [(self.day, time(9, 0)), (self.day, time(9, 30))])
+        self.assertNotIn(self.unscheduled_doctor, doctor_slots)
+
+    def test_book_free_slot(self):
+        """Test that a free slot can be booked once"""
+        response = self.book(self.doctor, '09:30')
+        appointment = Appointment.objects.get(doctor=self.doctor)
+        self.assertRedirects(response, reverse('appointments:appointment_detail', args=[appointment.id]))
+
+        response = self.book(self.doctor, '09:30')
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(Appointment.objects.filter(doctor=self.doctor).count(), 1)
+
+    def test_book_outside_schedule_is_rejected(self):
+        """Test that times outside the doctor's availability are rejected"""
+        response = self.book(self.doctor, '15:00')
+        self.assertEqual(response.status_code, 200)
+        self.assertFalse(Appointment.objects.exists())
+
+    def test_book_invalid_time_is_rejected(self):
+        """Test that malformed input does not reach the database"""
+        response = self.book(self.doctor, 'soon')
+        self.assertEqual(response.status_code, 200)
+        self.assertFalse(Appointment.objects.exists())
+
+    def test_unscheduled_doctor_uses_collision_check(self):
+        """Test that doctors without a schedule can still be booked at any free time"""
+        self.book(self.unscheduled_doctor, '15:00')
+        self.assertEqual(Appointment.objects.filter(doctor=self.unscheduled_doctor).count(), 1)
+        response = self.book(self.unscheduled_doctor, '15:00')
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(Appointment.objects.filter(doctor=self.unscheduled_doctor).count(), 1)
+
+
+class EarliestSlotSearchTests(TestCase):
+    """Test cases for the multi-doctor earliest slot search"""
+
+    def setUp(self):
+        """Set up three doctors whose Monday schedules interleave"""
+        self.cardio_early = create_doctor('drcardio1', 'LIC-SRCH-1', specialization='Cardiology', consultation_fee=100)
+        self.cardio_late = create_doctor('drcardio2', 'LIC-SRCH-2', specialization='Cardiology', consultation_fee=300)
+        self.derm = create_doctor('drderm', 'LIC-SRCH-3', specialization='Dermatology', consultation_fee=50)
+        for doctor, start in [(self.cardio_early, 9), (self.cardio_late, 8), (self.derm, 7)]:
+            DoctorAvailability.objects.create(doctor=doctor, day_of_week=0, start_time=time(start, 0), end_time=time(start + 1, 0))
+        self.monday = date(2030, 1, 7)
+        self.now = timezone.make_aware(datetime(2030, 1, 6, 12, 0))
+
+    def search(self, **kwargs):
+        return earliest_slots(start_date=self.monday, end_date=self.monday + timedelta(days=6), now=self.now, **kwargs)
+
+    def test_results_are_merged_across_doctors(self):
+        """Test that slots from all matching doctors come back in time order"""
+        matches = self.search(specialization='cardiology', limit=3)
+        self.assertEqual([(m.doctor, m.time) for m in matches], [
+            (self.cardio_late, time(8, 0)),
+            (self.cardio_late, time(8, 30)),
+            (self.cardio_early, time(9, 0)),
+        ])
+
+    def test_fee_filter_and_booked_slots(self):
+        """Test that the fee cap applies and booked slots are skipped"""
+        patient = create_patient('patsearch')
+        Appointment.objects.create(patient=patient, doctor=self.cardio_early, appointment_date=self.monday,
+                                   appointment_time=time(9, 0), reason='Checkup')
+        matches = self.search(specialization='Cardiology', max_fee=150, limit=5)
+        self.assertEqual([(m.doctor, m.time) for m in matches], [(self.cardio_early, time(9, 30))])
+
+    def test_query_count_is_independent_of_doctor_count(self):
+        """Test that the search uses bulk queries rather than one per doctor"""
+        with self.assertNumQueries(3):
+            matches = self.search(limit=4)
+        self.assertEqual(len(matches), 4)
+        self.assertEqual(matches[0].doctor, self.derm)
+        # The whole week is scanned in windows of 1, 2 and 4 days
+        with self.assertNumQueries(7):
+            matches = self.search(limit=10)
+        self.assertEqual(len(matches), 6)
+
+    def test_search_endpoint(self):
+        """Test the JSON search endpoint and its parameter validation"""
+        patient = create_patient('patsearchapi')
+        self.client.force_login(patient.user_profile.user)
+        day = timezone.localdate() + timedelta(days=1)
+        DoctorAvailability.objects.create(doctor=self.derm, day_of_week=day.weekday(), start_time=time(13, 0), end_time=time(13, 30))
+        response = self.client.get(reverse('appointments:search_slots'), {
+            'specialization': 'Dermatology',
+            'start_date': day.isoformat(),
+            'end_date': day.isoformat(),
+        })
+        self.assertEqual(response.status_code, 200)
+        results = response.json()['results']
+        self.assertEqual(results[-1]['doctor_id'], self.derm.id)
+        self.assertEqual(results[-1]['time'], '13:00')
+
+        response = self.client.get(reverse('appointments:search_slots'), {'start_date': 'tomorrow'})
+        self.assertEqual(response.status_code, 400)
+        for max_fee in ['NaN', 'sNaN', 'Infinity']:
+            response = self.client.get(reverse('appointments:search_slots'), {'max_fee': max_fee})
+            self.assertEqual(response.status_code, 400, max_fee)
+
+
+class BookingServiceTests(TestCase):
+    """Test cases for the atomic booking service"""
+
+    def setUp(self):
+        """Set up a scheduled doctor and two patients"""
+        self.doctor = create_doctor('drservice', 'LIC-SVC-1')
+        self.patient = create_patient('patservice1')
+        self.other_patient = create_patient('patservice2')
+        self.day = timezone.localdate() + timedelta(days=1)
+        DoctorAvailability.objects.create(doctor=self.doctor, day_of_week=self.day.weekday(),
+                                          start_time=time(9, 0), end_time=time(10, 0))
+
+    def test_conflicting_insert_raises_slot_conflict(self):
+        """Test that a clash caught by the database surfaces as SlotConflict"""
+        booking.book(self.patient, self.doctor, self.day, time(9, 0), 'Checkup')
+        checks = []
+
+        def stale_check():
+            # The first check passes as if it ran before the other booking committed
+            checks.append(True)
+            if len(checks) > 1:
+                booking.check_slot(self.doctor, self.day, time(9, 0))
+
+        with self.assertRaises(SlotConflict):
+            booking._reserve(
+                stale_check,
+                lambda: Appointment.objects.create(patient=self.other_patient, doctor=self.doctor,
+                                                   appointment_date=self.day, appointment_time=time(9, 0), reason='Race'),
+            )
+        self.assertEqual(len(checks), 2)
+        self.assertEqual(Appointment.objects.count(), 1)
+
+    def test_cancelled_slot_can_be_rebooked(self):
+        """Test that cancelling frees the slot at the database level"""
+        first = booking.book(self.patient, self.doctor, self.day, time(9, 0), 'Checkup')
+        booking.change_status(first, 'cancelled')
+        second = booking.book(self.other_patient, self.doctor, self.day, time(9, 0), 'Checkup')
+        self.assertEqual(second.status, 'scheduled')
+        with self.assertRaises(SlotConflict):
+            booking.change_status(first, 'scheduled')
+        first.refresh_from_db()
+        self.assertEqual(first.status, 'cancelled')
+
+    def test_reschedule(self):
+        """Test that rescheduling checks the new slot and ignores the appointment's own booking"""
+        first = booking.book(self.patient, self.doctor, self.day, time(9, 0), 'Checkup')
+        booking.book(self.other_patient, self.doctor, self.day, time(9, 30), 'Checkup')
+        with self.assertRaises(SlotConflict):
+            booking.reschedule(first, self.day, time(9, 30))
+        self.assertEqual(first.appointment_time, time(9, 0))
+        booking.reschedule(first, self.day, time(9, 0))
+        first.refresh_from_db()
+        self.assertEqual(first.status, 'rescheduled')
+
+    def test_past_and_out_of_horizon_slots_are_rejected(self):
+        """Test that scheduled doctors cannot be booked in the past or beyond the horizon"""
+        with self.assertRaises(SlotConflict):
+            booking.book(self.patient, self.doctor, self.day - timedelta(days=7), time(9, 0), 'Checkup')
+        with self.assertRaises(SlotConflict):
+            booking.book(self.patient, self.doctor, self.day + timedelta(days=364), time(9, 0), 'Checkup')
+
+
+class ConcurrentBookingTests(TransactionTestCase):
+    """Stress test: many threads booking the same slot at once"""
+
+    THREADS = 16
+
+    def setUp(self):
+        """Set up one scheduled doctor and one patient per thread"""
+        self.doctor = create_doctor('drrace', 'LIC-RACE-1')
+        self.patients = [create_patient(f'patrace{i}') for i in range(self.THREADS)]
+        self.day = timezone.localdate() + timedelta(days=1)
+        DoctorAvailability.objects.create(doctor=self.doctor, day_of_week=self.day.weekday(),
+                                          start_time=time(9, 0), end_time=time(10, 0))
+
+    def test_one_slot_is_booked_exactly_once(self):
+        """Test that simultaneous bookings yield one success and clean conflicts"""
+        barrier = threading.Barrier(self.THREADS)
+        outcomes = []
+
+        def attempt(patient):
+            try:
+                barrier.wait()
+                booking.book(patient, self.doctor, self.day, time(9, 0), 'Race')
+                outcomes.append('booked')
+            except SlotConflict:
+                outcomes.append('conflict')
+            except Exception as e:
+                outcomes.append(repr(e))
+            finally:
+                connection.close()
+
+        threads = [threading.Thread(target=attempt, args=(patient,)) for patient in self.patients]
+        started = clock.perf_counter()
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        elapsed = clock.perf_counter() - started
+
+        self.assertEqual(outcomes.count('booked'), 1, outcomes)
+        self.assertEqual(outcomes.count('conflict'), self.THREADS - 1, outcomes)
+        self.assertEqual(Appointment.objects.filter(doctor=self.doctor).count(), 1)
+        self.assertLess(elapsed, 30)
+
+
+class AppointmentListPaginationTests(TestCase):
+    """Test cases for the keyset-paginated appointment list"""
+
+    def setUp(self):
+        """Set up a doctor with 7 appointments over 4 days, two per day at 09:00 and 10:00"""
+        self.doctor = create_doctor('drpages', 'LIC-PAGE-1')
+        self.patient = create_patient('patpages')
+        self.start = date(2030, 1, 1)
+        for i in range(7):
+            Appointment.objects.create(
+                patient=self.patient, doctor=self.doctor,
+                appointment_date=self.start + timedelta(days=i // 2), appointment_time=time(9 + i % 2, 0),
+                reason='Checkup', status='completed' if i % 3 == 0 else 'scheduled',
+            )
+        self.newest_first = list(Appointment.objects.order_by('-appointment_date', '-appointment_time', '-id'))
+
+    def paginator(self, per_page=3):
+        return KeysetPaginator(Appointment.objects.all(), ['-appointment_date', '-appointment_time', '-id'], per_page)
+
+    def test_walk_forward_and_back(self):
+        """Test that following cursors visits every row once and can return"""
+        paginator = self.paginator()
+        first = paginator.page()
+        self.assertFalse(first.has_previous)
+        second = paginator.page(after=first.next_cursor)
+        third = paginator.page(after=second.next_cursor)
+        self.assertFalse(third.has_next)
+        self.assertEqual(list(first) + list(second) + list(third), self.newest_first)
+
+        back = paginator.page(before=third.previous_cursor)
+        self.assertEqual(list(back), list(second))
+        self.assertEqual(list(paginator.page(before=back.previous_cursor)), list(first))
+
+    def test_ties_on_date_and_time_are_broken_by_id(self):
+        """Test that rows sharing date and time are neither skipped nor repeated"""
+        Appointment.objects.create(patient=self.patient, doctor=self.doctor, appointment_date=self.start,
+                                   appointment_time=time(9, 0), reason='Walk-in', status='cancelled')
+        expected = list(Appointment.objects.order_by('-appointment_date', '-appointment_time', '-id'))
+        paginator = self.paginator(per_page=1)
+        seen, page = [], paginator.page()
+        while True:
+            seen.extend(page)
+            if not page.has_next:
+                break
+            page = paginator.page(after=page.next_cursor)
+        self.assertEqual(seen, expected)
+
+    def test_invalid_cursor(self):
+        """Test that malformed cursors are rejected"""
+        with self.assertRaises(ValueError):
+            self.paginator().page(after='not-a-cursor')
+
+    def test_list_view_filters_and_constant_queries(self):
+        """Test the list view's filters and that a deep page costs the same queries as the first"""
+        self.client.force_login(self.doctor.user_profile.user)
+        url = reverse('appointments:appointment_list')
+        with self.settings(APPOINTMENT_LIST_PAGE_SIZE=2):
+            response = self.client.get(url, {'status': 'scheduled', 'date_from': '2030-01-02'})
+            self.assertEqual(
+                [a.id for a in response.context['appointments']],
+                [a.id for a in self.newest_first if a.status == 'scheduled' and a.appointment_date >= date(2030, 1, 2)][:2],
+            )
+            self.assertIn('status=scheduled', response.context['filter_query'])
+
+            response = self.client.get(url)
+            cursor = response.context['page'].next_cursor
+            with self.assertNumQueries(3):
+                # session + auth user + one page query (the profile chain is cached)
+                response = self.client.get(url, {'after': cursor})
+            self.assertEqual(list(response.context['appointments']), self.newest_first[2:4])
+
+            response = self.client.get(url, {'after': 'garbage'})
+            self.assertEqual(list(response.context['appointments']), self.newest_first[:2])
@@ -6,8 +6,14 @@ app_name = 'appointments'
 urlpatterns = [
     path('', views.appointment_list, name='appointment_list'),
     path('book/', views.book_appointment, name='book'),
+    path('search/', views.search_slots, name='search_slots'),
     path('<int:pk>/', views.appointment_detail, name='appointment_detail'),
     path('<int:pk>/cancel/', views.cancel_appointment, name='cancel'),
     path('<int:pk>/reschedule/', views.reschedule_appointment, name='reschedule'),
     path('<int:pk>/update-status/', views.update_appointment_status, name='update_status'),
 ]
+
+# Async variants, served instead of the views above under ASGI (see healthcare_system.asgi_urls)
+async_urlpatterns = [
+    path('', views.appointment_list_async, name='appointment_list'),
+]
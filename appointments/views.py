@@ -1,79 +1,149 @@
+from decimal import Decimal, InvalidOperation
+from urllib.parse import urlencode
+from asgiref.sync import sync_to_async
 from django.shortcuts import render, redirect, get_object_or_404
+from django.http import JsonResponse
 from django.contrib.auth.decorators import login_required
 from django.contrib import messages
+from django.conf import settings
 from django.utils import timezone
+from django.utils.dateparse import parse_date
 from datetime import datetime, timedelta
-from accounts.models import UserProfile, DoctorProfile, PatientProfile
+from accounts.decorators import async_login_required
+from accounts.models import DoctorProfile
 from .models import Appointment, DoctorAvailability
+from .slots import SlotIndex, get_booking_days, parse_slot
+from .booking import SlotConflict
+from . import booking
+from .search import earliest_slots
+from .pagination import KeysetPaginator
 
 # Create your views here.
 
-@login_required
-def appointment_list(request):
-    """List all appointments for the current user"""
-    user_profile = UserProfile.objects.get(user=request.user)
-    
-    if user_profile.user_type == 'doctor':
-        doctor_profile = DoctorProfile.objects.get(user_profile=user_profile)
-        appointments = Appointment.objects.filter(doctor=doctor_profile)
+def _appointment_list_paginator(request):
+    """The keyset paginator over the user's filtered appointments, and the applied filters"""
+    actor = request.actor
+    if actor.is_doctor:
+        appointments = Appointment.objects.filter(doctor=actor.doctor_profile).select_related('patient__user_profile__user')
     else:
-        patient_profile = PatientProfile.objects.get(user_profile=user_profile)
-        appointments = Appointment.objects.filter(patient=patient_profile)
+        appointments = Appointment.objects.filter(patient=actor.patient_profile).select_related('doctor__user_profile__user')
     
+    # Filters
+    filters = {}
+    status = request.GET.get('status', '')
+    if status in dict(Appointment.STATUS_CHOICES):
+        appointments = appointments.filter(status=status)
+        filters['status'] = status
+    date_from = _date_filter(request.GET, 'date_from')
+    if date_from:
+        appointments = appointments.filter(appointment_date__gte=date_from)
+        filters['date_from'] = date_from.isoformat()
+    date_to = _date_filter(request.GET, 'date_to')
+    if date_to:
+        appointments = appointments.filter(appointment_date__lte=date_to)
+        filters['date_to'] = date_to.isoformat()
+    
+    paginator = KeysetPaginator(
+        appointments,
+        ['-appointment_date', '-appointment_time', '-id'],
+        per_page=getattr(settings, 'APPOINTMENT_LIST_PAGE_SIZE', 25),
+    )
+    return paginator, filters
+
+
+def _appointment_list_page(request, paginator):
+    try:
+        return paginator.page(after=request.GET.get('after'), before=request.GET.get('before'))
+    except ValueError:
+        return paginator.page()
+
+
+def _render_appointment_list(request, page, filters):
     context = {
-        'appointments': appointments,
-        'user_profile': user_profile,
+        'appointments': page.object_list,
+        'page': page,
+        'filters': filters,
+        'filter_query': urlencode(filters),
+        'status_choices': Appointment.STATUS_CHOICES,
+        'user_profile': request.actor.user_profile,
     }
     return render(request, 'appointments/appointment_list.html', context)
 
 
+@login_required
+def appointment_list(request):
+    """List the current user's appointments, newest first, one keyset page at a time"""
+    paginator, filters = _appointment_list_paginator(request)
+    page = _appointment_list_page(request, paginator)
+    return _render_appointment_list(request, page, filters)
+
+
+@async_login_required
+async def appointment_list_async(request):
+    """Async variant of appointment_list, served under ASGI"""
+    paginator, filters = _appointment_list_paginator(request)
+    page = await sync_to_async(_appointment_list_page)(request, paginator)
+    return _render_appointment_list(request, page, filters)
+
+
+def _date_filter(params, name):
+    """An optional date filter from the query string; malformed values are ignored"""
+    try:
+        return _parse_date_param(params, name)
+    except ValueError:
+        return None
+
+
 @login_required
 def book_appointment(request):
     """Book a new appointment"""
-    user_profile = UserProfile.objects.get(user=request.user)
+    actor = request.actor
+    user_profile = actor.user_profile
     
-    if user_profile.user_type != 'patient':
+    if not actor.is_patient:
         messages.error(request, 'Only patients can book appointments.')
         return redirect('dashboard:home')
     
-    patient_profile = PatientProfile.objects.get(user_profile=user_profile)
-    doctors = DoctorProfile.objects.filter(available=True)
+    patient_profile = actor.patient_profile
+    doctors = DoctorProfile.objects.filter(available=True).select_related('user_profile__user')
     
     if request.method == 'POST':
         doctor_id = request.POST.get('doctor')
-        appointment_date = request.POST.get('appointment_date')
-        appointment_time = request.POST.get('appointment_time')
         reason = request.POST.get('reason')
         
         doctor = get_object_or_404(DoctorProfile, id=doctor_id)
+        slot = parse_slot(request.POST.get('appointment_date'), request.POST.get('appointment_time'))
         
-        # Check if the time slot is available
-        existing_appointment = Appointment.objects.filter(
-            doctor=doctor,
-            appointment_date=appointment_date,
-            appointment_time=appointment_time,
-            status__in=['scheduled', 'confirmed']
-        ).exists()
+        if slot is None:
+            messages.error(request, 'Please enter a valid appointment date and time.')
+            return _render_booking_page(request, user_profile, doctors)
         
-        if existing_appointment:
-            messages.error(request, 'This time slot is already booked. Please choose another time.')
-            return render(request, 'appointments/book_appointment.html', {'doctors': doctors})
+        appointment_date, appointment_time = slot
         
-        # Create appointment
-        appointment = Appointment.objects.create(
-            patient=patient_profile,
-            doctor=doctor,
-            appointment_date=appointment_date,
-            appointment_time=appointment_time,
-            reason=reason,
-            status='scheduled'
-        )
+        try:
+            appointment = booking.book(patient_profile, doctor, appointment_date, appointment_time, reason)
+        except SlotConflict as e:
+            messages.error(request, str(e))
+            return _render_booking_page(request, user_profile, doctors)
         
         messages.success(request, 'Appointment booked successfully! You will receive a confirmation soon.')
         return redirect('appointments:appointment_detail', pk=appointment.id)
     
+    return _render_booking_page(request, user_profile, doctors)
+
+
+def _render_booking_page(request, user_profile, doctors):
+    """Render the booking form with the free slots of every listed doctor"""
+    doctors = list(doctors)
+    slot_index = SlotIndex.build(doctors)
+    doctor_slots = [
+        (doctor, slot_index.free_slots(doctor.id, limit=getattr(settings, 'APPOINTMENT_SLOTS_PER_DOCTOR', 50)))
+        for doctor in doctors
+        if slot_index.has_availability(doctor.id)
+    ]
     context = {
         'doctors': doctors,
+        'doctor_slots': doctor_slots,
         'user_profile': user_profile,
     }
     return render(request, 'appointments/book_appointment.html', context)
@@ -83,23 +153,21 @@ def book_appointment(request):
 def appointment_detail(request, pk):
     """View appointment details"""
     appointment = get_object_or_404(Appointment, pk=pk)
-    user_profile = UserProfile.objects.get(user=request.user)
+    actor = request.actor
     
     # Check if user has permission to view this appointment
-    if user_profile.user_type == 'doctor':
-        doctor_profile = DoctorProfile.objects.get(user_profile=user_profile)
-        if appointment.doctor != doctor_profile:
+    if actor.is_doctor:
+        if appointment.doctor_id != actor.doctor_profile.id:
             messages.error(request, 'You do not have permission to view this appointment.')
             return redirect('dashboard:home')
     else:
-        patient_profile = PatientProfile.objects.get(user_profile=user_profile)
-        if appointment.patient != patient_profile:
+        if appointment.patient_id != actor.patient_profile.id:
             messages.error(request, 'You do not have permission to view this appointment.')
             return redirect('dashboard:home')
     
     context = {
         'appointment': appointment,
-        'user_profile': user_profile,
+        'user_profile': actor.user_profile,
     }
     return render(request, 'appointments/appointment_detail.html', context)
 
@@ -108,12 +176,11 @@ def appointment_detail(request, pk):
 def cancel_appointment(request, pk):
     """Cancel an appointment"""
     appointment = get_object_or_404(Appointment, pk=pk)
-    user_profile = UserProfile.objects.get(user=request.user)
+    actor = request.actor
     
     # Check permissions
-    if user_profile.user_type == 'patient':
-        patient_profile = PatientProfile.objects.get(user_profile=user_profile)
-        if appointment.patient != patient_profile:
+    if actor.is_patient:
+        if appointment.patient_id != actor.patient_profile.id:
             messages.error(request, 'You do not have permission to cancel this appointment.')
             return redirect('dashboard:home')
     
@@ -125,7 +192,7 @@ def cancel_appointment(request, pk):
     
     context = {
         'appointment': appointment,
-        'user_profile': user_profile,
+        'user_profile': actor.user_profile,
     }
     return render(request, 'appointments/cancel_appointment.html', context)
 
@@ -134,40 +201,31 @@ def cancel_appointment(request, pk):
 def reschedule_appointment(request, pk):
     """Reschedule an appointment"""
     appointment = get_object_or_404(Appointment, pk=pk)
-    user_profile = UserProfile.objects.get(user=request.user)
+    actor = request.actor
     
     # Check permissions
-    if user_profile.user_type == 'patient':
-        patient_profile = PatientProfile.objects.get(user_profile=user_profile)
-        if appointment.patient != patient_profile:
+    if actor.is_patient:
+        if appointment.patient_id != actor.patient_profile.id:
             messages.error(request, 'You do not have permission to reschedule this appointment.')
             return redirect('dashboard:home')
     
     if request.method == 'POST':
-        new_date = request.POST.get('appointment_date')
-        new_time = request.POST.get('appointment_time')
+        slot = parse_slot(request.POST.get('appointment_date'), request.POST.get('appointment_time'))
         
-        # Check if the new time slot is available
-        existing_appointment = Appointment.objects.filter(
-            doctor=appointment.doctor,
-            appointment_date=new_date,
-            appointment_time=new_time,
-            status__in=['scheduled', 'confirmed']
-        ).exclude(id=appointment.id).exists()
-        
-        if existing_appointment:
-            messages.error(request, 'This time slot is already booked. Please choose another time.')
+        if slot is None:
+            messages.error(request, 'Please enter a valid appointment date and time.')
         else:
-            appointment.appointment_date = new_date
-            appointment.appointment_time = new_time
-            appointment.status = 'rescheduled'
-            appointment.save()
-            messages.success(request, 'Appointment rescheduled successfully.')
-            return redirect('appointments:appointment_detail', pk=appointment.id)
+            try:
+                booking.reschedule(appointment, *slot)
+            except SlotConflict as e:
+                messages.error(request, str(e))
+            else:
+                messages.success(request, 'Appointment rescheduled successfully.')
+                return redirect('appointments:appointment_detail', pk=appointment.id)
     
     context = {
         'appointment': appointment,
-        'user_profile': user_profile,
+        'user_profile': actor.user_profile,
     }
     return render(request, 'appointments/reschedule_appointment.html', context)
 
@@ -176,14 +234,13 @@ def reschedule_appointment(request, pk):
 def update_appointment_status(request, pk):
     """Update appointment status (for doctors)"""
     appointment = get_object_or_404(Appointment, pk=pk)
-    user_profile = UserProfile.objects.get(user=request.user)
+    actor = request.actor
     
-    if user_profile.user_type != 'doctor':
+    if not actor.is_doctor:
         messages.error(request, 'Only doctors can update appointment status.')
         return redirect('dashboard:home')
     
-    doctor_profile = DoctorProfile.objects.get(user_profile=user_profile)
-    if appointment.doctor != doctor_profile:
+    if appointment.doctor_id != actor.doctor_profile.id:
         messages.error(request, 'You do not have permission to update this appointment.')
         return redirect('dashboard:home')
     
@@ -191,17 +248,68 @@ def update_appointment_status(request, pk):
         new_status = request.POST.get('status')
         notes = request.POST.get('notes', '')
         
-        appointment.status = new_status
-        if notes:
-            appointment.notes = notes
-        appointment.save()
-        
-        messages.success(request, 'Appointment status updated successfully.')
+        try:
+            booking.change_status(appointment, new_status, notes)
+        except SlotConflict:
+            messages.error(request, 'This time slot has been booked again and cannot be reactivated.')
+        else:
+            messages.success(request, 'Appointment status updated successfully.')
         return redirect('appointments:appointment_detail', pk=appointment.id)
     
     context = {
         'appointment': appointment,
-        'user_profile': user_profile,
+        'user_profile': actor.user_profile,
     }
     return render(request, 'appointments/update_status.html', context)
 
+
+def _parse_date_param(params, name):
+    """Parse an optional ISO date query parameter; raises ValueError when malformed"""
+    if not params.get(name):
+        return None
+    value = parse_date(params[name])
+    if value is None:
+        raise ValueError(f'Invalid date for {name}')
+    return value
+
+
+@login_required
+def search_slots(request):
+    """JSON search for the earliest free slots across all matching doctors"""
+    params = request.GET
+    try:
+        start_date = _parse_date_param(params, 'start_date')
+        end_date = _parse_date_param(params, 'end_date')
+        max_fee = Decimal(params['max_fee']) if params.get('max_fee') else None
+        limit = int(params.get('limit', 10))
+    except (ValueError, InvalidOperation):
+        return JsonResponse({'error': 'Invalid search parameters.'}, status=400)
+    if max_fee is not None and not max_fee.is_finite():
+        return JsonResponse({'error': 'Invalid search parameters.'}, status=400)
+    
+    max_results = getattr(settings, 'APPOINTMENT_SEARCH_MAX_RESULTS', 50)
+    max_days = getattr(settings, 'APPOINTMENT_SEARCH_MAX_DAYS', 90)
+    today = timezone.localdate()
+    start_date = max(start_date or today, today)
+    end_date = end_date or start_date + timedelta(days=get_booking_days() - 1)
+    end_date = min(end_date, start_date + timedelta(days=max_days - 1))
+    
+    matches = earliest_slots(
+        specialization=params.get('specialization', '').strip() or None,
+        start_date=start_date,
+        end_date=end_date,
+        max_fee=max_fee,
+        limit=max(0, min(limit, max_results)),
+    )
+    results = [
+        {
+            'doctor_id': match.doctor.id,
+            'doctor_name': f"Dr. {match.doctor.user_profile.user.get_full_name()}",
+            'specialization': match.doctor.specialization,
+            'consultation_fee': str(match.doctor.consultation_fee),
+            'date': match.date.isoformat(),
+            'time': match.time.strftime('%H:%M'),
+        }
+        for match in matches
+    ]
+    return JsonResponse({'results': results})
@@ -0,0 +1,7 @@
+"""
+Performance benchmarks.
+
+Each module is a standalone script run from the project root, e.g.
+``python -m benchmarks.slot_search``. Benchmarks work on a throwaway test
+database, never on db.sqlite3.
+"""
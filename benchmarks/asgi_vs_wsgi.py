@@ -0,0 +1,194 @@
+"""
+Compare the sync views behind the WSGI entry point with their async variants
+behind the ASGI entry point under concurrent load.
+
+    python -m benchmarks.asgi_vs_wsgi [requests] [concurrency]
+
+Both applications are called in-process, exactly as a server would call them
+(a WSGI environ from a thread pool of ``concurrency`` workers; an ASGI scope
+from ``concurrency`` concurrent tasks), against the same test database. For
+every page, requests/sec and latency percentiles are reported for each path.
+"""
+import asyncio
+import sys
+import time as clock
+from concurrent.futures import ThreadPoolExecutor
+from datetime import time, timedelta
+from io import BytesIO
+from .common import setup_django, test_database, login_session, summarize, print_table
+
+setup_django()
+
+from django.conf import settings
+from django.contrib.auth.models import User
+from django.db import connection
+from django.urls import reverse
+from django.utils import timezone
+from accounts.models import UserProfile, DoctorProfile, PatientProfile
+from appointments.models import Appointment
+from consultation.models import ChatMessage
+from reports.models import MedicalRecord, Report
+from healthcare_system.asgi import application as asgi_application
+from healthcare_system.wsgi import application as wsgi_application
+
+PATIENTS = 50
+APPOINTMENTS_PER_PATIENT = 6
+MESSAGES = 200
+
+
+def seed():
+    """One doctor with a few hundred appointments, records and reports; returns (doctor, patient, appointment)"""
+    doctor_user = User.objects.create_user(username='benchdoctor', first_name='Doc', last_name='Bench')
+    doctor = DoctorProfile.objects.create(
+        user_profile=UserProfile.objects.create(user=doctor_user, user_type='doctor'),
+        specialization='General Practice', qualification='MD', license_number='BENCH',
+    )
+    today = timezone.localdate()
+    patients = []
+    for i in range(PATIENTS):
+        user = User.objects.create_user(username=f'benchpatient{i}', first_name='Patient', last_name=str(i))
+        patients.append(PatientProfile.objects.create(
+            user_profile=UserProfile.objects.create(user=user, user_type='patient')
+        ))
+    appointments = []
+    for i, patient in enumerate(patients):
+        for j in range(APPOINTMENTS_PER_PATIENT):
+            offset = j * PATIENTS + i - PATIENTS * APPOINTMENTS_PER_PATIENT // 2
+            appointments.append(Appointment(
+                patient=patient, doctor=doctor, appointment_date=today + timedelta(days=offset // 16),
+                appointment_time=time(8 + offset % 16 // 2, 30 * (offset % 2)), reason='Benchmark',
+                status='completed' if offset < 0 else 'scheduled',
+            ))
+    Appointment.objects.bulk_create(appointments)
+    for patient in patients:
+        record = MedicalRecord.objects.create(
+            patient=patient, doctor=doctor, diagnosis='Cold', symptoms='Cough', prescription='Rest'
+        )
+        Report.objects.create(
+            patient=patient, doctor=doctor, medical_record=record,
+            report_type='consultation', title='Summary', content='Rest',
+        )
+    appointment = Appointment.objects.filter(patient=patients[0]).first()
+    ChatMessage.objects.bulk_create(
+        ChatMessage(appointment=appointment, sender=doctor_user, message=f'Message {i}') for i in range(MESSAGES)
+    )
+    return doctor_user, patients[0].user_profile.user, appointment
+
+
+def wsgi_call(path, query, cookie):
+    environ = {
+        'REQUEST_METHOD': 'GET',
+        'PATH_INFO': path,
+        'QUERY_STRING': query,
+        'SERVER_NAME': 'testserver',
+        'SERVER_PORT': '80',
+        'SERVER_PROTOCOL': 'HTTP/1.1',
+        'HTTP_HOST': 'testserver',
+        'HTTP_COOKIE': cookie,
+        'wsgi.input': BytesIO(),
+        'wsgi.url_scheme': 'http',
+        'wsgi.errors': sys.stderr,
+    }
+    statuses = []
+    start = clock.perf_counter()
+    response = wsgi_application(environ, lambda status, headers, exc_info=None: statuses.append(status))
+    try:
+        for _ in response:
+            pass
+    finally:
+        response.close()
+    elapsed = (clock.perf_counter() - start) * 1000
+    return int(statuses[0].split()[0]), elapsed
+
+
+async def asgi_call(path, query, cookie):
+    scope = {
+        'type': 'http',
+        'asgi': {'version': '3.0'},
+        'http_version': '1.1',
+        'method': 'GET',
+        'scheme': 'http',
+        'path': path,
+        'root_path': '',
+        'query_string': query.encode(),
+        'headers': [(b'host', b'testserver'), (b'cookie', cookie.encode())],
+        'server': ('testserver', 80),
+        'client': ('127.0.0.1', 50000),
+    }
+    requested = False
+    statuses = []
+
+    async def receive():
+        nonlocal requested
+        if not requested:
+            requested = True
+            return {'type': 'http.request', 'body': b'', 'more_body': False}
+        await asyncio.Event().wait()  # never disconnects
+
+    async def send(message):
+        if message['type'] == 'http.response.start':
+            statuses.append(message['status'])
+
+    start = clock.perf_counter()
+    await asgi_application(scope, receive, send)
+    return statuses[0], (clock.perf_counter() - start) * 1000
+
+
+def run_wsgi(path, query, cookie, requests, concurrency):
+    def worker(_):
+        return wsgi_call(path, query, cookie)
+    start = clock.perf_counter()
+    with ThreadPoolExecutor(concurrency) as pool:
+        results = list(pool.map(worker, range(requests)))
+    return results, clock.perf_counter() - start
+
+
+async def run_asgi(path, query, cookie, requests, concurrency):
+    semaphore = asyncio.Semaphore(concurrency)
+
+    async def worker():
+        async with semaphore:
+            return await asgi_call(path, query, cookie)
+    start = clock.perf_counter()
+    results = await asyncio.gather(*(worker() for _ in range(requests)))
+    return results, clock.perf_counter() - start
+
+
+def main():
+    requests = int(sys.argv[1]) if len(sys.argv) > 1 else 300
+    concurrency = int(sys.argv[2]) if len(sys.argv) > 2 else 16
+    rows = []
+    with test_database():
+        doctor_user, patient_user, appointment = seed()
+        cookies = {
+            user: f'{settings.SESSION_COOKIE_NAME}={login_session(user)}' for user in (doctor_user, patient_user)
+        }
+        last_message = ChatMessage.objects.latest('id').id
+        pages = [
+            ('doctor dashboard', reverse('dashboard:home'), '', doctor_user),
+            ('patient dashboard', reverse('dashboard:home'), '', patient_user),
+            ('appointment list', reverse('appointments:appointment_list'), '', doctor_user),
+            ('report list', reverse('reports:reports_list'), '', doctor_user),
+            ('chat fetch (last 20)', reverse('consultation:chat_messages', args=[appointment.id]),
+             f'after={last_message - 20}', patient_user),
+        ]
+        connection.close()
+        for name, path, query, user in pages:
+            for label, run in (
+                ('wsgi', lambda: run_wsgi(path, query, cookies[user], requests, concurrency)),
+                ('asgi', lambda: asyncio.run(run_asgi(path, query, cookies[user], requests, concurrency))),
+            ):
+                run()  # warm up caches and connections
+                results, wall = run()
+                errors = sum(1 for status, _ in results if status != 200)
+                stats = summarize([elapsed for _, elapsed in results])
+                rows.append([name, label, f'{requests / wall:.0f}', f"{stats['median']:.1f}", f"{stats['p95']:.1f}",
+                             f"{stats['p99']:.1f}", errors])
+
+    print(f'{requests} requests per page, concurrency {concurrency}')
+    print()
+    print_table(['page', 'path', 'req/s', 'median ms', 'p95 ms', 'p99 ms', 'non-200'], rows)
+
+
+if __name__ == '__main__':
+    main()
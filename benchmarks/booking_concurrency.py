@@ -0,0 +1,111 @@
+"""
+Stress the booking path with many threads competing for the same slots.
+
+    python -m benchmarks.booking_concurrency [threads] [rounds]
+
+Each round releases all threads at once against a single slot. The booking
+service should produce exactly one booking per round and turn every other
+attempt into a clean SlotConflict; the legacy check-then-insert path is run
+for comparison and its raw database errors are counted.
+"""
+import sys
+import threading
+import time as clock
+from datetime import time, timedelta
+from .common import setup_django, test_database, print_table
+
+setup_django()
+
+from django.contrib.auth.models import User
+from django.db import connection
+from django.utils import timezone
+from accounts.models import UserProfile, DoctorProfile, PatientProfile
+from appointments import booking
+from appointments.booking import SlotConflict
+from appointments.models import BLOCKING_STATUSES, Appointment, DoctorAvailability
+
+SLOT_MINUTES = 30
+
+
+def legacy_book(patient, doctor, day, start):
+    """The original view logic: exists() followed by create()"""
+    if Appointment.objects.filter(doctor=doctor, appointment_date=day, appointment_time=start,
+                                  status__in=BLOCKING_STATUSES).exists():
+        raise SlotConflict()
+    Appointment.objects.create(patient=patient, doctor=doctor, appointment_date=day, appointment_time=start,
+                               reason='Benchmark')
+
+
+def run(book, doctor, patients, slots):
+    outcomes = {'booked': 0, 'conflict': 0, 'error': 0}
+    lock = threading.Lock()
+    barrier = threading.Barrier(len(patients))
+
+    def worker(patient):
+        try:
+            for day, start in slots:
+                barrier.wait()
+                try:
+                    book(patient, doctor, day, start)
+                    result = 'booked'
+                except SlotConflict:
+                    result = 'conflict'
+                except Exception:
+                    result = 'error'
+                with lock:
+                    outcomes[result] += 1
+        finally:
+            connection.close()
+
+    threads = [threading.Thread(target=worker, args=(patient,)) for patient in patients]
+    started = clock.perf_counter()
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    return outcomes, clock.perf_counter() - started
+
+
+def main(thread_count=32, rounds=16):
+    rows = []
+    with test_database():
+        user = User.objects.create(username='bench-doctor')
+        doctor = DoctorProfile.objects.create(
+            user_profile=UserProfile.objects.create(user=user, user_type='doctor'),
+            specialization='General Medicine',
+            qualification='MD',
+            license_number='BENCH-1',
+        )
+        patients = []
+        for i in range(thread_count):
+            user = User.objects.create(username=f'bench-patient-{i}')
+            patients.append(PatientProfile.objects.create(
+                user_profile=UserProfile.objects.create(user=user, user_type='patient')))
+
+        paths = [
+            ('service', lambda p, d, day, start: booking.book(p, d, day, start, 'Benchmark')),
+            ('legacy', legacy_book),
+        ]
+        for offset, (name, book) in enumerate(paths, start=1):
+            day = timezone.localdate() + timedelta(days=offset)
+            DoctorAvailability.objects.create(doctor=doctor, day_of_week=day.weekday(), start_time=time(0, 0),
+                                              end_time=time(23, 59))
+            slots = [(day, time(*divmod(i * SLOT_MINUTES, 60))) for i in range(rounds)]
+            outcomes, elapsed = run(book, doctor, patients, slots)
+            attempts = thread_count * rounds
+            rows.append([
+                name,
+                attempts,
+                outcomes['booked'],
+                outcomes['conflict'],
+                outcomes['error'],
+                f"{outcomes['conflict'] / attempts:.1%}",
+                f'{attempts / elapsed:.0f}',
+            ])
+
+    print(f'{thread_count} threads x {rounds} contended slots')
+    print_table(['path', 'attempts', 'booked', 'conflicts', 'raw errors', 'conflict rate', 'attempts/s'], rows)
+
+
+if __name__ == '__main__':
+    main(*[int(arg) for arg in sys.argv[1:3]])
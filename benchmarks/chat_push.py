@@ -0,0 +1,145 @@
+"""
+Load test for the chat push transport.
+
+    python -m benchmarks.chat_push [sessions] [messages] [sessions_per_chat]
+
+Opens ``sessions`` concurrent event streams against the ASGI application in
+this process, ``sessions_per_chat`` of them on each appointment (doctor and
+patient tabs alternately), then sends ``messages`` chat messages round-robin
+over the appointments and records, for every stream that receives a message,
+the time from just before the message was saved until its event was written
+to that stream.
+"""
+import asyncio
+import json
+import sys
+import time as clock
+from datetime import time, timedelta
+from .common import setup_django, test_database, login_session, summarize, print_table
+
+setup_django()
+
+from asgiref.sync import sync_to_async
+from django.conf import settings
+from django.contrib.auth.models import User
+from django.urls import reverse
+from django.utils import timezone
+from accounts.models import UserProfile, DoctorProfile, PatientProfile
+from appointments.models import Appointment
+from consultation.models import ChatMessage
+from healthcare_system.asgi import application
+
+
+def create_chats(count):
+    """Create ``count`` appointments; returns [(appointment, doctor_user, patient_user)]"""
+    chats = []
+    day = timezone.localdate() + timedelta(days=1)
+    for i in range(count):
+        doctor_user = User.objects.create_user(username=f'benchdoctor{i}', first_name='Doc', last_name=str(i))
+        doctor = DoctorProfile.objects.create(
+            user_profile=UserProfile.objects.create(user=doctor_user, user_type='doctor'),
+            specialization='General Practice', qualification='MD', license_number=f'BENCH{i}',
+        )
+        patient_user = User.objects.create_user(username=f'benchpatient{i}')
+        patient = PatientProfile.objects.create(
+            user_profile=UserProfile.objects.create(user=patient_user, user_type='patient')
+        )
+        appointment = Appointment.objects.create(
+            patient=patient, doctor=doctor, appointment_date=day, appointment_time=time(9, 0), reason='Benchmark'
+        )
+        chats.append((appointment, doctor_user, patient_user))
+    return chats
+
+
+class Session:
+    """One simulated EventSource connected straight to the ASGI application"""
+
+    def __init__(self, appointment_id, session_key, sent_at, latencies):
+        self.scope = {
+            'type': 'http',
+            'method': 'GET',
+            'path': reverse('consultation:chat_events', args=[appointment_id]),
+            'query_string': b'',
+            'headers': [(b'cookie', f'{settings.SESSION_COOKIE_NAME}={session_key}'.encode())],
+        }
+        self.sent_at = sent_at
+        self.latencies = latencies
+        self.ready = asyncio.Event()
+        self.closed = asyncio.Event()
+
+    async def receive(self):
+        await self.closed.wait()
+        return {'type': 'http.disconnect'}
+
+    async def send(self, message):
+        now = clock.perf_counter()
+        if message['type'] == 'http.response.start':
+            self.ready.set()
+            return
+        for line in message.get('body', b'').decode().splitlines():
+            if line.startswith('data: '):
+                text = json.loads(line[len('data: '):])['message']
+                self.latencies.append((now - self.sent_at[text]) * 1000)
+
+    async def run(self):
+        await application(self.scope, self.receive, self.send)
+
+
+async def run(chats, sessions_per_chat, messages):
+    sent_at = {}
+    latencies = []
+    sessions = []
+    for appointment, doctor_user, patient_user in chats:
+        keys = [await sync_to_async(login_session)(user) for user in (doctor_user, patient_user)]
+        for i in range(sessions_per_chat):
+            sessions.append(Session(appointment.id, keys[i % 2], sent_at, latencies))
+    tasks = [asyncio.ensure_future(session.run()) for session in sessions]
+    connect_start = clock.perf_counter()
+    await asyncio.gather(*(session.ready.wait() for session in sessions))
+    connect_ms = (clock.perf_counter() - connect_start) * 1000
+    # Let every stream finish its (empty) backlog query and start listening
+    await asyncio.sleep(0.5)
+
+    def send_message(appointment, sender, text):
+        # The event may be pushed before save() returns, so key the start time by text
+        sent_at[text] = clock.perf_counter()
+        ChatMessage.objects.create(appointment=appointment, sender=sender, message=text)
+
+    expected = 0
+    send_start = clock.perf_counter()
+    for i in range(messages):
+        appointment, doctor_user, _ = chats[i % len(chats)]
+        await sync_to_async(send_message)(appointment, doctor_user, f'Message {i}')
+        expected += sessions_per_chat
+    deadline = clock.perf_counter() + 30
+    while len(latencies) < expected and clock.perf_counter() < deadline:
+        await asyncio.sleep(0.01)
+    send_ms = (clock.perf_counter() - send_start) * 1000
+
+    for session in sessions:
+        session.closed.set()
+    await asyncio.gather(*tasks)
+    return connect_ms, send_ms, latencies, expected
+
+
+def main():
+    sessions = int(sys.argv[1]) if len(sys.argv) > 1 else 1000
+    messages = int(sys.argv[2]) if len(sys.argv) > 2 else 200
+    sessions_per_chat = int(sys.argv[3]) if len(sys.argv) > 3 else 10
+    with test_database():
+        chats = create_chats(max(1, sessions // sessions_per_chat))
+        connect_ms, send_ms, latencies, expected = asyncio.run(run(chats, sessions_per_chat, messages))
+
+    print(f'{len(chats) * sessions_per_chat} streams on {len(chats)} chats, {messages} messages '
+          f'({sessions_per_chat} recipients each)')
+    print(f'connected in {connect_ms:.0f} ms; sent and delivered in {send_ms:.0f} ms')
+    print(f'delivered {len(latencies)} of {expected} events')
+    if latencies:
+        stats = summarize(latencies)
+        print()
+        print_table(['', 'min', 'median', 'p95', 'p99', 'max'],
+                    [['fan-out latency (ms)'] + [f'{stats[k]:.2f}' for k in ('min', 'median', 'p95', 'p99', 'max')]])
+
+
+if __name__ == '__main__':
+    main()
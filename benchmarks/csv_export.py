@@ -0,0 +1,117 @@
+"""
+Throughput and memory of the streaming bulk CSV exports.
+
+    python -m benchmarks.csv_export [rows]
+
+Fills a test database with ``rows`` medical records and as many reports for
+one doctor (generated inside SQLite, so seeding adds nothing to this
+process's memory), then exports a tenth of them and all of them through the
+views, reading the streamed response piece by piece as a server would. For
+every export rows/sec and the process's peak RSS are reported; with the
+exports streaming, the peak should not grow with the number of rows.
+"""
+import resource
+import sys
+import time as clock
+from datetime import date, timedelta
+from .common import setup_django, test_database, print_table
+
+setup_django()
+
+from django.contrib.auth.models import User
+from django.db import connection
+from django.test import Client
+from django.urls import reverse
+from accounts.models import UserProfile, DoctorProfile, PatientProfile
+from reports.models import MedicalRecord, Report
+
+PATIENTS = 100
+START = date(2020, 1, 1)
+
+SEED_RECORDS = """
+    WITH RECURSIVE seq(n) AS (SELECT 1 UNION ALL SELECT n + 1 FROM seq WHERE n < %s)
+    INSERT INTO {table} (patient_id, doctor_id, appointment_id, diagnosis, symptoms, prescription,
+                         lab_results, notes, record_date, created_at, updated_at)
+    SELECT %s + n %% %s, %s, NULL, 'Seasonal influenza, uncomplicated', 'Fever, cough, sore throat, fatigue',
+           'Oseltamivir 75 mg twice daily for 5 days', 'Rapid antigen test positive', 'Follow up in one week',
+           date('2020-01-01', '+' || (n / 500) || ' days'), datetime('2020-01-01', '+' || (n * 60) || ' seconds'),
+           datetime('2020-01-01', '+' || (n * 60) || ' seconds')
+    FROM seq
+"""
+
+SEED_REPORTS = """
+    WITH RECURSIVE seq(n) AS (SELECT 1 UNION ALL SELECT n + 1 FROM seq WHERE n < %s)
+    INSERT INTO {table} (patient_id, doctor_id, medical_record_id, report_type, title, content, file_path, created_at)
+    SELECT %s + n %% %s, %s, NULL, 'consultation', 'Consultation summary',
+           'Patient presented with influenza symptoms. Antivirals prescribed; rest and fluids advised.', '',
+           datetime('2020-01-01', '+' || (n * 60) || ' seconds')
+    FROM seq
+"""
+
+
+def seed(rows):
+    """One doctor with ``rows`` records and reports over PATIENTS patients; returns the doctor's user"""
+    doctor_user = User.objects.create_user(username='benchdoctor', first_name='Doc', last_name='Bench')
+    doctor = DoctorProfile.objects.create(
+        user_profile=UserProfile.objects.create(user=doctor_user, user_type='doctor'),
+        specialization='General Practice', qualification='MD', license_number='BENCH',
+    )
+    patients = []
+    for i in range(PATIENTS):
+        user = User.objects.create_user(username=f'benchpatient{i}', first_name='Patient', last_name=str(i))
+        patients.append(PatientProfile.objects.create(
+            user_profile=UserProfile.objects.create(user=user, user_type='patient')
+        ))
+    first_patient = patients[0].id
+    with connection.cursor() as cursor:
+        cursor.execute(SEED_RECORDS.format(table=MedicalRecord._meta.db_table),
+                       [rows, first_patient, PATIENTS, doctor.id])
+        cursor.execute(SEED_REPORTS.format(table=Report._meta.db_table),
+                       [rows, first_patient, PATIENTS, doctor.id])
+    return doctor_user
+
+
+def peak_rss_mb():
+    return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024
+
+
+def export(client, url, params):
+    """Read one export to the end; returns (rows, bytes, seconds)"""
+    start = clock.perf_counter()
+    response = client.get(url, params)
+    size = lines = 0
+    for piece in response.streaming_content:
+        size += len(piece)
+        lines += piece.count(b'\n')
+    response.close()
+    return lines - 1, size, clock.perf_counter() - start
+
+
+def main():
+    rows = int(sys.argv[1]) if len(sys.argv) > 1 else 1000000
+    results = []
+    with test_database():
+        doctor_user = seed(rows)
+        client = Client()
+        client.force_login(doctor_user)
+        baseline = peak_rss_mb()
+        # Records are dated 500 a day and reports one a minute from 2020-01-01; ``end`` cuts off about a tenth
+        for name, url, tenth_end in (
+            ('medical records', reverse('reports:export_medical_records_csv'), rows // 10 // 500),
+            ('reports', reverse('reports:export_reports_csv'), rows // 10 // 1440),
+        ):
+            for share, params in (
+                ('~10%', {'end': (START + timedelta(days=tenth_end)).isoformat()}),
+                ('100%', {}),
+            ):
+                exported, size, seconds = export(client, url, params)
+                results.append([name, share, exported, f'{seconds:.2f}', f'{exported / seconds:,.0f}',
+                                f'{size / seconds / 1e6:.1f}', f'{peak_rss_mb():.0f}'])
+
+    print(f'{rows} records and reports seeded; peak RSS before exporting {baseline:.0f} MB')
+    print()
+    print_table(['export', 'share', 'rows', 'seconds', 'rows/s', 'MB/s', 'peak RSS MB'], results)
+
+
+if __name__ == '__main__':
+    main()
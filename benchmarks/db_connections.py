@@ -0,0 +1,111 @@
+"""
+Cost of opening a database connection per request, and what persistent
+connections save.
+
+    python -m benchmarks.db_connections [requests]
+
+Seeds a file-based SQLite test database with dashboard.synthetic (SQLite
+connections to a file cost more than to the in-memory test database) and
+requests a patient's appointment list ``requests`` times (default 300)
+through Django's WSGIHandler, which closes or keeps the connection at the end
+of each request as CONN_MAX_AGE says. The test client cannot be used here:
+it never closes connections between requests.
+
+Compared are CONN_MAX_AGE=0 (the connection is opened and set up for every
+request), persistent connections with the health check that runs before
+reuse, and persistent connections without it. The cost of one connect and
+its first query, with and without the SQLITE_PRAGMAS, is timed on its own
+(SQLite only reads the database file on the first statement).
+"""
+import os
+import sys
+import tempfile
+from .common import setup_django, test_database, login_session, measure, summarize, print_table
+
+setup_django()
+
+from django.conf import settings
+from django.core.handlers.wsgi import WSGIHandler
+from django.db import connection
+from django.db.backends.signals import connection_created
+from django.test import RequestFactory, override_settings
+from django.urls import reverse
+from accounts.models import PatientProfile
+from dashboard import synthetic
+
+PREFIX = 'bench'
+
+
+class ConnectionCounter:
+    def __init__(self):
+        self.count = 0
+
+    def __call__(self, sender, **kwargs):
+        self.count += 1
+
+
+def request_page(handler, environ):
+    response = handler(environ.copy(), lambda status, headers: None)
+    for _ in response:
+        pass
+    # Sends request_finished, which closes the connection unless it is kept
+    response.close()
+
+
+def time_requests(handler, environ, requests, max_age, health_checks, counter):
+    connection.close()
+    connection.settings_dict['CONN_MAX_AGE'] = max_age
+    connection.settings_dict['CONN_HEALTH_CHECKS'] = health_checks
+    counter.count = 0
+    samples = measure(lambda: request_page(handler, environ), repeat=requests, warmup=0)
+    return summarize(samples), counter.count
+
+
+def time_connect(repeat):
+    def connect():
+        connection.connect()
+        with connection.cursor() as cursor:
+            cursor.execute('SELECT 1 FROM django_session LIMIT 1')
+        connection.close()
+    return summarize(measure(connect, repeat=repeat))
+
+
+def main():
+    requests = int(sys.argv[1]) if len(sys.argv) > 1 else 300
+    counter = ConnectionCounter()
+    connection_created.connect(counter)
+    rows = []
+    with tempfile.TemporaryDirectory() as directory:
+        connection.settings_dict['TEST']['NAME'] = os.path.join(directory, 'bench.sqlite3')
+        with test_database():
+            synthetic.generate(5, 50, 2000, prefix=PREFIX)
+            patient = PatientProfile.objects.select_related('user_profile__user').filter(
+                user_profile__user__username__startswith=PREFIX).first()
+            session_key = login_session(patient.user_profile.user)
+            environ = RequestFactory(HTTP_COOKIE=f'{settings.SESSION_COOKIE_NAME}={session_key}')._base_environ(
+                PATH_INFO=reverse('appointments:appointment_list'), REQUEST_METHOD='GET')
+            handler = WSGIHandler()
+            request_page(handler, environ)
+
+            for label, max_age, health_checks in (
+                ('CONN_MAX_AGE=0', 0, False),
+                ('CONN_MAX_AGE=60, health checks', 60, True),
+                ('CONN_MAX_AGE=60', 60, False),
+            ):
+                stats, opened = time_requests(handler, environ, requests, max_age, health_checks, counter)
+                rows.append([label, requests, opened, f"{stats['median']:.2f}", f"{stats['p95']:.2f}"])
+
+            connect = time_connect(requests)
+            with override_settings(SQLITE_PRAGMAS={}):
+                bare_connect = time_connect(requests)
+            connection.settings_dict['CONN_MAX_AGE'] = 0
+
+    print_table(['connections', 'requests', 'opened', 'median ms', 'p95 ms'], rows)
+    print()
+    print(f"Connect and first query: {connect['median']:.3f} ms with SQLITE_PRAGMAS "
+          f"({', '.join(f'{k}={v}' for k, v in settings.SQLITE_PRAGMAS.items())}), "
+          f"{bare_connect['median']:.3f} ms without")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,83 @@
+"""
+Throughput of the batch PDF renderer versus the number of worker processes.
+
+    python -m benchmarks.pdf_batch [reports] [max_workers]
+
+Creates ``reports`` reports (with a medical history for each of their
+patients) in a test database and renders all of them, into a temporary
+MEDIA_ROOT and a zip archive, with 1, 2, 4, ... up to ``max_workers`` worker
+processes (default: the CPU count). PDFs/sec and the speedup over one worker
+are reported for each.
+"""
+import os
+import shutil
+import sys
+import tempfile
+import time as clock
+from .common import setup_django, test_database, print_table
+
+setup_django()
+
+from django.contrib.auth.models import User
+from django.test import override_settings
+from accounts.models import UserProfile, DoctorProfile, PatientProfile
+from reports import batch
+from reports.models import MedicalRecord, Report
+
+REPORTS_PER_PATIENT = 4
+CONTENT = '\n'.join(f'Line {i}: observations, findings and follow-up instructions for the patient.' for i in range(40))
+
+
+def seed(count):
+    """``count`` reports over count / REPORTS_PER_PATIENT patients, each with as many medical records"""
+    doctor_user = User.objects.create_user(username='benchdoctor', first_name='Doc', last_name='Bench')
+    doctor = DoctorProfile.objects.create(
+        user_profile=UserProfile.objects.create(user=doctor_user, user_type='doctor'),
+        specialization='General Practice', qualification='MD', license_number='BENCH',
+    )
+    records, reports = [], []
+    for i in range(max(1, count // REPORTS_PER_PATIENT)):
+        user = User.objects.create_user(username=f'benchpatient{i}', first_name='Patient', last_name=str(i))
+        patient = PatientProfile.objects.create(user_profile=UserProfile.objects.create(user=user, user_type='patient'))
+        for j in range(REPORTS_PER_PATIENT):
+            records.append(MedicalRecord(
+                patient=patient, doctor=doctor, diagnosis=f'Diagnosis {j}', symptoms='Cough\nFever',
+                prescription='Rest and fluids', lab_results='Normal', notes='Follow up in two weeks',
+            ))
+            reports.append(Report(
+                patient=patient, doctor=doctor, report_type='consultation', title=f'Summary {j}', content=CONTENT,
+            ))
+    MedicalRecord.objects.bulk_create(records)
+    Report.objects.bulk_create(reports[:count])
+
+
+def main():
+    count = int(sys.argv[1]) if len(sys.argv) > 1 else 400
+    max_workers = int(sys.argv[2]) if len(sys.argv) > 2 else os.cpu_count() or 1
+    worker_counts = sorted({1, max_workers} | {2 ** i for i in range(1, max_workers.bit_length()) if 2 ** i < max_workers})
+    rows = []
+    media_root = tempfile.mkdtemp()
+    try:
+        with test_database(), override_settings(MEDIA_ROOT=media_root):
+            seed(count)
+            reports = Report.objects.order_by('pk')
+            patient_ids = sorted(set(reports.values_list('patient_id', flat=True)))
+            baseline = None
+            for workers in worker_counts:
+                with open(os.path.join(media_root, 'bundle.zip'), 'wb') as zip_file:
+                    start = clock.perf_counter()
+                    saved = batch.render_batch(reports, patient_ids, workers=workers, zip_file=zip_file)
+                    elapsed = clock.perf_counter() - start
+                rate = len(saved) / elapsed
+                baseline = baseline or rate
+                rows.append([workers, len(saved), f'{elapsed:.2f}', f'{rate:.1f}', f'{rate / baseline:.2f}x'])
+    finally:
+        shutil.rmtree(media_root)
+
+    print(f'{count} reports and {len(patient_ids)} histories per run, {os.cpu_count()} CPUs')
+    print()
+    print_table(['workers', 'PDFs', 'seconds', 'PDFs/s', 'speedup'], rows)
+
+
+if __name__ == '__main__':
+    main()
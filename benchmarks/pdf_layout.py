@@ -0,0 +1,70 @@
+"""
+Speed and memory of the paginated PDF layout on long documents.
+
+    python -m benchmarks.pdf_layout [entries]
+
+Renders synthetic medical histories of a tenth of ``entries`` and of all of
+them (default 1750, about 500 pages) into temporary files, the way the history
+download does, with entries produced by a generator. For each document the
+page count, pages/sec, file size and the peak of Python allocations during
+rendering are reported; with streaming layout the peak grows only by the
+compressed pages ReportLab keeps until the file is written.
+"""
+import re
+import sys
+import tempfile
+import time as clock
+import tracemalloc
+from .common import setup_django, print_table
+
+setup_django()
+
+from reports.pdf import render_history_pdf
+
+SYMPTOMS = ('Intermittent fever and productive cough for several days, worse at night, with fatigue, '
+            'reduced appetite and mild shortness of breath on exertion. ') * 3
+
+
+def entries(count):
+    for i in range(count):
+        yield {
+            'kind': 'Medical record' if i % 2 else 'Consultation note',
+            'date': f'20{10 + i // 365 % 15}-{1 + i // 30 % 12:02d}-{1 + i % 28:02d}',
+            'doctor': 'Doc Bench',
+            'fields': [
+                ('Diagnosis', f'Diagnosis {i}: community-acquired pneumonia'),
+                ('Symptoms', SYMPTOMS),
+                ('Prescription', 'Amoxicillin 500 mg three times daily for 7 days\nParacetamol as needed'),
+                ('Notes', 'Review in one week, sooner if symptoms worsen.'),
+            ],
+        }
+
+
+def render(count):
+    """(pages, bytes, seconds) of a history with ``count`` entries"""
+    with tempfile.TemporaryFile() as output:
+        start = clock.perf_counter()
+        render_history_pdf({'id': 1, 'patient': 'Patient Bench', 'entries': entries(count)}, output)
+        seconds = clock.perf_counter() - start
+        output.seek(0)
+        pdf = output.read()
+    return len(re.findall(rb'/Type /Page\b', pdf)), len(pdf), seconds
+
+
+def main():
+    count = int(sys.argv[1]) if len(sys.argv) > 1 else 1750
+    rows = []
+    for size in (max(1, count // 10), count):
+        pages, length, seconds = render(size)
+        tracemalloc.start()
+        render(size)
+        peak = tracemalloc.get_traced_memory()[1]
+        tracemalloc.stop()
+        rows.append([size, pages, f'{seconds:.2f}', f'{pages / seconds:.0f}', f'{length / 1e6:.1f}',
+                     f'{peak / 1e6:.1f}'])
+
+    print_table(['entries', 'pages', 'seconds', 'pages/s', 'file MB', 'peak alloc MB'], rows)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,171 @@
+"""
+Latency of full-text search on a large synthetic corpus.
+
+    python -m benchmarks.search [documents] [inverted_documents]
+
+Fills a test database with ``inverted_documents`` (default 100000) search
+documents, generated inside SQLite from a small medical vocabulary plus
+20000 rare code words, and builds the fallback inverted index over them.
+Both backends are then timed on the same queries: a rare word, a common
+word, two common words and a prefix, scoped to one doctor (1% of the
+corpus), to one patient (0.1%) and unscoped. The corpus is then grown to
+``documents`` (default 1000000) and the FTS5 backend timed again. The FTS5
+index is built by the triggers as the rows are inserted, so the seeding rate
+is its indexing rate.
+"""
+import sys
+import time
+from .common import setup_django, test_database, measure, summarize, print_table
+
+setup_django()
+
+from django.contrib.auth.models import User
+from django.db import connection, transaction
+from django.test import override_settings
+from accounts.models import UserProfile, DoctorProfile, PatientProfile
+from search import engine
+from search.backends import FTS5Backend, InvertedIndexBackend
+from search.models import SearchDocument
+
+DOCTORS = 100
+PATIENTS = 1000
+CODES = 20000
+
+VOCABULARY = (
+    'pneumonia bronchitis asthma influenza hypertension diabetes angina arrhythmia migraine anemia '
+    'gastritis appendicitis dermatitis arthritis osteoporosis sinusitis otitis conjunctivitis tonsillitis '
+    'cystitis nephritis hepatitis pancreatitis colitis gout eczema psoriasis insomnia depression anxiety '
+    'fever cough fatigue headache nausea vomiting diarrhea dizziness rash swelling pain stiffness wheezing '
+    'palpitations chills sweating cramps numbness tingling weakness '
+    'amoxicillin ibuprofen paracetamol metformin lisinopril atorvastatin omeprazole salbutamol prednisone '
+    'insulin warfarin aspirin cetirizine azithromycin doxycycline amlodipine levothyroxine sertraline '
+    'chest abdomen throat knee shoulder back skin lungs heart kidney liver stomach joints '
+    'acute chronic mild severe recurrent persistent bilateral stable worsening improving'
+).split()
+
+# Titles take two vocabulary words, bodies four more and eight rare codes
+SEED_DOCUMENTS = """
+    WITH RECURSIVE seq(n) AS (SELECT %s UNION ALL SELECT n + 1 FROM seq WHERE n < %s),
+    h(n, a, b) AS (SELECT n, (n * 7919) %% 1000003, (n * 104729) %% 1000003 FROM seq)
+    INSERT INTO {table} (kind, object_id, patient_id, doctor_id, title, body, created_at)
+    SELECT 'record', n, %s + n %% %s, %s + n %% %s,
+           (SELECT word FROM temp.bench_vocab WHERE i = a %% %s) || ' ' ||
+           (SELECT word FROM temp.bench_vocab WHERE i = (a * 31 + 7) %% %s),
+           (SELECT word FROM temp.bench_vocab WHERE i = b %% %s) || ' and ' ||
+           (SELECT word FROM temp.bench_vocab WHERE i = (b * 17 + 3) %% %s) || ', ' ||
+           (SELECT word FROM temp.bench_vocab WHERE i = (a + b) %% %s) || ' with ' ||
+           (SELECT word FROM temp.bench_vocab WHERE i = (a * 13 + b) %% %s) ||
+           ' c' || ((a * 48271 %% 1000003) %% {codes}) || ' c' || ((b * 48271 %% 1000003) %% {codes}) ||
+           ' c' || ((a * 69621 %% 1000003) %% {codes}) || ' c' || ((b * 69621 %% 1000003) %% {codes}) ||
+           ' c' || (((a + b) * 48271 %% 1000003) %% {codes}) || ' c' || (((a + b) * 69621 %% 1000003) %% {codes}) ||
+           ' c' || (((a + 1) * 16807 %% 1000003) %% {codes}) || ' c' || (((b + 1) * 16807 %% 1000003) %% {codes}),
+           datetime('2020-01-01', '+' || n || ' minutes')
+    FROM h
+"""
+
+QUERIES = [
+    ('rare word', 'c12345'),
+    ('common word', 'pneumonia'),
+    ('two words', 'fever cough'),
+    ('prefix', 'pneu'),
+]
+
+
+def seed_people():
+    """DOCTORS doctors and PATIENTS patients; returns the first doctor and patient ids"""
+    users = User.objects.bulk_create(
+        [User(username=f'benchdoctor{i}') for i in range(DOCTORS)]
+        + [User(username=f'benchpatient{i}') for i in range(PATIENTS)]
+    )
+    profiles = UserProfile.objects.bulk_create(
+        [UserProfile(user=user, user_type='doctor') for user in users[:DOCTORS]]
+        + [UserProfile(user=user, user_type='patient') for user in users[DOCTORS:]]
+    )
+    doctors = DoctorProfile.objects.bulk_create([
+        DoctorProfile(user_profile=profile, specialization='General Practice', qualification='MD',
+                      license_number=f'BENCH{i}')
+        for i, profile in enumerate(profiles[:DOCTORS])
+    ])
+    patients = PatientProfile.objects.bulk_create([
+        PatientProfile(user_profile=profile) for profile in profiles[DOCTORS:]
+    ])
+    with connection.cursor() as cursor:
+        cursor.execute('CREATE TEMP TABLE bench_vocab (i INTEGER PRIMARY KEY, word TEXT)')
+        cursor.executemany('INSERT INTO temp.bench_vocab VALUES (%s, %s)', list(enumerate(VOCABULARY)))
+    return doctors[0].id, patients[0].id
+
+
+def seed_documents(first, last, first_doctor, first_patient):
+    """Documents numbered ``first`` to ``last``; returns the seconds taken"""
+    start = time.perf_counter()
+    size = len(VOCABULARY)
+    with transaction.atomic(), connection.cursor() as cursor:
+        cursor.execute(SEED_DOCUMENTS.format(table=SearchDocument._meta.db_table, codes=CODES),
+                       [first, last, first_patient, PATIENTS, first_doctor, DOCTORS] + [size] * 6)
+    return time.perf_counter() - start
+
+
+def build_inverted_index(batch_size=5000):
+    """Index every document into SearchTerm; returns the seconds taken"""
+    start = time.perf_counter()
+    backend = InvertedIndexBackend()
+    with transaction.atomic():
+        backend.clear()
+        batch = []
+        for document in SearchDocument.objects.only('title', 'body').iterator(chunk_size=batch_size):
+            batch.append(document)
+            if len(batch) >= batch_size:
+                backend.index(batch)
+                batch = []
+        backend.index(batch)
+    return time.perf_counter() - start
+
+
+def engine_backend(backend):
+    return override_settings(SEARCH_BACKEND=f'{backend.__module__}.{backend.__name__}')
+
+
+def time_queries(backend_name, documents, scopes, repeat):
+    rows = []
+    for scope_name, scope in scopes:
+        for query_name, query in QUERIES:
+            hits = len(engine.search(query, scope))
+            stats = summarize(measure(lambda: engine.search(query, scope), repeat=repeat))
+            rows.append([backend_name, documents, scope_name, query_name, hits,
+                         f"{stats['median']:.1f}", f"{stats['p95']:.1f}"])
+    return rows
+
+
+def main():
+    documents = int(sys.argv[1]) if len(sys.argv) > 1 else 1000000
+    inverted_documents = min(documents, int(sys.argv[2]) if len(sys.argv) > 2 else 100000)
+    rows = []
+    with test_database():
+        first_doctor, first_patient = seed_people()
+        scopes = [
+            ('doctor', {'doctor_id': first_doctor}),
+            ('patient', {'patient_id': first_patient}),
+            ('all', {}),
+        ]
+        seconds = seed_documents(1, inverted_documents, first_doctor, first_patient)
+        print(f'Seeded and FTS5-indexed {inverted_documents} documents at {inverted_documents / seconds:,.0f}/s')
+        seconds = build_inverted_index()
+        print(f'Built the inverted index of {inverted_documents} documents at {inverted_documents / seconds:,.0f}/s')
+
+        for name, backend in (('fts5', FTS5Backend), ('inverted', InvertedIndexBackend)):
+            with engine_backend(backend):
+                rows += time_queries(name, inverted_documents, scopes, repeat=10)
+
+        if documents > inverted_documents:
+            seconds = seed_documents(inverted_documents + 1, documents, first_doctor, first_patient)
+            print(f'Seeded and FTS5-indexed {documents - inverted_documents} more documents at '
+                  f'{(documents - inverted_documents) / seconds:,.0f}/s')
+            with engine_backend(FTS5Backend):
+                rows += time_queries('fts5', documents, scopes, repeat=10)
+
+    print()
+    print_table(['backend', 'documents', 'scope', 'query', 'hits', 'median ms', 'p95 ms'], rows)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,101 @@
+"""
+Benchmark the earliest-available-slot search as the number of doctors grows.
+
+    python -m benchmarks.slot_search [doctor counts...]
+
+For every size the same search runs against the bulk SlotIndex path; for the
+smaller sizes the per-doctor loop it replaces is timed as well.
+"""
+import random
+import sys
+from datetime import time, timedelta
+from .common import setup_django, test_database, measure, summarize, print_table
+
+setup_django()
+
+from django.contrib.auth.models import User
+from django.db import connection
+from django.test.utils import CaptureQueriesContext
+from django.utils import timezone
+from accounts.models import UserProfile, DoctorProfile, PatientProfile
+from appointments.models import Appointment, DoctorAvailability
+from appointments.search import earliest_slots, matching_doctors
+from appointments.slots import free_slots_for_doctor
+
+SPECIALIZATIONS = ['Cardiology', 'Dermatology', 'General Medicine', 'Neurology', 'Pediatrics']
+DEFAULT_SIZES = [100, 1000, 5000]
+NAIVE_LIMIT = 1000
+DAYS = 14
+
+
+def create_doctors(start, count, patient, rng):
+    users = User.objects.bulk_create([
+        User(username=f'bench-doctor-{i}', first_name='Bench', last_name=str(i)) for i in range(start, start + count)
+    ])
+    profiles = UserProfile.objects.bulk_create([UserProfile(user=user, user_type='doctor') for user in users])
+    doctors = DoctorProfile.objects.bulk_create([
+        DoctorProfile(
+            user_profile=profile,
+            specialization=rng.choice(SPECIALIZATIONS),
+            qualification='MD',
+            license_number=f'BENCH-{start + i}',
+            consultation_fee=rng.choice([50, 100, 150, 200]),
+        )
+        for i, profile in enumerate(profiles)
+    ])
+    DoctorAvailability.objects.bulk_create([
+        DoctorAvailability(doctor=doctor, day_of_week=day, start_time=time(9, 0), end_time=time(17, 0))
+        for doctor in doctors
+        for day in range(5)
+    ])
+    # Book most of the coming days so the search has to skip taken slots
+    today = timezone.localdate()
+    appointments = []
+    for doctor in doctors:
+        for offset in range(DAYS):
+            day = today + timedelta(days=offset)
+            if day.weekday() >= 5:
+                continue
+            for hour in range(9, 17):
+                if rng.random() < 0.8:
+                    appointments.append(Appointment(patient=patient, doctor=doctor, appointment_date=day,
+                                                    appointment_time=time(hour, 0), reason='Benchmark'))
+    Appointment.objects.bulk_create(appointments, batch_size=2000)
+
+
+def naive_search(specialization, limit):
+    """The per-doctor loop the bulk search replaces"""
+    slots = []
+    for doctor in matching_doctors(specialization):
+        slots.extend((day, start, doctor.id) for day, start in free_slots_for_doctor(doctor, days=DAYS, limit=limit))
+    return sorted(slots)[:limit]
+
+
+def main(sizes):
+    rng = random.Random(42)
+    rows = []
+    with test_database():
+        user = User.objects.create(username='bench-patient')
+        patient = PatientProfile.objects.create(user_profile=UserProfile.objects.create(user=user, user_type='patient'))
+        created = 0
+        for size in sizes:
+            create_doctors(created, size - created, patient, rng)
+            created = size
+
+            def search():
+                return earliest_slots(specialization='Cardiology', limit=10)
+
+            with CaptureQueriesContext(connection) as queries:
+                search()
+            bulk = summarize(measure(search, repeat=10))
+            naive = '-'
+            if size <= NAIVE_LIMIT:
+                naive = f"{summarize(measure(lambda: naive_search('Cardiology', 10), repeat=3, warmup=0))['median']:.1f}"
+            rows.append([size, len(queries), f"{bulk['median']:.1f}", f"{bulk['p95']:.1f}", naive])
+
+    print(f'Earliest 10 Cardiology slots over {DAYS} days (times in ms)')
+    print_table(['doctors', 'queries', 'median', 'p95', 'per-doctor median'], rows)
+
+
+if __name__ == '__main__':
+    main([int(arg) for arg in sys.argv[1:]] or DEFAULT_SIZES)
@@ -0,0 +1,314 @@
+"""
+Benchmark every user-facing page, as a doctor and as a patient, and compare
+with a stored baseline.
+
+    python -m benchmarks.view_suite [--doctors N] [--patients N] [--appointments N] [--repeat N]
+                                    [--output FILE] [--baseline FILE] [--save-baseline]
+
+Seeds a test database with dashboard.synthetic, then requests each named URL
+in healthcare_system.urls through the test client, as one of the generated
+doctors and as a patient of theirs. URL arguments point at one of that
+doctor's completed appointments (with its note, record, report and chat).
+Pages that change state on GET (logout, starting/ending video sessions), the
+admin, the ASGI-only chat stream and the dashboards of the other role are
+skipped.
+
+Each page is requested ``repeat`` times after a warm-up. For each one the
+script records the status, the number of queries, the total SQL time, the
+template render time and wall time percentiles, all in milliseconds, and
+writes them to ``--output`` as JSON. The render time is the top-level
+Template.render and so includes queries that the template evaluates lazily.
+
+The results are compared with ``--baseline``. A page regresses if its status
+changes, if it runs more queries, or if its median wall time grows by more
+than ``--tolerance`` (a fraction) plus ``--min-ms``. The script exits with
+status 1 on any regression. A server error is never a result: if any page
+answers with a 5xx, the script lists them and exits with status 1 without
+writing results or a baseline. Timings only compare across runs on the same
+machine and volumes; after an intended change, or on a new machine, write a
+new baseline with ``--save-baseline``.
+"""
+import argparse
+import json
+import logging
+import os
+import platform
+import sys
+import tempfile
+import time
+from .common import setup_django, test_database, summarize, print_table
+
+setup_django()
+
+import django
+from django.db import connection
+from django.template.backends import django as django_backend
+from django.test import Client, override_settings
+from django.urls import URLPattern, URLResolver, get_resolver, reverse
+from accounts.models import DoctorProfile
+from reports.models import Report
+from dashboard import synthetic
+
+PREFIX = 'bench'
+BASELINE = os.path.join(os.path.dirname(__file__), 'baselines', 'view_suite.json')
+OUTPUT = os.path.join(os.path.dirname(__file__), 'results', 'view_suite.json')
+
+SKIP = {'accounts:logout', 'consultation:start_video', 'consultation:end_video', 'consultation:chat_events'}
+SKIP_NAMESPACES = {'admin'}
+
+# Pages only the given role may open
+ROLE_ONLY = {'dashboard:doctor': 'doctor', 'dashboard:patient': 'patient'}
+
+# Sample object behind each URL argument; ``pk`` depends on the URL name, or else its namespace
+PK_SAMPLES = {
+    'appointments': 'appointment',
+    'consultation:note_detail': 'note',
+    'reports:medical_record_detail': 'record',
+    'reports': 'report',
+}
+ARG_SAMPLES = {'appointment_id': 'appointment', 'patient_id': 'patient'}
+
+QUERY_STRINGS = {
+    'search:search': {'q': 'pneumonia'},
+}
+
+
+def named_urls(patterns=None, namespace=None):
+    """(name, argument names) of every named URL, with namespaces"""
+    for pattern in get_resolver().url_patterns if patterns is None else patterns:
+        if isinstance(pattern, URLResolver):
+            inner = pattern.namespace or namespace
+            if inner not in SKIP_NAMESPACES:
+                yield from named_urls(pattern.url_patterns, inner)
+        elif isinstance(pattern, URLPattern) and pattern.name:
+            name = f'{namespace}:{pattern.name}' if namespace else pattern.name
+            yield name, list(getattr(pattern.pattern, 'converters', {}))
+
+
+def sample_objects():
+    """The doctor's latest completed appointment that has a note, a record with a report and a chat"""
+    doctor = DoctorProfile.objects.get(user_profile__user__username=f'{PREFIX}doctor0')
+    report = Report.objects.filter(
+        doctor=doctor,
+        medical_record__appointment__consultation_notes__isnull=False,
+        medical_record__appointment__chat_messages__isnull=False,
+    ).select_related('medical_record__appointment__patient').order_by('-created_at').first()
+    appointment = report.medical_record.appointment
+    return doctor, appointment.patient, {
+        'appointment': appointment.id,
+        'note': appointment.consultation_notes.values_list('id', flat=True).first(),
+        'record': report.medical_record_id,
+        'report': report.id,
+        'patient': appointment.patient_id,
+    }
+
+
+def url_path(name, arg_names, samples):
+    """The path of ``name`` with sample arguments, or None if an argument has no sample"""
+    kwargs = {}
+    for arg in arg_names:
+        if arg == 'pk':
+            sample = PK_SAMPLES.get(name) or PK_SAMPLES.get(name.split(':')[0])
+        else:
+            sample = ARG_SAMPLES.get(arg)
+        if sample is None:
+            return None
+        kwargs[arg] = samples[sample]
+    return reverse(name, kwargs=kwargs)
+
+
+class RenderTimer:
+    """Accumulates the time spent in the Django template backend's Template.render"""
+
+    def __init__(self):
+        self.seconds = 0.0
+        self._render = django_backend.Template.render
+
+    def __enter__(self):
+        timer, render = self, self._render
+
+        def timed_render(template, *args, **kwargs):
+            start = time.perf_counter()
+            try:
+                return render(template, *args, **kwargs)
+            finally:
+                timer.seconds += time.perf_counter() - start
+
+        django_backend.Template.render = timed_render
+        return self
+
+    def __exit__(self, *exc_info):
+        django_backend.Template.render = self._render
+
+
+class QueryTimer:
+    """Counts and times the queries of the default connection (its query log only keeps milliseconds)"""
+
+    def __init__(self):
+        self.count = 0
+        self.seconds = 0.0
+
+    def __call__(self, execute, sql, params, many, context):
+        start = time.perf_counter()
+        try:
+            return execute(sql, params, many, context)
+        finally:
+            self.count += 1
+            self.seconds += time.perf_counter() - start
+
+
+def request_once(client, path, params, render_timer, query_timer):
+    """(status, queries, SQL ms, render ms, wall ms) of one request, the response read to the end"""
+    render_timer.seconds = query_timer.seconds = 0.0
+    query_timer.count = 0
+    start = time.perf_counter()
+    response = client.get(path, params)
+    if response.streaming:
+        for _ in response.streaming_content:
+            pass
+    wall = time.perf_counter() - start
+    response.close()
+    return (response.status_code, query_timer.count, query_timer.seconds * 1000, render_timer.seconds * 1000,
+            wall * 1000)
+
+
+def median(values):
+    return sorted(values)[len(values) // 2]
+
+
+def benchmark_page(client, path, params, repeat, timers):
+    for _ in range(2):
+        request_once(client, path, params, *timers)
+    runs = [request_once(client, path, params, *timers) for _ in range(repeat)]
+    statuses, queries, sql, render, wall = zip(*runs)
+    return {
+        'path': path,
+        'status': median(statuses),
+        'queries': median(queries),
+        'sql_ms': round(median(sql), 2),
+        'render_ms': round(median(render), 2),
+        'wall_ms': {key: round(value, 2) for key, value in summarize(wall).items()},
+    }
+
+
+def run(options):
+    """(results, skipped pages, pages that answered with a server error)"""
+    results = {}
+    skipped = []
+    errors = []
+    # Server errors are listed at the end; keep their tracebacks out of the output
+    logging.getLogger('django.request').setLevel(logging.CRITICAL)
+    with test_database(), tempfile.TemporaryDirectory() as cache_dir, \
+            override_settings(REPORT_PDF_CACHE_DIR=cache_dir):
+        started = time.perf_counter()
+        synthetic.generate(options.doctors, options.patients, options.appointments, prefix=PREFIX)
+        print(f'Seeded in {time.perf_counter() - started:.1f}s')
+        doctor, patient, samples = sample_objects()
+        query_timer = QueryTimer()
+        with RenderTimer() as render_timer, connection.execute_wrapper(query_timer):
+            for role, user in (('doctor', doctor.user_profile.user), ('patient', patient.user_profile.user)):
+                # Finish the other pages on a server error, so that all of them are reported
+                client = Client(raise_request_exception=False)
+                client.force_login(user)
+                for name, arg_names in named_urls():
+                    skip = name in SKIP or ROLE_ONLY.get(name, role) != role
+                    path = None if skip else url_path(name, arg_names, samples)
+                    if path is None:
+                        skipped.append(f'{name} as {role}')
+                        continue
+                    result = benchmark_page(
+                        client, path, QUERY_STRINGS.get(name, {}), options.repeat, (render_timer, query_timer))
+                    if result['status'] >= 500:
+                        errors.append(f"{name} as {role}: status {result['status']}")
+                    else:
+                        results[f'{name} as {role}'] = result
+    return results, skipped, errors
+
+
+def compare(results, baseline, tolerance, min_ms):
+    """Descriptions of the regressions of ``results`` against ``baseline``"""
+    regressions = []
+    for key, result in results.items():
+        base = baseline.get(key)
+        if base is None:
+            continue
+        if result['status'] != base['status']:
+            regressions.append(f"{key}: status {base['status']} -> {result['status']}")
+        if result['queries'] > base['queries']:
+            regressions.append(f"{key}: {base['queries']} -> {result['queries']} queries")
+        limit = base['wall_ms']['median'] * (1 + tolerance) + min_ms
+        if result['wall_ms']['median'] > limit:
+            regressions.append(
+                f"{key}: median {base['wall_ms']['median']:.1f} -> {result['wall_ms']['median']:.1f} ms")
+    return regressions
+
+
+def write_json(path, data):
+    os.makedirs(os.path.dirname(os.path.abspath(path)), exist_ok=True)
+    with open(path, 'w') as f:
+        json.dump(data, f, indent=2, sort_keys=True)
+        f.write('\n')
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Benchmark every user-facing page against a baseline')
+    parser.add_argument('--doctors', type=int, default=50)
+    parser.add_argument('--patients', type=int, default=5000)
+    parser.add_argument('--appointments', type=int, default=50000)
+    parser.add_argument('--repeat', type=int, default=10)
+    parser.add_argument('--output', default=OUTPUT)
+    parser.add_argument('--baseline', default=BASELINE)
+    parser.add_argument('--save-baseline', action='store_true', help='Write the results as the new baseline')
+    parser.add_argument('--tolerance', type=float, default=0.25)
+    parser.add_argument('--min-ms', type=float, default=2.0)
+    options = parser.parse_args()
+
+    results, skipped, errors = run(options)
+    if errors:
+        for error in errors:
+            print(f'ERROR {error}')
+        sys.exit(1)
+    data = {
+        'meta': {
+            'doctors': options.doctors,
+            'patients': options.patients,
+            'appointments': options.appointments,
+            'repeat': options.repeat,
+            'python': platform.python_version(),
+            'django': django.get_version(),
+            'machine': platform.machine(),
+        },
+        'results': results,
+    }
+    write_json(options.output, data)
+
+    print()
+    print_table(
+        ['page', 'status', 'queries', 'SQL ms', 'render ms', 'median ms', 'p95 ms'],
+        [[key, r['status'], r['queries'], f"{r['sql_ms']:.1f}", f"{r['render_ms']:.1f}",
+          f"{r['wall_ms']['median']:.1f}", f"{r['wall_ms']['p95']:.1f}"] for key, r in results.items()],
+    )
+    print(f'\nSkipped: {", ".join(skipped)}')
+    print(f'Results written to {options.output}')
+
+    if options.save_baseline:
+        write_json(options.baseline, data)
+        print(f'Baseline written to {options.baseline}')
+        return
+    if not os.path.exists(options.baseline):
+        print('No baseline to compare with; write one with --save-baseline.')
+        return
+    with open(options.baseline) as f:
+        baseline = json.load(f)
+    if baseline['meta'] != data['meta']:
+        print(f"Warning: the baseline was recorded with {baseline['meta']}")
+    regressions = compare(results, baseline['results'], options.tolerance, options.min_ms)
+    for regression in regressions:
+        print(f'REGRESSION {regression}')
+    if regressions:
+        sys.exit(1)
+    print('No regressions against the baseline.')
+
+
+if __name__ == '__main__':
+    main()
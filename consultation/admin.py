@@ -1,5 +1,5 @@
 from django.contrib import admin
-from .models import ConsultationNote, ChatMessage, VideoSession
+from .models import ConsultationNote, ChatArchive, ChatMessage, ChatReadState, VideoSession
 
 # Register your models here.
 
@@ -11,10 +11,20 @@ class ConsultationNoteAdmin(admin.ModelAdmin):
 
 @admin.register(ChatMessage)
 class ChatMessageAdmin(admin.ModelAdmin):
-    list_display = ['appointment', 'sender', 'timestamp', 'is_read']
-    list_filter = ['is_read', 'timestamp']
+    list_display = ['appointment', 'sender', 'timestamp']
+    list_filter = ['timestamp']
     search_fields = ['sender__username', 'message']
 
+@admin.register(ChatReadState)
+class ChatReadStateAdmin(admin.ModelAdmin):
+    list_display = ['appointment', 'user', 'last_read_message_id', 'updated_at']
+    search_fields = ['user__username']
+
+@admin.register(ChatArchive)
+class ChatArchiveAdmin(admin.ModelAdmin):
+    list_display = ['appointment', 'message_count', 'last_message_id', 'archived_at']
+    exclude = ['data']
+
 @admin.register(VideoSession)
 class VideoSessionAdmin(admin.ModelAdmin):
     list_display = ['appointment', 'status', 'start_time', 'end_time', 'duration_minutes']
@@ -0,0 +1,102 @@
+"""
+Chat transcript archival.
+
+Once an appointment has been completed or cancelled for a while its chat is
+only ever read as a whole, so ``archive_transcript`` compacts the live
+ChatMessage rows into one zlib-compressed JSON blob (ChatArchive) and deletes
+them in batches. Archiving is idempotent: a transcript that gained messages
+after it was archived, or whose deletion was interrupted, is merged into the
+existing blob on the next run. ``load_transcript`` turns the blob back into
+message-like objects for chat_interface. The JSON feed and event stream only
+serve live messages.
+"""
+import json
+import zlib
+from datetime import timedelta
+from django.conf import settings
+from django.contrib.auth.models import User
+from django.db import transaction
+from django.utils import timezone
+from django.utils.dateparse import parse_datetime
+from appointments.models import Appointment
+from .models import ChatArchive, ChatMessage
+
+ARCHIVABLE_STATUSES = ['completed', 'cancelled']
+
+
+class ArchivedMessage:
+    """Read-only stand-in for a ChatMessage restored from an archive"""
+
+    def __init__(self, id, sender_id, first_name, last_name, message, timestamp):
+        self.id = id
+        self.sender_id = sender_id
+        # Unsaved, but compares equal to the stored user
+        self.sender = User(id=sender_id, first_name=first_name, last_name=last_name)
+        self.message = message
+        self.timestamp = parse_datetime(timestamp)
+
+
+def get_archive_after_days():
+    return getattr(settings, 'CHAT_ARCHIVE_AFTER_DAYS', 30)
+
+
+def archivable_appointments(days=None, now=None):
+    """Completed or cancelled appointments last updated more than ``days`` ago that still have live messages"""
+    days = get_archive_after_days() if days is None else days
+    cutoff = (now or timezone.now()) - timedelta(days=days)
+    return Appointment.objects.filter(
+        status__in=ARCHIVABLE_STATUSES,
+        updated_at__lt=cutoff,
+        chat_messages__isnull=False,
+    ).distinct().order_by('pk')
+
+
+def _encode(rows):
+    return zlib.compress(json.dumps(rows, separators=(',', ':')).encode(), 9)
+
+
+def _decode(data):
+    return json.loads(zlib.decompress(bytes(data)))
+
+
+def archive_transcript(appointment_id, batch_size=1000):
+    """Fold an appointment's live messages into its archive, then delete them.
+
+    Returns the number of messages deleted from the live table.
+    """
+    with transaction.atomic():
+        archive = ChatArchive.objects.select_for_update().filter(appointment_id=appointment_id).first()
+        rows = {row[0]: row for row in _decode(archive.data)} if archive else {}
+        live_ids = []
+        live = ChatMessage.objects.filter(appointment_id=appointment_id).order_by('id').values_list(
+            'id', 'sender_id', 'sender__first_name', 'sender__last_name', 'message', 'timestamp')
+        for message_id, sender_id, first_name, last_name, message, timestamp in live.iterator(chunk_size=batch_size):
+            rows[message_id] = [message_id, sender_id, first_name, last_name, message, timestamp.isoformat()]
+            live_ids.append(message_id)
+        if not live_ids:
+            return 0
+        ordered = [rows[message_id] for message_id in sorted(rows)]
+        ChatArchive.objects.update_or_create(appointment_id=appointment_id, defaults={
+            'data': _encode(ordered),
+            'message_count': len(ordered),
+            'last_message_id': ordered[-1][0],
+        })
+
+    # Only rows that made it into the blob are removed; anything newer stays live
+    deleted = 0
+    for start in range(0, len(live_ids), batch_size):
+        with transaction.atomic():
+            deleted += ChatMessage.objects.filter(id__in=live_ids[start:start + batch_size]).delete()[0]
+    return deleted
+
+
+def load_transcript(appointment):
+    """The archived messages of an appointment, oldest first (empty if it has no archive).
+
+    Select the appointment with select_related('chat_archive') to avoid a query.
+    """
+    try:
+        archive = appointment.chat_archive
+    except ChatArchive.DoesNotExist:
+        return []
+    return [ArchivedMessage(*row) for row in _decode(archive.data)]
@@ -0,0 +1,138 @@
+"""
+Incremental chat delivery.
+
+Clients remember the id of the last message they have seen and ask only for
+newer ones, an index seek on (appointment, id) however long the conversation
+is. Read state is a per-(appointment, user) watermark (ChatReadState), so
+marking a delivered batch read is a single-row update and unread counts are
+id range counts. ``wait_for_messages`` long-polls, re-checking every
+CHAT_POLL_INTERVAL seconds until something arrives or the wait runs out; its
+async variant ``await_messages`` is woken by the chat's broker topic instead
+(see consultation.pubsub). Each waiting sync poll ties up a WSGI worker, so its
+wait is capped at CHAT_WSGI_POLL_TIMEOUT; long waits need ASGI.
+"""
+import asyncio
+import time
+from asgiref.sync import sync_to_async
+from django.conf import settings
+from django.db.models import Count, OuterRef, Subquery
+from django.db.models.functions import Coalesce
+from django.utils import timezone
+from .models import ChatMessage, ChatReadState
+from .pubsub import chat_topic, get_broker
+
+
+def get_batch_size():
+    return getattr(settings, 'CHAT_BATCH_SIZE', 100)
+
+
+def get_max_wait():
+    return getattr(settings, 'CHAT_POLL_TIMEOUT', 25)
+
+
+def get_max_sync_wait():
+    return min(get_max_wait(), getattr(settings, 'CHAT_WSGI_POLL_TIMEOUT', 5))
+
+
+def _watermark(appointment_id, user):
+    return ChatReadState.objects.filter(appointment_id=appointment_id, user=user).values('last_read_message_id')[:1]
+
+
+def mark_read(appointment_id, user, up_to):
+    """Move the user's read watermark for the chat up to message ``up_to``; it never moves back"""
+    advanced = ChatReadState.objects.filter(
+        appointment_id=appointment_id,
+        user=user,
+        last_read_message_id__lt=up_to,
+    ).update(last_read_message_id=up_to, updated_at=timezone.now())
+    if advanced:
+        return
+    state, created = ChatReadState.objects.get_or_create(
+        appointment_id=appointment_id, user=user, defaults={'last_read_message_id': up_to},
+    )
+    if not created and state.last_read_message_id < up_to:
+        # Inserted concurrently with an older watermark
+        mark_read(appointment_id, user, up_to)
+
+
+def fetch_messages(appointment_id, user, after=0, limit=None):
+    """Return up to ``limit`` messages with id > ``after``, oldest first, marking them read for ``user``"""
+    messages = list(
+        ChatMessage.objects.filter(appointment_id=appointment_id, id__gt=after)
+        .select_related('sender')
+        .annotate(read_up_to=Subquery(_watermark(appointment_id, user)))
+        .order_by('id')[:limit or get_batch_size()]
+    )
+    # Skip the write when everything delivered is already read (or our own)
+    if any(message.sender_id != user.id and message.id > (message.read_up_to or 0) for message in messages):
+        mark_read(appointment_id, user, messages[-1].id)
+    return messages
+
+
+def unread_counts(user, appointments):
+    """{appointment id: messages from others past the user's watermark} over ``appointments``, in one query.
+
+    Appointments without unread messages are left out.
+    """
+    watermark = ChatReadState.objects.filter(
+        appointment_id=OuterRef('appointment_id'), user=user,
+    ).values('last_read_message_id')[:1]
+    rows = ChatMessage.objects.filter(
+        appointment__in=appointments,
+        id__gt=Coalesce(Subquery(watermark), 0),
+    ).exclude(sender=user).order_by().values('appointment_id').annotate(unread=Count('id'))
+    return {row['appointment_id']: row['unread'] for row in rows}
+
+
+def wait_for_messages(appointment_id, user, after=0, timeout=0, limit=None):
+    """Like fetch_messages, but wait up to ``timeout`` seconds for a message to arrive"""
+    deadline = time.monotonic() + timeout
+    interval = getattr(settings, 'CHAT_POLL_INTERVAL', 1.0)
+    while True:
+        messages = fetch_messages(appointment_id, user, after, limit)
+        remaining = deadline - time.monotonic()
+        if messages or remaining <= 0:
+            return messages
+        time.sleep(min(interval, remaining))
+
+
+async def await_messages(appointment_id, user, after=0, timeout=0, limit=None):
+    """Async wait_for_messages: sleeps on the chat's broker topic instead of re-querying"""
+    subscription = get_broker().subscribe(chat_topic(appointment_id))
+    try:
+        messages = await sync_to_async(fetch_messages)(appointment_id, user, after, limit)
+        if messages or timeout <= 0:
+            return messages
+        try:
+            await asyncio.wait_for(subscription.get(), timeout)
+        except asyncio.TimeoutError:
+            return []
+        return await sync_to_async(fetch_messages)(appointment_id, user, after, limit)
+    finally:
+        subscription.close()
+
+
+def can_access_chat(actor, appointment):
+    """Whether the actor is the appointment's doctor or patient"""
+    if actor.is_doctor:
+        return appointment.doctor_id == actor.doctor_profile.id
+    return appointment.patient_id == actor.patient_profile.id
+
+
+def message_payload(message):
+    """The JSON-ready form of a message, shared by every recipient"""
+    return {
+        'id': message.id,
+        'sender_id': message.sender_id,
+        'sender': message.sender.get_full_name(),
+        'message': message.message,
+        'timestamp': message.timestamp.isoformat(),
+    }
+
+
+def for_recipient(payload, user):
+    return dict(payload, is_mine=payload['sender_id'] == user.id)
+
+
+def serialize_message(message, user):
+    return for_recipient(message_payload(message), user)
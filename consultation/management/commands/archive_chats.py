@@ -0,0 +1,36 @@
+import time
+from django.core.management.base import BaseCommand, CommandError
+from consultation import archive
+
+
+class Command(BaseCommand):
+    help = ('Compact the chats of appointments completed or cancelled more than --days ago into compressed '
+            'archives and delete their live messages')
+
+    def add_arguments(self, parser):
+        parser.add_argument('--days', type=int, default=None,
+                            help='Minimum age of the status change (default: CHAT_ARCHIVE_AFTER_DAYS)')
+        parser.add_argument('--batch-size', type=int, default=1000,
+                            help='Messages deleted per transaction')
+        parser.add_argument('--dry-run', action='store_true',
+                            help='Only list the appointments that would be archived')
+
+    def handle(self, *args, **options):
+        if options['days'] is not None and options['days'] < 0:
+            raise CommandError('--days must not be negative.')
+        if options['batch_size'] < 1:
+            raise CommandError('--batch-size must be positive.')
+        started = time.perf_counter()
+        appointment_ids = list(archive.archivable_appointments(options['days']).values_list('pk', flat=True))
+
+        if options['dry_run']:
+            for appointment_id in appointment_ids:
+                self.stdout.write(f'appointment {appointment_id}')
+            self.stdout.write(f'{len(appointment_ids)} chats would be archived.')
+            return
+
+        deleted = 0
+        for appointment_id in appointment_ids:
+            deleted += archive.archive_transcript(appointment_id, batch_size=options['batch_size'])
+        self.stdout.write(self.style.SUCCESS(
+            f'Archived {len(appointment_ids)} chats ({deleted} messages) in {time.perf_counter() - started:.2f}s.'))
@@ -0,0 +1,17 @@
+# Generated by Django 4.2.28 on 2026-10-17 17:33
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('consultation', '0001_initial'),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='chatmessage',
+            index=models.Index(fields=['appointment', 'timestamp'], name='chat_appointment_time_idx'),
+        ),
+    ]
@@ -0,0 +1,21 @@
+# Generated by Django 4.2.28 on 2026-10-17 17:35
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('consultation', '0002_query_indexes'),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='consultationnote',
+            index=models.Index(fields=['doctor', 'created_at'], name='note_doctor_created_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='consultationnote',
+            index=models.Index(fields=['patient', 'created_at'], name='note_patient_created_idx'),
+        ),
+    ]
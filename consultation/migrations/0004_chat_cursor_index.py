@@ -0,0 +1,17 @@
+# Generated by Django 4.2.28 on 2026-10-17 17:46
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('consultation', '0003_note_created_indexes'),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='chatmessage',
+            index=models.Index(fields=['appointment', 'id'], name='chat_appointment_id_idx'),
+        ),
+    ]
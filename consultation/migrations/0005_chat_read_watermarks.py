@@ -0,0 +1,70 @@
+# Generated by Django 4.2.28 on 2026-10-17 18:01
+
+from django.conf import settings
+from django.db import migrations, models
+from django.db.models import Max
+import django.db.models.deletion
+
+
+def seed_watermarks(apps, schema_editor):
+    """Start each participant's watermark at the newest message of the other party they had read"""
+    Appointment = apps.get_model('appointments', 'Appointment')
+    ChatMessage = apps.get_model('consultation', 'ChatMessage')
+    ChatReadState = apps.get_model('consultation', 'ChatReadState')
+    participants = {
+        row['id']: (row['doctor__user_profile__user_id'], row['patient__user_profile__user_id'])
+        for row in Appointment.objects.filter(chat_messages__is_read=True).distinct().values(
+            'id', 'doctor__user_profile__user_id', 'patient__user_profile__user_id')
+    }
+    watermarks = {}
+    read = ChatMessage.objects.filter(is_read=True).order_by().values('appointment_id', 'sender_id').annotate(last=Max('id'))
+    for row in read:
+        for user_id in participants.get(row['appointment_id'], ()):
+            if user_id != row['sender_id']:
+                key = (row['appointment_id'], user_id)
+                watermarks[key] = max(watermarks.get(key, 0), row['last'])
+    ChatReadState.objects.bulk_create(
+        [ChatReadState(appointment_id=appointment_id, user_id=user_id, last_read_message_id=last)
+         for (appointment_id, user_id), last in watermarks.items()],
+        batch_size=1000,
+    )
+
+
+def restore_read_flags(apps, schema_editor):
+    ChatMessage = apps.get_model('consultation', 'ChatMessage')
+    ChatReadState = apps.get_model('consultation', 'ChatReadState')
+    for state in ChatReadState.objects.iterator():
+        ChatMessage.objects.filter(
+            appointment_id=state.appointment_id, id__lte=state.last_read_message_id,
+        ).exclude(sender_id=state.user_id).update(is_read=True)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+        ('appointments', '0005_appointment_doctor_patient_index'),
+        ('consultation', '0004_chat_cursor_index'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='ChatReadState',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('last_read_message_id', models.PositiveBigIntegerField(default=0)),
+                ('updated_at', models.DateTimeField(auto_now=True)),
+                ('appointment', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='chat_read_states', to='appointments.appointment')),
+                ('user', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='chat_read_states', to=settings.AUTH_USER_MODEL)),
+            ],
+        ),
+        migrations.AddConstraint(
+            model_name='chatreadstate',
+            constraint=models.UniqueConstraint(fields=('appointment', 'user'), name='unique_chat_read_state'),
+        ),
+        migrations.RunPython(seed_watermarks, restore_read_flags),
+        migrations.RemoveField(
+            model_name='chatmessage',
+            name='is_read',
+        ),
+    ]
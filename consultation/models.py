@@ -20,6 +20,13 @@ class ConsultationNote(models.Model):
     created_at = models.DateTimeField(auto_now_add=True)
     updated_at = models.DateTimeField(auto_now=True)
     
+    class Meta:
+        indexes = [
+            # Most recent notes first on the dashboards
+            models.Index(fields=['doctor', 'created_at'], name='note_doctor_created_idx'),
+            models.Index(fields=['patient', 'created_at'], name='note_patient_created_idx'),
+        ]
+    
     def __str__(self):
         return f"Consultation Note - {self.appointment}"
 
@@ -30,15 +37,47 @@ class ChatMessage(models.Model):
     sender = models.ForeignKey('auth.User', on_delete=models.CASCADE, related_name='sent_messages')
     message = models.TextField()
     timestamp = models.DateTimeField(auto_now_add=True)
-    is_read = models.BooleanField(default=False)
     
     class Meta:
         ordering = ['timestamp']
+        indexes = [
+            models.Index(fields=['appointment', 'timestamp'], name='chat_appointment_time_idx'),
+            models.Index(fields=['appointment', 'id'], name='chat_appointment_id_idx'),
+        ]
     
     def __str__(self):
         return f"{self.sender.username}: {self.message[:50]}"
 
 
+class ChatArchive(models.Model):
+    """Compacted transcript of an appointment's chat (see consultation.archive)"""
+    appointment = models.OneToOneField(Appointment, on_delete=models.CASCADE, primary_key=True, related_name='chat_archive')
+    # zlib-compressed JSON list of [id, sender_id, first_name, last_name, message, timestamp]
+    data = models.BinaryField()
+    message_count = models.PositiveIntegerField(default=0)
+    last_message_id = models.PositiveBigIntegerField(default=0)
+    archived_at = models.DateTimeField(auto_now=True)
+    
+    def __str__(self):
+        return f"Chat archive - {self.appointment}"
+
+
+class ChatReadState(models.Model):
+    """How far a user has read an appointment's chat: every message with id <= last_read_message_id"""
+    appointment = models.ForeignKey(Appointment, on_delete=models.CASCADE, related_name='chat_read_states')
+    user = models.ForeignKey('auth.User', on_delete=models.CASCADE, related_name='chat_read_states')
+    last_read_message_id = models.PositiveBigIntegerField(default=0)
+    updated_at = models.DateTimeField(auto_now=True)
+    
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(fields=['appointment', 'user'], name='unique_chat_read_state'),
+        ]
+    
+    def __str__(self):
+        return f"{self.user.username} read {self.appointment} up to #{self.last_read_message_id}"
+
+
 class VideoSession(models.Model):
     """Video consultation sessions"""
     STATUS_CHOICES = [
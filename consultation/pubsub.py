@@ -0,0 +1,97 @@
+"""
+Publish/subscribe for chat push.
+
+``get_broker()`` returns the broker named by the CHAT_BROKER setting. The
+default InProcessBroker fans messages out to the subscribers of this process
+only, which is enough for a single ASGI server; a broker shared between
+processes (e.g. one backed by Redis) only needs to implement ``subscribe``
+and ``publish`` the same way.
+
+``publish`` may be called from any thread (model signals run in the sync
+worker threads); subscriptions are consumed on the event loop that created
+them.
+"""
+import asyncio
+import threading
+from collections import defaultdict
+from django.conf import settings
+from django.utils.module_loading import import_string
+
+_broker = None
+_broker_lock = threading.Lock()
+
+
+class Subscription:
+    """A subscriber's queue of messages on one topic"""
+
+    def __init__(self, broker, topic, maxsize=0):
+        self.broker = broker
+        self.topic = topic
+        self.loop = asyncio.get_running_loop()
+        self.queue = asyncio.Queue(maxsize)
+        # Set when messages were dropped because the subscriber fell behind
+        self.overflowed = False
+
+    def deliver(self, message):
+        """Queue ``message``; safe to call from any thread"""
+        try:
+            self.loop.call_soon_threadsafe(self._put, message)
+        except RuntimeError:
+            pass  # the subscriber's loop is closed
+
+    def _put(self, message):
+        try:
+            self.queue.put_nowait(message)
+        except asyncio.QueueFull:
+            self.overflowed = True
+
+    async def get(self):
+        return await self.queue.get()
+
+    def close(self):
+        self.broker.unsubscribe(self)
+
+
+class InProcessBroker:
+    """Fan-out to the subscribers of the current process"""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._subscribers = defaultdict(set)
+
+    def subscribe(self, topic):
+        """Subscribe to ``topic``; must be called from a running event loop"""
+        subscription = Subscription(self, topic, getattr(settings, 'CHAT_PUSH_QUEUE_SIZE', 100))
+        with self._lock:
+            self._subscribers[topic].add(subscription)
+        return subscription
+
+    def unsubscribe(self, subscription):
+        with self._lock:
+            subscribers = self._subscribers.get(subscription.topic)
+            if subscribers is not None:
+                subscribers.discard(subscription)
+                if not subscribers:
+                    del self._subscribers[subscription.topic]
+
+    def publish(self, topic, message):
+        """Deliver ``message`` to every current subscriber of ``topic``; returns how many there were"""
+        with self._lock:
+            subscribers = list(self._subscribers.get(topic, ()))
+        for subscription in subscribers:
+            subscription.deliver(message)
+        return len(subscribers)
+
+
+def get_broker():
+    """The process-wide broker configured by CHAT_BROKER"""
+    global _broker
+    if _broker is None:
+        with _broker_lock:
+            if _broker is None:
+                _broker = import_string(getattr(settings, 'CHAT_BROKER', 'consultation.pubsub.InProcessBroker'))()
+    return _broker
+
+
+def chat_topic(appointment_id):
+    return f'chat:{appointment_id}'
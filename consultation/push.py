@@ -0,0 +1,170 @@
+"""
+Real-time chat push over server-sent events, served by plain ASGI.
+
+``ChatPushRouter`` wraps the Django ASGI application and takes over requests
+for the ``consultation:chat_events`` URL. Each such request becomes a
+long-lived ``text/event-stream`` response: the messages after the client's
+cursor (``?after=`` or the Last-Event-ID header of a reconnecting
+EventSource) are sent from the database, then every new message of the
+appointment is pushed as soon as the broker delivers it (see
+consultation.signals and consultation.pubsub). A subscriber that falls too
+far behind is disconnected and catches up from the database on reconnect.
+
+Under WSGI the same URL is answered by views.chat_events with a 501, and
+the chat page falls back to long-polling chat_messages.
+"""
+import asyncio
+import json
+from importlib import import_module
+from urllib.parse import parse_qs
+from asgiref.sync import sync_to_async
+from django.conf import settings
+from django.contrib import auth
+from django.db import close_old_connections
+from django.http import HttpRequest
+from django.http.cookie import parse_cookie
+from django.urls import Resolver404, resolve
+from accounts.actor import Actor
+from appointments.models import Appointment
+from .chat import can_access_chat, fetch_messages, for_recipient, get_batch_size, mark_read, serialize_message
+from .pubsub import chat_topic, get_broker
+
+EVENTS_URL_NAME = 'consultation:chat_events'
+
+
+def _header(scope, name):
+    for key, value in scope.get('headers', []):
+        if key.decode('latin-1').lower() == name:
+            return value.decode('latin-1')
+    return None
+
+
+def _authorize(scope, appointment_id):
+    """Return (user, None) for a participant of the appointment, or (None, status)"""
+    request = HttpRequest()
+    cookies = parse_cookie(_header(scope, 'cookie') or '')
+    engine = import_module(settings.SESSION_ENGINE)
+    request.session = engine.SessionStore(cookies.get(settings.SESSION_COOKIE_NAME))
+    user = auth.get_user(request)
+    if not user.is_authenticated:
+        return None, 403
+    appointment = Appointment.objects.only('doctor_id', 'patient_id').filter(pk=appointment_id).first()
+    if appointment is None:
+        return None, 404
+    actor = Actor(user)
+    if not actor.has_profile or not can_access_chat(actor, appointment):
+        return None, 403
+    return user, None
+
+
+def _cursor(scope):
+    """The id after which the client wants messages; 0 when missing or malformed"""
+    params = parse_qs(scope.get('query_string', b'').decode('latin-1'))
+    for value in (_header(scope, 'last-event-id'), (params.get('after') or [None])[0]):
+        try:
+            return max(0, int(value))
+        except (TypeError, ValueError):
+            continue
+    return 0
+
+
+def _event(payload):
+    return f"id: {payload['id']}\nevent: message\ndata: {json.dumps(payload)}\n\n".encode()
+
+
+async def _send_body(send, body):
+    await send({'type': 'http.response.body', 'body': body, 'more_body': True})
+
+
+async def _wait_for_disconnect(receive):
+    while True:
+        message = await receive()
+        if message['type'] == 'http.disconnect':
+            return
+
+
+def _backlog(appointment_id, user, after):
+    """All messages after ``after``, fetched in batches and marked read"""
+    messages = []
+    batch_size = get_batch_size()
+    while True:
+        batch = fetch_messages(appointment_id, user, after, batch_size)
+        messages.extend(batch)
+        if len(batch) < batch_size:
+            return messages
+        after = batch[-1].id
+
+
+async def stream_chat_events(scope, receive, send, appointment_id):
+    """Serve one server-sent event stream for an appointment's chat"""
+    user, status = await sync_to_async(_authorize)(scope, appointment_id)
+    if user is None:
+        await send({'type': 'http.response.start', 'status': status,
+                    'headers': [(b'content-type', b'text/plain; charset=utf-8')]})
+        await send({'type': 'http.response.body', 'body': b''})
+        return
+
+    subscription = get_broker().subscribe(chat_topic(appointment_id))
+    disconnect = asyncio.ensure_future(_wait_for_disconnect(receive))
+    keepalive = getattr(settings, 'CHAT_PUSH_KEEPALIVE', 15)
+    try:
+        await send({'type': 'http.response.start', 'status': 200, 'headers': [
+            (b'content-type', b'text/event-stream'),
+            (b'cache-control', b'no-cache'),
+            (b'x-accel-buffering', b'no'),
+        ]})
+        # Subscribed first, so nothing committed after the backlog query is missed
+        backlog = await sync_to_async(_backlog)(appointment_id, user, _cursor(scope))
+        for message in backlog:
+            await _send_body(send, _event(serialize_message(message, user)))
+        # Messages committed while the backlog was read are queued as well
+        sent = {message.id for message in backlog}
+
+        while not subscription.overflowed:
+            get = asyncio.ensure_future(subscription.get())
+            done, _ = await asyncio.wait({get, disconnect}, timeout=keepalive, return_when=asyncio.FIRST_COMPLETED)
+            if get not in done:
+                get.cancel()
+                if disconnect in done:
+                    break
+                await _send_body(send, b': keepalive\n\n')
+                continue
+            payloads = [get.result()]
+            while not subscription.queue.empty():
+                payloads.append(subscription.queue.get_nowait())
+            payloads = [payload for payload in payloads if payload['id'] not in sent]
+            for payload in payloads:
+                await _send_body(send, _event(for_recipient(payload, user)))
+            received = [payload['id'] for payload in payloads if payload['sender_id'] != user.id]
+            if received:
+                await sync_to_async(mark_read)(appointment_id, user, max(received))
+        await send({'type': 'http.response.body', 'body': b''})
+    finally:
+        subscription.close()
+        disconnect.cancel()
+        # The stream bypasses Django's request signals, which normally do this
+        await sync_to_async(close_old_connections)()
+
+
+class ChatPushRouter:
+    """ASGI application serving chat events itself and everything else through ``application``"""
+
+    def __init__(self, application):
+        self.application = application
+
+    def _appointment_id(self, scope):
+        if scope['type'] != 'http':
+            return None
+        try:
+            match = resolve(scope['path'])
+        except Resolver404:
+            return None
+        if match.view_name != EVENTS_URL_NAME:
+            return None
+        return match.kwargs['appointment_id']
+
+    async def __call__(self, scope, receive, send):
+        appointment_id = self._appointment_id(scope)
+        if appointment_id is None:
+            return await self.application(scope, receive, send)
+        return await stream_chat_events(scope, receive, send, appointment_id)
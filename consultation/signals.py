@@ -0,0 +1,16 @@
+from django.db import transaction
+from django.db.models.signals import post_save
+from django.dispatch import receiver
+from .chat import message_payload
+from .models import ChatMessage
+from .pubsub import chat_topic, get_broker
+
+
+@receiver(post_save, sender=ChatMessage)
+def push_chat_message(sender, instance, created, raw=False, **kwargs):
+    """Fan new messages out to the appointment's open chat streams once they are committed"""
+    if not created or raw:
+        return
+    topic = chat_topic(instance.appointment_id)
+    payload = message_payload(instance)
+    transaction.on_commit(lambda: get_broker().publish(topic, payload))
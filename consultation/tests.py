@@ -1,3 +1,383 @@
-from django.test import TestCase
+import asyncio
+import json
+from datetime import time, timedelta
+from io import StringIO
+from asgiref.sync import sync_to_async
+from asgiref.testing import ApplicationCommunicator
+from django.conf import settings
+from django.core.management import call_command
+from django.core.management.base import CommandError
+from django.test import TestCase, override_settings
+from django.contrib.auth.models import User
+from django.urls import reverse
+from django.utils import timezone
+from accounts.models import UserProfile, DoctorProfile, PatientProfile
+from appointments.models import Appointment
+from . import views
+from .archive import load_transcript
+from .models import ChatArchive, ChatMessage, ChatReadState
+from .pubsub import InProcessBroker
+from .push import ChatPushRouter
 
-# Create your tests here.
+
+class ChatMessagesTests(TestCase):
+    """Test cases for the incremental chat message feed"""
+
+    def setUp(self):
+        """Set up an appointment with a few messages from both sides"""
+        self.doctor_user = User.objects.create_user(username='chatdoctor', first_name='Greg', last_name='House')
+        doctor = DoctorProfile.objects.create(
+            user_profile=UserProfile.objects.create(user=self.doctor_user, user_type='doctor'),
+            specialization='Cardiology',
+            qualification='MD',
+            license_number='CHAT123'
+        )
+        self.patient_user = User.objects.create_user(username='chatpatient')
+        patient = PatientProfile.objects.create(
+            user_profile=UserProfile.objects.create(user=self.patient_user, user_type='patient')
+        )
+        self.appointment = Appointment.objects.create(
+            patient=patient,
+            doctor=doctor,
+            appointment_date=timezone.localdate() + timedelta(days=1),
+            appointment_time=time(9, 0),
+            reason='Checkup'
+        )
+        self.sent = [self.send(self.doctor_user if i % 2 else self.patient_user, f'Message {i}') for i in range(4)]
+        self.url = reverse('consultation:chat_messages', args=[self.appointment.id])
+        self.client.force_login(self.patient_user)
+
+    def send(self, user, text):
+        return ChatMessage.objects.create(appointment=self.appointment, sender=user, message=text)
+
+    def watermark(self, user=None):
+        state = ChatReadState.objects.filter(appointment=self.appointment, user=user or self.patient_user).first()
+        return state.last_read_message_id if state else 0
+
+    def test_returns_messages_after_cursor(self):
+        """Test that only messages newer than the cursor are delivered"""
+        response = self.client.get(self.url, {'after': self.sent[1].id})
+        data = response.json()
+        self.assertEqual([m['message'] for m in data['messages']], ['Message 2', 'Message 3'])
+        self.assertEqual(data['cursor'], self.sent[3].id)
+        self.assertEqual(data['messages'][1]['sender'], 'Greg House')
+        self.assertFalse(data['messages'][1]['is_mine'])
+        self.assertTrue(data['messages'][0]['is_mine'])
+
+        data = self.client.get(self.url, {'after': data['cursor']}).json()
+        self.assertEqual(data['messages'], [])
+        self.assertEqual(data['cursor'], self.sent[3].id)
+
+    @override_settings(CHAT_BATCH_SIZE=1)
+    def test_marks_only_delivered_range_read(self):
+        """Test that the read watermark advances to the last delivered message and never moves back"""
+        self.client.get(self.url, {'after': self.sent[0].id})
+        self.assertEqual(self.watermark(), self.sent[1].id)
+        self.client.get(self.url, {'after': self.sent[2].id})
+        self.assertEqual(self.watermark(), self.sent[3].id)
+        self.client.get(self.url, {'after': 0})
+        self.assertEqual(self.watermark(), self.sent[3].id)
+        self.assertEqual(self.watermark(self.doctor_user), 0)
+
+    def test_poll_query_count_is_independent_of_history(self):
+        """Test that a poll costs the same queries however long the conversation is"""
+        for i in range(20):
+            self.send(self.doctor_user, f'Old {i}')
+        cursor = ChatMessage.objects.latest('id').id
+        self.client.get(self.url)
+        self.send(self.doctor_user, 'New')
+        with self.assertNumQueries(5):
+            # session + auth user + appointment + new messages + mark read (profile cached)
+            data = self.client.get(self.url, {'after': cursor}).json()
+        self.assertEqual([m['message'] for m in data['messages']], ['New'])
+
+    @override_settings(CHAT_POLL_INTERVAL=0.01)
+    def test_long_poll_times_out_empty(self):
+        """Test that a long poll with nothing new returns an empty batch once the wait is over"""
+        data = self.client.get(self.url, {'after': self.sent[3].id, 'wait': '0.05'}).json()
+        self.assertEqual(data, {'messages': [], 'cursor': self.sent[3].id})
+
+    @override_settings(CHAT_POLL_TIMEOUT=25, CHAT_WSGI_POLL_TIMEOUT=5)
+    def test_sync_long_poll_wait_is_capped(self):
+        """Test that the WSGI feed waits at most CHAT_WSGI_POLL_TIMEOUT, however long the client asks for"""
+        timeouts = []
+        
+        def wait_for_messages(appointment_id, user, after=0, timeout=0, limit=None):
+            timeouts.append(timeout)
+            return []
+        original = views.wait_for_messages
+        views.wait_for_messages = wait_for_messages
+        self.addCleanup(setattr, views, 'wait_for_messages', original)
+        self.client.get(self.url, {'wait': '20'})
+        self.client.get(self.url, {'wait': '2'})
+        self.assertEqual(timeouts, [5, 2])
+
+    def test_invalid_parameters(self):
+        """Test that malformed cursors and waits are rejected"""
+        for params in ({'after': 'x'}, {'wait': 'soon'}, {'wait': 'nan'}):
+            self.assertEqual(self.client.get(self.url, params).status_code, 400)
+
+    def test_other_patient_is_forbidden(self):
+        """Test that users outside the appointment cannot read the chat"""
+        other = User.objects.create_user(username='otherpatient')
+        PatientProfile.objects.create(user_profile=UserProfile.objects.create(user=other, user_type='patient'))
+        self.client.force_login(other)
+        self.assertEqual(self.client.get(self.url).status_code, 403)
+
+    def test_chat_page_marks_unread_and_sets_cursor(self):
+        """Test that opening the chat page marks the doctor's messages read and hands the cursor to the poller"""
+        response = self.client.get(reverse('consultation:chat', args=[self.appointment.id]))
+        self.assertEqual(response.context['last_message_id'], self.sent[3].id)
+        self.assertEqual(self.watermark(), self.sent[3].id)
+    
+    def test_polls_do_not_write_when_nothing_is_unread(self):
+        """Test that re-delivering read messages or the user's own leaves the watermark row alone"""
+        self.client.get(self.url)
+        with self.assertNumQueries(4):
+            # session + auth user + appointment + messages (with the watermark subquery)
+            self.client.get(self.url)
+        self.send(self.patient_user, 'Mine')
+        with self.assertNumQueries(4):
+            self.client.get(self.url, {'after': self.sent[3].id})
+    
+    def test_unread_counts(self):
+        """Test the unread badge across all of a user's appointments"""
+        url = reverse('consultation:chat_unread')
+        other = Appointment.objects.create(
+            patient=self.appointment.patient, doctor=self.appointment.doctor,
+            appointment_date=self.appointment.appointment_date, appointment_time=time(10, 0), reason='Follow-up'
+        )
+        for i in range(3):
+            ChatMessage.objects.create(appointment=other, sender=self.doctor_user, message=f'Other {i}')
+        
+        with self.assertNumQueries(4):
+            # session + auth user + profile + one grouped count
+            data = self.client.get(url).json()
+        self.assertEqual(data, {'total': 5, 'appointments': {str(self.appointment.id): 2, str(other.id): 3}})
+        
+        self.client.get(self.url, {'after': self.sent[1].id})
+        self.assertEqual(self.client.get(url).json()['appointments'], {str(other.id): 3})
+        
+        self.client.force_login(self.doctor_user)
+        self.assertEqual(self.client.get(url).json(), {'total': 2, 'appointments': {str(self.appointment.id): 2}})
+
+
+class ChatPushTests(TestCase):
+    """Test cases for the server-sent chat event stream"""
+
+    def setUp(self):
+        """Set up an appointment with one message and a logged-in patient"""
+        self.doctor_user = User.objects.create_user(username='pushdoctor', first_name='Greg', last_name='House')
+        doctor = DoctorProfile.objects.create(
+            user_profile=UserProfile.objects.create(user=self.doctor_user, user_type='doctor'),
+            specialization='Cardiology',
+            qualification='MD',
+            license_number='PUSH123'
+        )
+        self.patient_user = User.objects.create_user(username='pushpatient')
+        patient = PatientProfile.objects.create(
+            user_profile=UserProfile.objects.create(user=self.patient_user, user_type='patient')
+        )
+        self.appointment = Appointment.objects.create(
+            patient=patient,
+            doctor=doctor,
+            appointment_date=timezone.localdate() + timedelta(days=1),
+            appointment_time=time(9, 0),
+            reason='Checkup'
+        )
+        self.first = ChatMessage.objects.create(appointment=self.appointment, sender=self.doctor_user, message='Hello')
+        self.client.force_login(self.patient_user)
+        self.session_key = self.client.session.session_key
+        self.fallback_calls = []
+
+    async def fallback(self, scope, receive, send):
+        self.fallback_calls.append(scope['path'])
+
+    def connect(self, session_key=None, query=b''):
+        scope = {
+            'type': 'http',
+            'method': 'GET',
+            'path': reverse('consultation:chat_events', args=[self.appointment.id]),
+            'query_string': query,
+            'headers': [(b'cookie', f'{settings.SESSION_COOKIE_NAME}={session_key or ""}'.encode())],
+        }
+        return ApplicationCommunicator(ChatPushRouter(self.fallback), scope)
+
+    async def read_event(self, communicator):
+        body = await communicator.receive_output(timeout=2)
+        self.assertEqual(body['type'], 'http.response.body')
+        data = [line for line in body['body'].decode().splitlines() if line.startswith('data: ')]
+        return json.loads(data[0][len('data: '):])
+
+    def send_message(self, text):
+        with self.captureOnCommitCallbacks(execute=True):
+            return ChatMessage.objects.create(appointment=self.appointment, sender=self.doctor_user, message=text)
+
+    async def test_backlog_then_pushed_messages(self):
+        """Test that the stream replays the backlog and then pushes new messages as they are committed"""
+        communicator = self.connect(self.session_key)
+        start = await communicator.receive_output(timeout=2)
+        self.assertEqual(start['status'], 200)
+        self.assertIn((b'content-type', b'text/event-stream'), start['headers'])
+        self.assertEqual((await self.read_event(communicator))['message'], 'Hello')
+
+        message = await sync_to_async(self.send_message)('Are you there?')
+        event = await self.read_event(communicator)
+        self.assertEqual(event['id'], message.id)
+        self.assertFalse(event['is_mine'])
+        # Delivered messages are marked read for the patient
+        self.assertTrue(await ChatReadState.objects.filter(user=self.patient_user, last_read_message_id=message.id).aexists())
+
+        await communicator.send_input({'type': 'http.disconnect'})
+        await communicator.wait(timeout=2)
+
+    async def test_resumes_after_cursor(self):
+        """Test that a reconnecting client only gets messages after its cursor"""
+        communicator = self.connect(self.session_key, query=f'after={self.first.id}'.encode())
+        await communicator.receive_output(timeout=2)
+        message = await sync_to_async(self.send_message)('Second')
+        self.assertEqual((await self.read_event(communicator))['id'], message.id)
+        await communicator.send_input({'type': 'http.disconnect'})
+        await communicator.wait(timeout=2)
+
+    async def test_anonymous_is_forbidden(self):
+        """Test that streams require a session of the appointment's doctor or patient"""
+        communicator = self.connect()
+        self.assertEqual((await communicator.receive_output(timeout=2))['status'], 403)
+        await communicator.wait(timeout=2)
+
+    async def test_other_paths_reach_django(self):
+        """Test that the router passes every other request through"""
+        scope = {'type': 'http', 'method': 'GET', 'path': reverse('dashboard:home'), 'query_string': b'', 'headers': []}
+        communicator = ApplicationCommunicator(ChatPushRouter(self.fallback), scope)
+        await communicator.wait(timeout=2)
+        self.assertEqual(self.fallback_calls, [reverse('dashboard:home')])
+
+    def test_wsgi_fallback(self):
+        """Test that the events URL tells WSGI clients to poll instead"""
+        response = self.client.get(reverse('consultation:chat_events', args=[self.appointment.id]))
+        self.assertEqual(response.status_code, 501)
+
+
+class InProcessBrokerTests(TestCase):
+    """Test cases for the in-process chat broker"""
+
+    async def test_fan_out_and_overflow(self):
+        """Test that every subscriber of a topic gets each message and slow ones are flagged"""
+        broker = InProcessBroker()
+        with self.settings(CHAT_PUSH_QUEUE_SIZE=2):
+            subscribers = [broker.subscribe('chat:1') for _ in range(3)]
+        other = broker.subscribe('chat:2')
+        self.assertEqual(broker.publish('chat:1', {'id': 1}), 3)
+        await asyncio.sleep(0)
+        for subscription in subscribers:
+            self.assertEqual(await subscription.get(), {'id': 1})
+        self.assertTrue(other.queue.empty())
+
+        for i in range(3):
+            broker.publish('chat:1', {'id': i})
+        await asyncio.sleep(0)
+        self.assertTrue(subscribers[0].overflowed)
+
+        for subscription in subscribers + [other]:
+            subscription.close()
+        self.assertEqual(broker.publish('chat:1', {'id': 4}), 0)
+
+
+class ChatArchiveTests(TestCase):
+    """Test cases for chat transcript archival"""
+
+    def setUp(self):
+        """Set up a completed appointment with a month-old status change and a few messages"""
+        self.doctor_user = User.objects.create_user(username='archivedoctor', first_name='Greg', last_name='House')
+        doctor = DoctorProfile.objects.create(
+            user_profile=UserProfile.objects.create(user=self.doctor_user, user_type='doctor'),
+            specialization='Cardiology',
+            qualification='MD',
+            license_number='ARCH123'
+        )
+        self.patient_user = User.objects.create_user(username='archivepatient')
+        patient = PatientProfile.objects.create(
+            user_profile=UserProfile.objects.create(user=self.patient_user, user_type='patient')
+        )
+        self.appointment = Appointment.objects.create(
+            patient=patient,
+            doctor=doctor,
+            appointment_date=timezone.localdate() - timedelta(days=60),
+            appointment_time=time(9, 0),
+            reason='Checkup',
+            status='completed'
+        )
+        self.recent = Appointment.objects.create(
+            patient=patient,
+            doctor=doctor,
+            appointment_date=timezone.localdate(),
+            appointment_time=time(10, 0),
+            reason='Follow-up',
+            status='completed'
+        )
+        for i in range(5):
+            self.send(self.appointment, f'Message {i}')
+        self.send(self.recent, 'Recent')
+        self.age(self.appointment)
+
+    def send(self, appointment, text):
+        return ChatMessage.objects.create(appointment=appointment, sender=self.doctor_user, message=text)
+
+    def age(self, appointment, days=45):
+        Appointment.objects.filter(pk=appointment.pk).update(updated_at=timezone.now() - timedelta(days=days))
+
+    def archive(self, *args):
+        out = StringIO()
+        call_command('archive_chats', *args, stdout=out)
+        return out.getvalue()
+
+    def test_archives_old_finished_chats(self):
+        """Test that only old completed or cancelled chats are compacted and their live rows deleted"""
+        output = self.archive('--batch-size', '2')
+        self.assertIn('Archived 1 chats (5 messages)', output)
+        self.assertFalse(ChatMessage.objects.filter(appointment=self.appointment).exists())
+        self.assertTrue(ChatMessage.objects.filter(appointment=self.recent).exists())
+        archive = ChatArchive.objects.get(appointment=self.appointment)
+        self.assertEqual(archive.message_count, 5)
+
+        transcript = load_transcript(Appointment.objects.select_related('chat_archive').get(pk=self.appointment.pk))
+        self.assertEqual([m.message for m in transcript], [f'Message {i}' for i in range(5)])
+        self.assertEqual(transcript[0].sender, self.doctor_user)
+        self.assertEqual(transcript[0].sender.get_full_name(), 'Greg House')
+        self.assertEqual(transcript[-1].id, archive.last_message_id)
+
+        # Nothing left to do on a second run
+        self.assertIn('Archived 0 chats (0 messages)', self.archive())
+
+    def test_late_messages_are_merged(self):
+        """Test that messages added after archiving are folded into the existing archive"""
+        self.archive()
+        self.send(self.appointment, 'Late')
+        self.age(self.appointment)
+        self.archive()
+        archive = ChatArchive.objects.get(appointment=self.appointment)
+        self.assertEqual(archive.message_count, 6)
+        transcript = load_transcript(Appointment.objects.select_related('chat_archive').get(pk=self.appointment.pk))
+        self.assertEqual(transcript[-1].message, 'Late')
+
+    def test_dry_run_and_scheduled(self):
+        """Test that a dry run changes nothing and unfinished appointments are never archived"""
+        self.assertIn('1 chats would be archived.', self.archive('--dry-run'))
+        self.assertEqual(ChatMessage.objects.filter(appointment=self.appointment).count(), 5)
+        Appointment.objects.filter(pk=self.appointment.pk).update(status='scheduled')
+        self.assertIn('0 chats would be archived.', self.archive('--dry-run'))
+        with self.assertRaises(CommandError):
+            self.archive('--batch-size', '0')
+
+    def test_chat_page_shows_archived_and_live_messages(self):
+        """Test that the chat page reads archived transcripts transparently"""
+        self.archive()
+        live = self.send(self.appointment, 'Live')
+        self.client.force_login(self.patient_user)
+        response = self.client.get(reverse('consultation:chat', args=[self.appointment.id]))
+        self.assertEqual(
+            [m.message for m in response.context['messages_list']], [f'Message {i}' for i in range(5)] + ['Live']
+        )
+        self.assertEqual(response.context['last_message_id'], live.id)
+        self.assertContains(response, 'Message 0')
@@ -7,8 +7,16 @@ urlpatterns = [
     path('notes/', views.consultation_notes_list, name='notes_list'),
     path('notes/<int:pk>/', views.consultation_note_detail, name='note_detail'),
     path('notes/create/<int:appointment_id>/', views.create_consultation_note, name='create_note'),
+    path('chat/unread/', views.chat_unread, name='chat_unread'),
     path('chat/<int:appointment_id>/', views.chat_interface, name='chat'),
+    path('chat/<int:appointment_id>/messages/', views.chat_messages, name='chat_messages'),
+    path('chat/<int:appointment_id>/events/', views.chat_events, name='chat_events'),
     path('video/<int:appointment_id>/', views.video_session, name='video_session'),
     path('video/<int:appointment_id>/start/', views.start_video_session, name='start_video'),
     path('video/<int:appointment_id>/end/', views.end_video_session, name='end_video'),
 ]
+
+# Async variants, served instead of the views above under ASGI (see healthcare_system.asgi_urls)
+async_urlpatterns = [
+    path('chat/<int:appointment_id>/messages/', views.chat_messages_async, name='chat_messages'),
+]
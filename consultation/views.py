@@ -1,10 +1,17 @@
 from django.shortcuts import render, redirect, get_object_or_404
 from django.contrib.auth.decorators import login_required
 from django.contrib import messages
+from django.http import Http404, JsonResponse
 from django.utils import timezone
-from accounts.models import UserProfile, DoctorProfile, PatientProfile
+from accounts.decorators import async_login_required
 from appointments.models import Appointment
+from .chat import (
+    await_messages, can_access_chat, get_max_sync_wait, get_max_wait, mark_read, serialize_message, unread_counts,
+    wait_for_messages,
+)
+from .archive import load_transcript
 from .models import ConsultationNote, ChatMessage, VideoSession
+import math
 import uuid
 
 # Create your views here.
@@ -12,18 +19,16 @@ import uuid
 @login_required
 def consultation_notes_list(request):
     """List consultation notes"""
-    user_profile = UserProfile.objects.get(user=request.user)
+    actor = request.actor
     
-    if user_profile.user_type == 'doctor':
-        doctor_profile = DoctorProfile.objects.get(user_profile=user_profile)
-        notes = ConsultationNote.objects.filter(doctor=doctor_profile)
+    if actor.is_doctor:
+        notes = ConsultationNote.objects.filter(doctor=actor.doctor_profile).select_related('patient__user_profile__user')
     else:
-        patient_profile = PatientProfile.objects.get(user_profile=user_profile)
-        notes = ConsultationNote.objects.filter(patient=patient_profile)
+        notes = ConsultationNote.objects.filter(patient=actor.patient_profile).select_related('doctor__user_profile__user')
     
     context = {
         'notes': notes,
-        'user_profile': user_profile,
+        'user_profile': actor.user_profile,
     }
     return render(request, 'consultation/notes_list.html', context)
 
@@ -31,16 +36,16 @@ def consultation_notes_list(request):
 @login_required
 def create_consultation_note(request, appointment_id):
     """Create consultation note for an appointment (for doctors)"""
-    user_profile = UserProfile.objects.get(user=request.user)
+    actor = request.actor
     
-    if user_profile.user_type != 'doctor':
+    if not actor.is_doctor:
         messages.error(request, 'Only doctors can create consultation notes.')
         return redirect('dashboard:home')
     
-    doctor_profile = DoctorProfile.objects.get(user_profile=user_profile)
+    doctor_profile = actor.doctor_profile
     appointment = get_object_or_404(Appointment, pk=appointment_id)
     
-    if appointment.doctor != doctor_profile:
+    if appointment.doctor_id != doctor_profile.id:
         messages.error(request, 'You do not have permission to create notes for this appointment.')
         return redirect('dashboard:home')
     
@@ -73,7 +78,7 @@ def create_consultation_note(request, appointment_id):
     
     context = {
         'appointment': appointment,
-        'user_profile': user_profile,
+        'user_profile': actor.user_profile,
     }
     return render(request, 'consultation/create_note.html', context)
 
@@ -82,18 +87,17 @@ def create_consultation_note(request, appointment_id):
 def consultation_note_detail(request, pk):
     """View consultation note details"""
     note = get_object_or_404(ConsultationNote, pk=pk)
-    user_profile = UserProfile.objects.get(user=request.user)
+    actor = request.actor
     
     # Check permissions
-    if user_profile.user_type == 'patient':
-        patient_profile = PatientProfile.objects.get(user_profile=user_profile)
-        if note.patient != patient_profile:
+    if actor.is_patient:
+        if note.patient_id != actor.patient_profile.id:
             messages.error(request, 'You do not have permission to view this note.')
             return redirect('dashboard:home')
     
     context = {
         'note': note,
-        'user_profile': user_profile,
+        'user_profile': actor.user_profile,
     }
     return render(request, 'consultation/note_detail.html', context)
 
@@ -101,26 +105,13 @@ def consultation_note_detail(request, pk):
 @login_required
 def chat_interface(request, appointment_id):
     """Chat interface for an appointment"""
-    appointment = get_object_or_404(Appointment, pk=appointment_id)
-    user_profile = UserProfile.objects.get(user=request.user)
+    appointment = get_object_or_404(Appointment.objects.select_related('chat_archive'), pk=appointment_id)
+    actor = request.actor
     
     # Check permissions
-    if user_profile.user_type == 'doctor':
-        doctor_profile = DoctorProfile.objects.get(user_profile=user_profile)
-        if appointment.doctor != doctor_profile:
-            messages.error(request, 'You do not have permission to access this chat.')
-            return redirect('dashboard:home')
-    else:
-        patient_profile = PatientProfile.objects.get(user_profile=user_profile)
-        if appointment.patient != patient_profile:
-            messages.error(request, 'You do not have permission to access this chat.')
-            return redirect('dashboard:home')
-    
-    # Get chat messages
-    messages_list = ChatMessage.objects.filter(appointment=appointment)
-    
-    # Mark messages as read
-    ChatMessage.objects.filter(appointment=appointment).exclude(sender=request.user).update(is_read=True)
+    if not can_access_chat(actor, appointment):
+        messages.error(request, 'You do not have permission to access this chat.')
+        return redirect('dashboard:home')
     
     if request.method == 'POST':
         message_text = request.POST.get('message')
@@ -132,29 +123,113 @@ def chat_interface(request, appointment_id):
             )
             return redirect('consultation:chat', appointment_id=appointment_id)
     
+    # Get chat messages: the archived transcript, if any, followed by the live messages
+    messages_list = load_transcript(appointment)
+    messages_list += ChatMessage.objects.filter(appointment=appointment).select_related('sender')
+    last_message_id = max((message.id for message in messages_list), default=0)
+    
+    # Everything shown is read; newer messages are delivered by chat_messages
+    if last_message_id:
+        mark_read(appointment.id, request.user, last_message_id)
+    
     context = {
         'appointment': appointment,
         'messages_list': messages_list,
-        'user_profile': user_profile,
+        'last_message_id': last_message_id,
+        'poll_timeout': get_max_wait(),
+        'user_profile': actor.user_profile,
     }
     return render(request, 'consultation/chat.html', context)
 
 
+def _chat_feed_params(request, max_wait):
+    """(after, wait) from the query string, wait capped at ``max_wait``; raises ValueError if malformed"""
+    after = max(0, int(request.GET.get('after', 0)))
+    wait = float(request.GET.get('wait', 0))
+    if not math.isfinite(wait):
+        raise ValueError('Invalid wait')
+    return after, max(0, min(wait, max_wait))
+
+
+def _chat_feed_response(request, messages_list, after):
+    return JsonResponse({
+        'messages': [serialize_message(message, request.user) for message in messages_list],
+        'cursor': messages_list[-1].id if messages_list else after,
+    })
+
+
+@login_required
+def chat_messages(request, appointment_id):
+    """JSON feed of the chat messages after the ``after`` id, long-polling up to ``wait`` seconds.
+
+    A waiting poll holds its worker thread, so the wait is capped at
+    CHAT_WSGI_POLL_TIMEOUT; chat_messages_async serves the full CHAT_POLL_TIMEOUT under ASGI.
+    """
+    appointment = get_object_or_404(Appointment.objects.only('doctor_id', 'patient_id'), pk=appointment_id)
+    if not can_access_chat(request.actor, appointment):
+        return JsonResponse({'error': 'You do not have permission to access this chat.'}, status=403)
+    
+    try:
+        after, wait = _chat_feed_params(request, get_max_sync_wait())
+    except ValueError:
+        return JsonResponse({'error': 'Invalid chat parameters.'}, status=400)
+    
+    messages_list = wait_for_messages(appointment.id, request.user, after, timeout=wait)
+    return _chat_feed_response(request, messages_list, after)
+
+
+@async_login_required
+async def chat_messages_async(request, appointment_id):
+    """Async variant of chat_messages, served under ASGI; a waiting poll holds no thread"""
+    appointment = await Appointment.objects.only('doctor_id', 'patient_id').filter(pk=appointment_id).afirst()
+    if appointment is None:
+        raise Http404('No Appointment matches the given query.')
+    if not can_access_chat(request.actor, appointment):
+        return JsonResponse({'error': 'You do not have permission to access this chat.'}, status=403)
+    
+    try:
+        after, wait = _chat_feed_params(request, get_max_wait())
+    except ValueError:
+        return JsonResponse({'error': 'Invalid chat parameters.'}, status=400)
+    
+    messages_list = await await_messages(appointment.id, request.user, after, timeout=wait)
+    return _chat_feed_response(request, messages_list, after)
+
+
+@login_required
+def chat_unread(request):
+    """JSON unread message counts across all of the user's appointment chats"""
+    actor = request.actor
+    if actor.is_doctor:
+        appointments = Appointment.objects.filter(doctor=actor.doctor_profile)
+    else:
+        appointments = Appointment.objects.filter(patient=actor.patient_profile)
+    counts = unread_counts(request.user, appointments.values('id'))
+    return JsonResponse({
+        'total': sum(counts.values()),
+        'appointments': {str(appointment_id): count for appointment_id, count in counts.items()},
+    })
+
+
+@login_required
+def chat_events(request, appointment_id):
+    """Server-sent chat events; served by consultation.push under ASGI"""
+    return JsonResponse({'error': 'Chat push requires the ASGI server; poll chat_messages instead.'}, status=501)
+
+
 @login_required
 def video_session(request, appointment_id):
     """Video consultation interface"""
     appointment = get_object_or_404(Appointment, pk=appointment_id)
-    user_profile = UserProfile.objects.get(user=request.user)
+    actor = request.actor
     
     # Check permissions
-    if user_profile.user_type == 'doctor':
-        doctor_profile = DoctorProfile.objects.get(user_profile=user_profile)
-        if appointment.doctor != doctor_profile:
+    if actor.is_doctor:
+        if appointment.doctor_id != actor.doctor_profile.id:
             messages.error(request, 'You do not have permission to access this video session.')
             return redirect('dashboard:home')
     else:
-        patient_profile = PatientProfile.objects.get(user_profile=user_profile)
-        if appointment.patient != patient_profile:
+        if appointment.patient_id != actor.patient_profile.id:
             messages.error(request, 'You do not have permission to access this video session.')
             return redirect('dashboard:home')
     
@@ -167,7 +242,7 @@ def video_session(request, appointment_id):
     context = {
         'appointment': appointment,
         'video_session': video_session,
-        'user_profile': user_profile,
+        'user_profile': actor.user_profile,
     }
     return render(request, 'consultation/video_session.html', context)
 
@@ -0,0 +1,188 @@
+"""
+Materialized per-doctor statistics (DoctorStats).
+
+Rows are kept current by the signal handlers in dashboard.signals, which turn
+every Appointment, ConsultationNote and VideoSession write into a handful of
+F() increments. New doctors start with an all-zero row; a row that is missing
+anyway (e.g. for doctors created before the table existed) is computed from
+scratch on first read. ``rebuild`` recomputes every row in bulk, in place and
+with the rows locked so that no concurrent increment is lost, and
+``check_consistency`` compares the stored rows with a fresh computation.
+"""
+from datetime import timedelta
+from django.db import transaction
+from django.db.models import Case, Count, F, Q, Subquery, Sum, When
+from django.db.models.functions import Coalesce
+from django.utils import timezone
+from accounts.models import DoctorProfile
+from appointments.models import Appointment
+from consultation.models import ConsultationNote, VideoSession
+from .models import DoctorStats
+
+STATUS_FIELDS = {status: f'{status}_count' for status, _ in Appointment.STATUS_CHOICES}
+
+COUNTER_FIELDS = [
+    'distinct_patients',
+    *STATUS_FIELDS.values(),
+    'completed_this_month',
+    'consultation_notes',
+    'video_sessions',
+    'video_minutes',
+]
+
+
+def month_start(day):
+    return day.replace(day=1)
+
+
+def next_month(month):
+    return (month.replace(day=28) + timedelta(days=4)).replace(day=1)
+
+
+def compute_stats(doctor_ids=None, month=None):
+    """Compute DoctorStats (unsaved) from the source tables with one grouped query per table"""
+    month = month or month_start(timezone.localdate())
+    doctors = DoctorProfile.objects.all()
+    appointments = Appointment.objects.all()
+    notes = ConsultationNote.objects.all()
+    videos = VideoSession.objects.filter(status='completed')
+    if doctor_ids is not None:
+        doctors = doctors.filter(pk__in=doctor_ids)
+        appointments = appointments.filter(doctor_id__in=doctor_ids)
+        notes = notes.filter(doctor_id__in=doctor_ids)
+        videos = videos.filter(appointment__doctor_id__in=doctor_ids)
+
+    stats = {doctor_id: DoctorStats(doctor_id=doctor_id, month=month) for doctor_id in doctors.values_list('pk', flat=True)}
+
+    status_counts = {field: Count('id', filter=Q(status=status)) for status, field in STATUS_FIELDS.items()}
+    rows = appointments.order_by().values('doctor_id').annotate(
+        distinct_patients=Count('patient', distinct=True),
+        completed_this_month=Count('id', filter=Q(
+            status='completed',
+            appointment_date__gte=month,
+            appointment_date__lt=next_month(month),
+        )),
+        **status_counts,
+    )
+    for row in rows:
+        row_stats = stats.get(row.pop('doctor_id'))
+        if row_stats is not None:
+            for field, value in row.items():
+                setattr(row_stats, field, value)
+
+    for doctor_id, count in notes.order_by().values('doctor_id').annotate(n=Count('id')).values_list('doctor_id', 'n'):
+        if doctor_id in stats:
+            stats[doctor_id].consultation_notes = count
+
+    video_rows = videos.order_by().values('appointment__doctor_id').annotate(n=Count('id'), minutes=Sum('duration_minutes'))
+    for row in video_rows:
+        row_stats = stats.get(row['appointment__doctor_id'])
+        if row_stats is not None:
+            row_stats.video_sessions = row['n']
+            row_stats.video_minutes = row['minutes'] or 0
+    return stats
+
+
+def rebuild(doctor_ids=None, batch_size=1000):
+    """Recompute the DoctorStats rows (all of them by default); returns the row count"""
+    with transaction.atomic():
+        existing = DoctorStats.objects.select_for_update()
+        if doctor_ids is not None:
+            existing = existing.filter(doctor_id__in=doctor_ids)
+        # Locked before counting, so an increment committed meanwhile waits and then
+        # applies on top of the new values; the rows are updated rather than
+        # replaced for the same reason (a waiting UPDATE skips deleted rows)
+        existing = set(existing.order_by('pk').values_list('pk', flat=True))
+        stats = compute_stats(doctor_ids)
+        now = timezone.now()
+        for row in stats.values():
+            row.updated_at = now
+        DoctorStats.objects.bulk_update(
+            [row for doctor_id, row in stats.items() if doctor_id in existing],
+            [*COUNTER_FIELDS, 'month', 'updated_at'], batch_size=batch_size,
+        )
+        DoctorStats.objects.bulk_create(
+            [row for doctor_id, row in stats.items() if doctor_id not in existing], batch_size=batch_size,
+        )
+    return len(stats)
+
+
+def check_consistency(doctor_ids=None):
+    """Compare stored rows with a fresh computation.
+
+    Returns a list of (doctor_id, field, stored, expected); a missing row is
+    reported once with field None.
+    """
+    month = month_start(timezone.localdate())
+    expected = compute_stats(doctor_ids, month)
+    stored = DoctorStats.objects.in_bulk(list(expected))
+    mismatches = []
+    for doctor_id, fresh in expected.items():
+        row = stored.get(doctor_id)
+        if row is None:
+            mismatches.append((doctor_id, None, None, None))
+            continue
+        for field in COUNTER_FIELDS:
+            if field == 'completed_this_month' and row.month != month:
+                continue  # refreshed lazily on the next read
+            if getattr(row, field) != getattr(fresh, field):
+                mismatches.append((doctor_id, field, getattr(row, field), getattr(fresh, field)))
+    return mismatches
+
+
+def get_stats(doctor_id):
+    """Return the doctor's DoctorStats, materializing it or rolling its month over when needed"""
+    month = month_start(timezone.localdate())
+    stats = DoctorStats.objects.filter(doctor_id=doctor_id).first()
+    if stats is None:
+        with transaction.atomic():
+            fresh = compute_stats([doctor_id], month).get(doctor_id)
+            if fresh is None:
+                raise DoctorStats.DoesNotExist(f'No doctor with id {doctor_id}')
+            # A concurrent first read may have created the row already; keep that one
+            stats, _ = DoctorStats.objects.get_or_create(
+                doctor_id=doctor_id, defaults={field: getattr(fresh, field) for field in [*COUNTER_FIELDS, 'month']},
+            )
+        return stats
+    if stats.month != month:
+        completed = Appointment.objects.filter(
+            doctor_id=doctor_id,
+            status='completed',
+            appointment_date__gte=month,
+            appointment_date__lt=next_month(month),
+        ).order_by().values('doctor_id').annotate(n=Count('id')).values('n')
+        # One conditional UPDATE, so a delta applied since the read is not overwritten
+        DoctorStats.objects.filter(doctor_id=doctor_id, month=stats.month).update(
+            month=month, completed_this_month=Coalesce(Subquery(completed), 0), updated_at=timezone.now(),
+        )
+        stats.refresh_from_db()
+    return stats
+
+
+def create_empty(doctor_id):
+    """Materialize the all-zero row of a doctor that has no history yet"""
+    DoctorStats.objects.get_or_create(doctor_id=doctor_id, defaults={'month': month_start(timezone.localdate())})
+
+
+def lock(doctor_ids):
+    """Lock the doctors' rows until the end of the current transaction, where the database supports it"""
+    list(DoctorStats.objects.select_for_update().filter(doctor_id__in=doctor_ids).order_by('pk').values_list('pk'))
+
+
+def apply_deltas(doctor_id, deltas, completed_months=None):
+    """Add ``deltas`` (field -> int) to a doctor's row in one UPDATE.
+
+    ``completed_months`` maps month -> delta for completed_this_month, applied
+    only when it matches the row's current month. Rows that are not
+    materialized yet are left alone.
+    """
+    updates = {field: F(field) + delta for field, delta in deltas.items() if delta}
+    months = {month: delta for month, delta in (completed_months or {}).items() if delta}
+    if months:
+        updates['completed_this_month'] = Case(
+            *[When(month=month, then=F('completed_this_month') + delta) for month, delta in months.items()],
+            default=F('completed_this_month'),
+        )
+    if updates:
+        updates['updated_at'] = timezone.now()
+        DoctorStats.objects.filter(doctor_id=doctor_id).update(**updates)
@@ -0,0 +1,74 @@
+"""
+Single-pass loader for the patient dashboard.
+
+Both appointment lists (upcoming and past) come from one windowed query: each
+row is tagged with its list, numbered within it and counted, and only the
+first ``limit`` rows per list are returned. Medical records take a second
+query. Doctor names are joined in and only the columns the page renders are
+selected, so the page costs the same few queries however long the history is.
+"""
+from django.db.models import Case, CharField, Count, F, Q, Value, When, Window
+from django.db.models.functions import RowNumber
+from django.utils import timezone
+from appointments.models import UPCOMING_STATUSES, Appointment
+from reports.models import MedicalRecord
+
+DOCTOR_COLUMNS = (
+    'doctor',
+    'doctor__user_profile',
+    'doctor__user_profile__user',
+    'doctor__user_profile__user__first_name',
+    'doctor__user_profile__user__last_name',
+)
+
+APPOINTMENT_COLUMNS = ('appointment_date', 'appointment_time', 'status', 'reason', *DOCTOR_COLUMNS)
+
+RECORD_COLUMNS = ('record_date', 'diagnosis', 'created_at', *DOCTOR_COLUMNS)
+
+
+def _appointment_list():
+    return Case(
+        When(status__in=UPCOMING_STATUSES, then=Value('upcoming')),
+        When(status='completed', then=Value('past')),
+        output_field=CharField(),
+    )
+
+
+def load_patient_dashboard(patient_profile, today=None, limit=5):
+    """Return the patient dashboard's lists and their total sizes"""
+    today = today or timezone.localdate()
+    appointment_list = _appointment_list()
+    appointments = Appointment.objects.filter(
+        Q(appointment_date__gte=today, status__in=UPCOMING_STATUSES) | Q(status='completed'),
+        patient=patient_profile,
+    ).select_related('doctor__user_profile__user').only(*APPOINTMENT_COLUMNS).annotate(
+        appointment_list=appointment_list,
+        position=Window(
+            RowNumber(),
+            partition_by=[appointment_list],
+            order_by=[F('appointment_date').desc(), F('appointment_time').desc()],
+        ),
+        list_total=Window(Count('id'), partition_by=[appointment_list]),
+    ).filter(position__lte=limit).order_by('appointment_list', 'position')
+
+    lists = {'upcoming': [], 'past': []}
+    totals = {'upcoming': 0, 'past': 0}
+    for appointment in appointments:
+        lists[appointment.appointment_list].append(appointment)
+        totals[appointment.appointment_list] = appointment.list_total
+
+    records = list(
+        MedicalRecord.objects.filter(patient=patient_profile)
+        .select_related('doctor__user_profile__user')
+        .only(*RECORD_COLUMNS)
+        .annotate(total=Window(Count('id')))[:limit]
+    )
+
+    return {
+        'upcoming_appointments': lists['upcoming'],
+        'past_appointments': lists['past'],
+        'medical_history': records,
+        'total_upcoming': totals['upcoming'],
+        'total_past': totals['past'],
+        'total_records': records[0].total if records else 0,
+    }
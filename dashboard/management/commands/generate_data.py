@@ -0,0 +1,62 @@
+import time
+from django.core.management.base import BaseCommand, CommandError
+from dashboard import synthetic
+
+
+class Command(BaseCommand):
+    help = ('Generate synthetic doctors, patients, appointments, records, reports, notes and chats with '
+            'bulk inserts, e.g. --doctors 10000 --patients 1000000 --appointments 20000000, and report '
+            'the insert throughput')
+
+    def add_arguments(self, parser):
+        parser.add_argument('--doctors', type=int, default=100)
+        parser.add_argument('--patients', type=int, default=1000)
+        parser.add_argument('--appointments', type=int, default=10000,
+                            help='Spread evenly over the doctors and from --days-back days ago to --days-ahead')
+        parser.add_argument('--note-rate', type=float, default=0.6,
+                            help='Share of completed appointments with a consultation note')
+        parser.add_argument('--record-rate', type=float, default=0.8,
+                            help='Share of completed appointments with a medical record')
+        parser.add_argument('--report-rate', type=float, default=0.3,
+                            help='Share of medical records with a report')
+        parser.add_argument('--chat-rate', type=float, default=0.5,
+                            help='Share of completed appointments with a chat')
+        parser.add_argument('--chat-messages', type=int, default=6, help='Messages per chat')
+        parser.add_argument('--days-back', type=int, default=365,
+                            help='How many days ago the first appointments are')
+        parser.add_argument('--days-ahead', type=int, default=30,
+                            help='How many days ahead appointments are booked')
+        parser.add_argument('--seed', type=int, default=0)
+        parser.add_argument('--prefix', default='synth', help='Prefix of the generated usernames')
+        parser.add_argument('--batch-size', type=int, default=5000, help='Rows per bulk insert and transaction')
+        parser.add_argument('--skip-derived', action='store_true',
+                            help='Do not rebuild DoctorStats and the search index afterwards')
+
+    def handle(self, *args, **options):
+        for name in ('doctors', 'patients', 'appointments', 'chat_messages', 'days_back', 'days_ahead'):
+            if options[name] < 0:
+                raise CommandError(f"--{name.replace('_', '-')} must not be negative.")
+        for name in ('note_rate', 'record_rate', 'report_rate', 'chat_rate'):
+            if not 0 <= options[name] <= 1:
+                raise CommandError(f"--{name.replace('_', '-')} must be between 0 and 1.")
+        if options['batch_size'] < 1:
+            raise CommandError('--batch-size must be positive.')
+
+        started = time.perf_counter()
+        try:
+            timings = synthetic.generate(
+                options['doctors'], options['patients'], options['appointments'], seed=options['seed'],
+                prefix=options['prefix'], batch_size=options['batch_size'], days_back=options['days_back'],
+                days_ahead=options['days_ahead'], derived=not options['skip_derived'], note_rate=options['note_rate'],
+                record_rate=options['record_rate'], report_rate=options['report_rate'],
+                chat_rate=options['chat_rate'], chat_messages=options['chat_messages'],
+            )
+        except ValueError as e:
+            raise CommandError(str(e))
+
+        for label, (rows, seconds) in timings.items():
+            rate = rows / seconds if seconds else 0
+            self.stdout.write(f'{label:<32} {rows:>12,} rows {seconds:>9.2f}s {rate:>12,.0f} rows/s')
+        total = sum(rows for rows, _ in timings.values())
+        self.stdout.write(self.style.SUCCESS(
+            f'Generated {total:,} rows in {time.perf_counter() - started:.2f}s.'))
@@ -0,0 +1,35 @@
+import time
+from django.core.management.base import BaseCommand, CommandError
+from dashboard import doctor_stats
+
+
+class Command(BaseCommand):
+    help = 'Rebuild the materialized DoctorStats table from scratch, or check it against the source tables'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--check', action='store_true',
+                            help='Only compare the stored rows with a fresh computation; fail on differences')
+        parser.add_argument('--doctor', type=int, action='append', dest='doctors',
+                            help='Limit to this DoctorProfile id (repeatable)')
+        parser.add_argument('--batch-size', type=int, default=1000)
+
+    def handle(self, *args, **options):
+        doctor_ids = options['doctors']
+        started = time.perf_counter()
+
+        if options['check']:
+            mismatches = doctor_stats.check_consistency(doctor_ids)
+            for doctor_id, field, stored, expected in mismatches:
+                if field is None:
+                    self.stdout.write(f'doctor {doctor_id}: no stats row')
+                else:
+                    self.stdout.write(f'doctor {doctor_id}: {field} is {stored}, expected {expected}')
+            if mismatches:
+                raise CommandError(f'{len(mismatches)} inconsistencies found.')
+            self.stdout.write(self.style.SUCCESS(
+                f'DoctorStats is consistent ({time.perf_counter() - started:.2f}s).'))
+            return
+
+        count = doctor_stats.rebuild(doctor_ids, batch_size=options['batch_size'])
+        self.stdout.write(self.style.SUCCESS(
+            f'Rebuilt stats for {count} doctors in {time.perf_counter() - started:.2f}s.'))
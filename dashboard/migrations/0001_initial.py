@@ -0,0 +1,37 @@
+# Generated by Django 4.2.28 on 2026-10-17 17:39
+
+from django.db import migrations, models
+import django.db.models.deletion
+
+
+class Migration(migrations.Migration):
+
+    initial = True
+
+    dependencies = [
+        ('accounts', '0001_initial'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='DoctorStats',
+            fields=[
+                ('doctor', models.OneToOneField(on_delete=django.db.models.deletion.CASCADE, primary_key=True, related_name='stats', serialize=False, to='accounts.doctorprofile')),
+                ('distinct_patients', models.IntegerField(default=0)),
+                ('scheduled_count', models.IntegerField(default=0)),
+                ('confirmed_count', models.IntegerField(default=0)),
+                ('completed_count', models.IntegerField(default=0)),
+                ('cancelled_count', models.IntegerField(default=0)),
+                ('rescheduled_count', models.IntegerField(default=0)),
+                ('month', models.DateField()),
+                ('completed_this_month', models.IntegerField(default=0)),
+                ('consultation_notes', models.IntegerField(default=0)),
+                ('video_sessions', models.IntegerField(default=0)),
+                ('video_minutes', models.IntegerField(default=0)),
+                ('updated_at', models.DateTimeField(auto_now=True)),
+            ],
+            options={
+                'verbose_name_plural': 'doctor stats',
+            },
+        ),
+    ]
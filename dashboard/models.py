@@ -1,3 +1,39 @@
 from django.db import models
+from accounts.models import DoctorProfile
 
 # Create your models here.
+
+class DoctorStats(models.Model):
+    """Per-doctor summary counters, maintained incrementally by dashboard.signals"""
+    doctor = models.OneToOneField(DoctorProfile, on_delete=models.CASCADE, primary_key=True, related_name='stats')
+
+    distinct_patients = models.IntegerField(default=0)
+
+    # Appointments per status
+    scheduled_count = models.IntegerField(default=0)
+    confirmed_count = models.IntegerField(default=0)
+    completed_count = models.IntegerField(default=0)
+    cancelled_count = models.IntegerField(default=0)
+    rescheduled_count = models.IntegerField(default=0)
+
+    # Completed appointments dated within ``month`` (first day of that month)
+    month = models.DateField()
+    completed_this_month = models.IntegerField(default=0)
+
+    consultation_notes = models.IntegerField(default=0)
+
+    # Completed video sessions and their total length
+    video_sessions = models.IntegerField(default=0)
+    video_minutes = models.IntegerField(default=0)
+
+    updated_at = models.DateTimeField(auto_now=True)
+
+    class Meta:
+        verbose_name_plural = 'doctor stats'
+
+    @property
+    def average_video_minutes(self):
+        return self.video_minutes / self.video_sessions if self.video_sessions else 0
+
+    def __str__(self):
+        return f"Stats for {self.doctor}"
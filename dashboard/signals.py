@@ -0,0 +1,206 @@
+from collections import defaultdict
+from django.db import transaction
+from django.db.models.signals import post_init, pre_save, post_save, post_delete
+from django.dispatch import receiver
+from accounts.models import DoctorProfile
+from appointments.models import Appointment
+from consultation.models import ConsultationNote, VideoSession
+from .stats import invalidate_doctor_stats
+from . import doctor_stats
+
+APPOINTMENT_STATE = ('doctor_id', 'patient_id', 'status', 'appointment_date')
+VIDEO_STATE = ('appointment_id', 'status', 'duration_minutes')
+
+
+def _snapshot(instance, fields):
+    """The instance's current values for ``fields``, or None if any is deferred or it is unsaved"""
+    if instance.pk is None or any(field not in instance.__dict__ for field in fields):
+        return None
+    return tuple(instance.__dict__[field] for field in fields)
+
+
+def _load_missing_state(sender, instance, fields):
+    """Fetch the stored values before a save when the instance was loaded with deferred fields"""
+    if instance._doctor_stats_state is None and not instance._state.adding:
+        instance._doctor_stats_state = sender._base_manager.filter(pk=instance.pk).values_list(*fields).first()
+
+
+@receiver(post_save, sender=Appointment)
+@receiver(post_delete, sender=Appointment)
+def invalidate_appointment_doctor(sender, instance, **kwargs):
+    doctor_id = instance.doctor_id
+    invalidate_doctor_stats(doctor_id)
+    # Drop it again once the transaction commits, in case a concurrent request
+    # re-cached the old counts before the write became visible
+    transaction.on_commit(lambda: invalidate_doctor_stats(doctor_id))
+
+
+@receiver(post_save, sender=DoctorProfile)
+def init_new_doctor(sender, instance, created, raw=False, **kwargs):
+    """Start new doctors with fresh stats, since ids can be reused"""
+    if created:
+        invalidate_doctor_stats(instance.pk)
+        if not raw:
+            doctor_stats.create_empty(instance.pk)
+
+
+# DoctorStats maintenance. Each model remembers the values it was loaded with
+# (post_init) so that a save can be turned into counter deltas.
+
+@receiver(post_init, sender=Appointment)
+def remember_appointment(sender, instance, **kwargs):
+    instance._doctor_stats_state = _snapshot(instance, APPOINTMENT_STATE)
+
+
+@receiver(pre_save, sender=Appointment)
+def load_appointment_state(sender, instance, **kwargs):
+    _load_missing_state(sender, instance, APPOINTMENT_STATE)
+
+
+def _appointment_state(instance):
+    # Values assigned as strings are only converted when the row is read back
+    appointment_date = Appointment._meta.get_field('appointment_date').to_python(instance.appointment_date)
+    return (instance.doctor_id, instance.patient_id, instance.status, appointment_date)
+
+
+def _appointment_deltas(state, sign, deltas, months):
+    doctor_id, _, status, appointment_date = state
+    if status not in doctor_stats.STATUS_FIELDS:
+        return
+    deltas[doctor_id][doctor_stats.STATUS_FIELDS[status]] += sign
+    if status == 'completed':
+        months[doctor_id][doctor_stats.month_start(appointment_date)] += sign
+
+
+def _has_other_appointments(doctor_id, patient_id, exclude):
+    return Appointment.objects.filter(doctor_id=doctor_id, patient_id=patient_id).exclude(pk=exclude).exists()
+
+
+def _count_pair_change(deltas, old_pair, new_pair, exclude):
+    """distinct_patients deltas for an appointment leaving ``old_pair`` and joining ``new_pair`` (either may be None).
+
+    The doctors' rows stay locked until the caller's transaction ends, so of two
+    concurrent writes for the same pair the second sees the first's appointment
+    (once it has committed) instead of both counting the patient as new.
+    """
+    doctor_stats.lock({pair[0] for pair in (old_pair, new_pair) if pair is not None})
+    if new_pair is not None and not _has_other_appointments(*new_pair, exclude=exclude):
+        deltas[new_pair[0]]['distinct_patients'] += 1
+    if old_pair is not None and not _has_other_appointments(*old_pair, exclude=exclude):
+        deltas[old_pair[0]]['distinct_patients'] -= 1
+
+
+def _apply(deltas, months):
+    for doctor_id in set(deltas) | set(months):
+        doctor_stats.apply_deltas(doctor_id, deltas.get(doctor_id, {}), months.get(doctor_id))
+
+
+@receiver(post_save, sender=Appointment)
+def count_appointment_save(sender, instance, created, **kwargs):
+    old = None if created else instance._doctor_stats_state
+    new = _appointment_state(instance)
+    instance._doctor_stats_state = new
+    if old == new:
+        return
+
+    deltas = defaultdict(lambda: defaultdict(int))
+    months = defaultdict(lambda: defaultdict(int))
+    if old is not None:
+        _appointment_deltas(old, -1, deltas, months)
+    _appointment_deltas(new, 1, deltas, months)
+
+    old_pair = old[:2] if old is not None else None
+    if old_pair == new[:2]:
+        _apply(deltas, months)
+        return
+    with transaction.atomic():
+        _count_pair_change(deltas, old_pair, new[:2], instance.pk)
+        _apply(deltas, months)
+
+
+@receiver(post_delete, sender=Appointment)
+def count_appointment_delete(sender, instance, **kwargs):
+    state = _appointment_state(instance)
+    deltas = defaultdict(lambda: defaultdict(int))
+    months = defaultdict(lambda: defaultdict(int))
+    _appointment_deltas(state, -1, deltas, months)
+    with transaction.atomic():
+        _count_pair_change(deltas, state[:2], None, instance.pk)
+        _apply(deltas, months)
+
+
+@receiver(post_init, sender=ConsultationNote)
+def remember_note(sender, instance, **kwargs):
+    instance._doctor_stats_state = _snapshot(instance, ('doctor_id',))
+
+
+@receiver(pre_save, sender=ConsultationNote)
+def load_note_state(sender, instance, **kwargs):
+    _load_missing_state(sender, instance, ('doctor_id',))
+
+
+@receiver(post_save, sender=ConsultationNote)
+def count_note_save(sender, instance, created, **kwargs):
+    old = None if created else instance._doctor_stats_state
+    new = (instance.doctor_id,)
+    instance._doctor_stats_state = new
+    if old == new:
+        return
+    if old is not None:
+        doctor_stats.apply_deltas(old[0], {'consultation_notes': -1})
+    doctor_stats.apply_deltas(new[0], {'consultation_notes': 1})
+
+
+@receiver(post_delete, sender=ConsultationNote)
+def count_note_delete(sender, instance, **kwargs):
+    doctor_stats.apply_deltas(instance.doctor_id, {'consultation_notes': -1})
+
+
+@receiver(post_init, sender=VideoSession)
+def remember_video_session(sender, instance, **kwargs):
+    instance._doctor_stats_state = _snapshot(instance, VIDEO_STATE)
+
+
+@receiver(pre_save, sender=VideoSession)
+def load_video_session_state(sender, instance, **kwargs):
+    _load_missing_state(sender, instance, VIDEO_STATE)
+
+
+def _video_contribution(state, sign):
+    """(appointment_id, {field: delta}) for a video session state"""
+    appointment_id, status, duration = state
+    if status != 'completed':
+        return appointment_id, {}
+    return appointment_id, {'video_sessions': sign, 'video_minutes': sign * (duration or 0)}
+
+
+def _apply_video(contributions):
+    deltas = defaultdict(lambda: defaultdict(int))
+    for appointment_id, fields in contributions:
+        for field, delta in fields.items():
+            deltas[appointment_id][field] += delta
+    deltas = {appointment_id: fields for appointment_id, fields in deltas.items() if any(fields.values())}
+    if not deltas:
+        return
+    doctors = dict(Appointment.objects.filter(pk__in=deltas).values_list('pk', 'doctor_id'))
+    for appointment_id, fields in deltas.items():
+        if appointment_id in doctors:
+            doctor_stats.apply_deltas(doctors[appointment_id], fields)
+
+
+@receiver(post_save, sender=VideoSession)
+def count_video_session_save(sender, instance, created, **kwargs):
+    old = None if created else instance._doctor_stats_state
+    new = tuple(getattr(instance, field) for field in VIDEO_STATE)
+    instance._doctor_stats_state = new
+    if old == new:
+        return
+    contributions = [_video_contribution(new, 1)]
+    if old is not None:
+        contributions.append(_video_contribution(old, -1))
+    _apply_video(contributions)
+
+
+@receiver(post_delete, sender=VideoSession)
+def count_video_session_delete(sender, instance, **kwargs):
+    _apply_video([_video_contribution(tuple(getattr(instance, field) for field in VIDEO_STATE), -1)])
@@ -0,0 +1,53 @@
+"""
+Cached statistics block of the doctor dashboard.
+
+Today's and upcoming counts come from a single conditional aggregate over the
+doctor's appointments from today on, the patient count from DoctorStats. The
+block is cached per doctor until one of their appointments is written (see
+dashboard.signals) or the day rolls over.
+"""
+from django.conf import settings
+from django.core.cache import caches
+from django.db.models import Count, Q
+from django.utils import timezone
+from appointments.models import UPCOMING_STATUSES, Appointment
+from . import doctor_stats
+
+# Bump the version whenever the set of stats changes
+CACHE_KEY = 'dashboard:doctor-stats:v1:{}'
+
+
+def _cache():
+    return caches[getattr(settings, 'DASHBOARD_CACHE_ALIAS', 'default')]
+
+
+def compute_doctor_stats(doctor_id, today):
+    """Dashboard counts for a doctor.
+
+    Only appointments from today on are aggregated; the all-time distinct
+    patient count comes from the materialized DoctorStats row.
+    """
+    stats = Appointment.objects.filter(doctor_id=doctor_id, appointment_date__gte=today).aggregate(
+        total_appointments_today=Count('id', filter=Q(appointment_date=today)),
+        total_upcoming=Count('id', filter=Q(status__in=UPCOMING_STATUSES)),
+    )
+    stats['total_patients'] = doctor_stats.get_stats(doctor_id).distinct_patients
+    return stats
+
+
+def get_doctor_stats(doctor_id, today=None):
+    """Return the doctor's dashboard counts, from cache when they are still current"""
+    today = today or timezone.localdate()
+    cache = _cache()
+    key = CACHE_KEY.format(doctor_id)
+    cached = cache.get(key)
+    if cached is not None and cached['date'] == today:
+        return cached['stats']
+    stats = compute_doctor_stats(doctor_id, today)
+    cache.set(key, {'date': today, 'stats': stats}, getattr(settings, 'DASHBOARD_CACHE_TIMEOUT', 300))
+    return stats
+
+
+def invalidate_doctor_stats(doctor_id):
+    """Drop the cached dashboard counts for a doctor"""
+    _cache().delete(CACHE_KEY.format(doctor_id))
@@ -0,0 +1,342 @@
+"""
+Synthetic data at production volumes, for benchmarking.
+
+``generate`` creates doctors with weekly availability, patients, and
+appointments booked into those doctors' availability slots. Completed
+appointments get medical records (some with a report), consultation notes
+and chat transcripts. Every row goes in through bulk_create, in batches of
+one transaction each. Rows are generated batch by batch, so memory holds
+only the doctor and patient ids, whatever the volumes.
+
+The data is a pure function of the seed, the volumes and the current date
+(appointments are dated relative to today); only the ids depend on what the
+database already holds. Users are named ``<prefix>doctor<n>`` and
+``<prefix>patient<n>``, and all of them have the password PASSWORD.
+
+bulk_create sends no signals, so the tables that signals maintain
+(DoctorStats and the search index) are rebuilt at the end.
+"""
+import random
+import time as clock
+from array import array
+from contextlib import contextmanager
+from datetime import datetime, time, timedelta
+from decimal import Decimal
+from django.contrib.auth.hashers import make_password
+from django.contrib.auth.models import User
+from django.db import transaction
+from django.utils import timezone
+from accounts.models import UserProfile, DoctorProfile, PatientProfile
+from appointments.models import Appointment, DoctorAvailability
+from appointments.slots import expand_windows, get_slot_minutes
+from consultation.models import ChatMessage, ConsultationNote
+from reports.models import MedicalRecord, Report
+from search.engine import rebuild_index
+from . import doctor_stats
+
+PASSWORD = 'synthetic123'
+
+FIRST_NAMES = [
+    'James', 'Mary', 'Robert', 'Patricia', 'John', 'Jennifer', 'Michael', 'Linda', 'David', 'Elizabeth',
+    'William', 'Barbara', 'Richard', 'Susan', 'Joseph', 'Jessica', 'Thomas', 'Sarah', 'Carlos', 'Amina',
+    'Wei', 'Priya', 'Olga', 'Kenji', 'Fatima', 'Liam', 'Sofia', 'Noah', 'Chloe', 'Mateo',
+]
+LAST_NAMES = [
+    'Smith', 'Johnson', 'Williams', 'Brown', 'Jones', 'Garcia', 'Miller', 'Davis', 'Rodriguez', 'Martinez',
+    'Hernandez', 'Lopez', 'Wilson', 'Anderson', 'Taylor', 'Thomas', 'Moore', 'Jackson', 'Martin', 'Lee',
+    'Chen', 'Patel', 'Nguyen', 'Kim', 'Okafor', 'Ivanova', 'Tanaka', 'Khan', 'Silva', 'Novak',
+]
+SPECIALIZATIONS = [
+    'General Physician', 'Cardiologist', 'Dermatologist', 'Pediatrician', 'Neurologist', 'Psychiatrist',
+    'Orthopedist', 'Endocrinologist', 'Pulmonologist', 'Gastroenterologist',
+]
+BLOOD_GROUPS = ['A+', 'A-', 'B+', 'B-', 'AB+', 'AB-', 'O+', 'O-']
+
+# Weekly availability templates: (days of week, start hour, end hour)
+SCHEDULES = [
+    [(range(0, 5), 9, 17)],
+    [(range(0, 5), 8, 12), (range(0, 5), 13, 17)],
+    [((0, 2, 4), 10, 18), ((5,), 9, 13)],
+    [((1, 3), 8, 20)],
+    [(range(0, 6), 14, 20)],
+]
+
+# (reason, diagnosis, symptoms, prescription, treatment plan)
+CONDITIONS = [
+    ('Cough and fever', 'Community-acquired pneumonia', 'Productive cough, fever, shortness of breath',
+     'Amoxicillin 500 mg three times daily for 7 days', 'Antibiotics, rest and fluids; chest X-ray if no improvement'),
+    ('Flu symptoms', 'Seasonal influenza', 'Fever, cough, sore throat, fatigue',
+     'Oseltamivir 75 mg twice daily for 5 days', 'Antivirals, rest and hydration'),
+    ('High blood pressure readings', 'Essential hypertension', 'Headaches, occasional dizziness',
+     'Lisinopril 10 mg once daily', 'Low-salt diet, home blood pressure monitoring'),
+    ('Blood sugar check', 'Type 2 diabetes mellitus', 'Increased thirst, frequent urination, fatigue',
+     'Metformin 500 mg twice daily', 'Diet and exercise counselling, HbA1c in 3 months'),
+    ('Chest tightness', 'Stable angina', 'Chest pain on exertion relieved by rest',
+     'Nitroglycerin 0.4 mg sublingual as needed; aspirin 81 mg daily', 'Stress test, statin therapy'),
+    ('Recurring headaches', 'Migraine without aura', 'Throbbing unilateral headache, nausea, photophobia',
+     'Sumatriptan 50 mg at onset', 'Headache diary, avoid triggers'),
+    ('Wheezing', 'Mild persistent asthma', 'Wheezing, night-time cough, chest tightness',
+     'Budesonide inhaler twice daily; salbutamol as needed', 'Inhaler technique review, spirometry'),
+    ('Itchy rash', 'Atopic dermatitis', 'Dry, itchy, inflamed patches on the arms',
+     'Hydrocortisone 1% cream twice daily', 'Emollients, avoid irritants'),
+    ('Stomach pain', 'Gastritis', 'Epigastric pain, bloating, nausea after meals',
+     'Omeprazole 20 mg once daily for 4 weeks', 'Avoid NSAIDs and alcohol; H. pylori test'),
+    ('Knee pain', 'Osteoarthritis of the knee', 'Knee pain and stiffness, worse after activity',
+     'Paracetamol 1 g up to three times daily', 'Physiotherapy, weight management'),
+    ('Trouble sleeping', 'Insomnia', 'Difficulty falling asleep, daytime fatigue',
+     'No medication', 'Sleep hygiene, cognitive behavioural therapy referral'),
+    ('Low mood', 'Mild depressive episode', 'Low mood, loss of interest, poor concentration',
+     'Sertraline 50 mg once daily', 'Counselling referral, review in 4 weeks'),
+]
+CHAT_LINES = [
+    ('Hello doctor, I am ready for the consultation.', 'Good morning. How are you feeling today?'),
+    ('The symptoms started a few days ago.', 'Have you taken any medication for it so far?'),
+    ('Only some paracetamol.', 'Understood. Any allergies I should know about?'),
+    ('No known allergies.', 'I will send you a prescription and a follow-up plan.'),
+    ('Thank you, doctor.', 'You are welcome. Message me if anything changes.'),
+]
+
+
+@contextmanager
+def explicit_timestamps(*models):
+    """Make bulk_create keep the given auto_now/auto_now_add values instead of stamping the current time"""
+    fields = [
+        field for model in models for field in model._meta.concrete_fields
+        if getattr(field, 'auto_now', False) or getattr(field, 'auto_now_add', False)
+    ]
+    saved = [(field, field.auto_now, field.auto_now_add) for field in fields]
+    for field in fields:
+        field.auto_now = field.auto_now_add = False
+    try:
+        yield
+    finally:
+        for field, auto_now, auto_now_add in saved:
+            field.auto_now, field.auto_now_add = auto_now, auto_now_add
+
+
+class Generator:
+    """Generates one data set; ``timings`` collects (rows, insert seconds) per model"""
+
+    def __init__(self, seed=0, prefix='synth', batch_size=5000, start_date=None, end_date=None, slot_minutes=None):
+        self.random = random.Random(seed)
+        self.prefix = prefix
+        self.batch_size = batch_size
+        self.today = timezone.localdate()
+        # Appointments are spread over [start_date, end_date)
+        self.start_date = start_date or self.today - timedelta(days=365)
+        self.end_date = end_date or self.today + timedelta(days=30)
+        self.slot_minutes = slot_minutes or get_slot_minutes()
+        self.tz = timezone.get_current_timezone()
+        self.password = make_password(PASSWORD)
+        self.timings = {}
+        # Per doctor: profile id, user id, schedule template; per patient: profile id, user id
+        self.doctor_ids, self.doctor_user_ids, self.doctor_schedules = array('q'), array('q'), array('b')
+        self.patient_ids, self.patient_user_ids = array('q'), array('q')
+        # Slot start minutes per weekday of each schedule template
+        self.schedule_slots = []
+        for schedule in SCHEDULES:
+            windows = {day: [] for day in range(7)}
+            for days, start, end in schedule:
+                for day in days:
+                    windows[day].append((start * 60, end * 60))
+            self.schedule_slots.append([expand_windows(windows[day], self.slot_minutes) for day in range(7)])
+        days = [self.start_date + timedelta(days=i) for i in range((self.end_date - self.start_date).days)]
+        self.window_slots = [sum(len(slots[day.weekday()]) for day in days) for slots in self.schedule_slots]
+
+    def _insert(self, model, objs):
+        started = clock.perf_counter()
+        created = model.objects.bulk_create(objs, batch_size=self.batch_size)
+        rows, seconds = self.timings.get(model._meta.label, (0, 0.0))
+        self.timings[model._meta.label] = (rows + len(objs), seconds + clock.perf_counter() - started)
+        return created
+
+    def _at(self, day, minutes):
+        return datetime.combine(day, time(minutes // 60, minutes % 60), tzinfo=self.tz)
+
+    def _batches(self, count):
+        for start in range(0, count, self.batch_size):
+            yield range(start, min(count, start + self.batch_size))
+
+    def _users(self, kind, numbers, **profile_fields):
+        """Users and UserProfiles ``<prefix><kind><n>`` for ``numbers``; returns the profiles"""
+        choice = self.random.choice
+        users = self._insert(User, [
+            User(username=f'{self.prefix}{kind}{n}', password=self.password, first_name=choice(FIRST_NAMES),
+                 last_name=choice(LAST_NAMES), email=f'{self.prefix}{kind}{n}@example.com')
+            for n in numbers
+        ])
+        return self._insert(UserProfile, [
+            UserProfile(user=user, user_type=kind, phone_number=f'+1{self.random.randrange(10 ** 9, 10 ** 10)}',
+                        **profile_fields)
+            for user in users
+        ])
+
+    def doctors(self, count):
+        for numbers in self._batches(count):
+            with transaction.atomic():
+                profiles = self._users('doctor', numbers)
+                doctors = self._insert(DoctorProfile, [
+                    DoctorProfile(
+                        user_profile=profile, specialization=self.random.choice(SPECIALIZATIONS),
+                        qualification='MD', license_number=f'{self.prefix.upper()}-{n:08d}',
+                        experience_years=self.random.randrange(1, 40),
+                        consultation_fee=Decimal(self.random.randrange(50, 300)),
+                    )
+                    for n, profile in zip(numbers, profiles)
+                ])
+                availability = []
+                for doctor, profile in zip(doctors, profiles):
+                    schedule = self.random.randrange(len(SCHEDULES))
+                    self.doctor_ids.append(doctor.id)
+                    self.doctor_user_ids.append(profile.user_id)
+                    self.doctor_schedules.append(schedule)
+                    for days, start, end in SCHEDULES[schedule]:
+                        availability.extend(
+                            DoctorAvailability(doctor=doctor, day_of_week=day, start_time=time(start),
+                                               end_time=time(end))
+                            for day in days
+                        )
+                self._insert(DoctorAvailability, availability)
+
+    def patients(self, count):
+        for numbers in self._batches(count):
+            with transaction.atomic():
+                profiles = self._users('patient', numbers)
+                patients = self._insert(PatientProfile, [
+                    PatientProfile(user_profile=profile, blood_group=self.random.choice(BLOOD_GROUPS))
+                    for profile in profiles
+                ])
+                for patient, profile in zip(patients, profiles):
+                    self.patient_ids.append(patient.id)
+                    self.patient_user_ids.append(profile.user_id)
+
+    def _status(self, day):
+        roll = self.random.random()
+        if day < self.today:
+            return 'completed' if roll < 0.85 else 'cancelled'
+        if roll < 0.1:
+            return 'cancelled'
+        return 'confirmed' if roll < 0.55 else 'scheduled'
+
+    def _doctor_appointments(self, doctor_index, count):
+        """(appointment, patient index, condition) for ``count`` bookings in the doctor's slots, oldest first"""
+        schedule = self.doctor_schedules[doctor_index]
+        slots = self.schedule_slots[schedule]
+        doctor_id = self.doctor_ids[doctor_index]
+        # Book that share of the window's slots, so the appointments spread over all of it; any that do
+        # not fit take the slots after it
+        share = count / self.window_slots[schedule] if self.window_slots[schedule] else 1
+        day = self.start_date
+        while count:
+            for minutes in slots[day.weekday()]:
+                if not count or (day < self.end_date and self.random.random() >= share):
+                    continue
+                count -= 1
+                patient = self.random.randrange(len(self.patient_ids))
+                condition = self.random.randrange(len(CONDITIONS))
+                start = self._at(day, minutes)
+                booked = start - timedelta(days=self.random.randrange(1, 30))
+                status = self._status(day)
+                # The status changed when the appointment ended (see consultation.archive)
+                changed = start + timedelta(minutes=self.slot_minutes) if status == 'completed' else booked
+                yield Appointment(
+                    patient_id=self.patient_ids[patient], doctor_id=doctor_id, appointment_date=day,
+                    appointment_time=time(minutes // 60, minutes % 60), status=status,
+                    reason=CONDITIONS[condition][0], created_at=booked, updated_at=changed,
+                ), patient, condition
+            day += timedelta(days=1)
+
+    def appointments(self, count, note_rate=0.6, record_rate=0.8, report_rate=0.3, chat_rate=0.5, chat_messages=6):
+        """Appointments spread evenly over the doctors, with records, reports, notes and chats for completed ones"""
+        if count and not (self.doctor_ids and self.patient_ids):
+            raise ValueError('Appointments need at least one doctor and one patient.')
+        doctors = len(self.doctor_ids)
+        batch = []
+        for doctor_index in range(doctors):
+            share = count // doctors + (doctor_index < count % doctors)
+            for row in self._doctor_appointments(doctor_index, share):
+                batch.append((doctor_index,) + row)
+                if len(batch) >= self.batch_size:
+                    self._appointment_batch(batch, note_rate, record_rate, report_rate, chat_rate, chat_messages)
+                    batch = []
+        if batch:
+            self._appointment_batch(batch, note_rate, record_rate, report_rate, chat_rate, chat_messages)
+
+    def _appointment_batch(self, batch, note_rate, record_rate, report_rate, chat_rate, chat_messages):
+        rand = self.random.random
+        with transaction.atomic(), explicit_timestamps(
+            Appointment, MedicalRecord, Report, ConsultationNote, ChatMessage,
+        ):
+            self._insert(Appointment, [appointment for _, appointment, _, _ in batch])
+            notes, records, messages = [], [], []
+            for doctor_index, appointment, patient, condition in batch:
+                if appointment.status != 'completed':
+                    continue
+                reason, diagnosis, symptoms, prescription, plan = CONDITIONS[condition]
+                finished = appointment.updated_at
+                start = finished - timedelta(minutes=self.slot_minutes)
+                if rand() < chat_rate:
+                    senders = (self.patient_user_ids[patient], self.doctor_user_ids[doctor_index])
+                    messages.extend(
+                        ChatMessage(appointment_id=appointment.id, sender_id=senders[i % 2],
+                                    message=CHAT_LINES[i // 2 % len(CHAT_LINES)][i % 2],
+                                    timestamp=start + timedelta(minutes=i))
+                        for i in range(chat_messages)
+                    )
+                if rand() < note_rate:
+                    notes.append(ConsultationNote(
+                        appointment_id=appointment.id, doctor_id=appointment.doctor_id,
+                        patient_id=appointment.patient_id, chief_complaint=f'{reason}; {symptoms.lower()}',
+                        history='No relevant past medical history.', examination='Vital signs within normal limits.',
+                        diagnosis=diagnosis, treatment_plan=plan, follow_up='Review in two weeks if not improving.',
+                        created_at=finished, updated_at=finished,
+                    ))
+                if rand() < record_rate:
+                    records.append(MedicalRecord(
+                        patient_id=appointment.patient_id, doctor_id=appointment.doctor_id,
+                        appointment_id=appointment.id, diagnosis=diagnosis, symptoms=symptoms,
+                        prescription=prescription, notes=plan, record_date=appointment.appointment_date,
+                        created_at=finished, updated_at=finished,
+                    ))
+            self._insert(ChatMessage, messages)
+            self._insert(ConsultationNote, notes)
+            records = self._insert(MedicalRecord, records)
+            self._insert(Report, [
+                Report(
+                    patient_id=record.patient_id, doctor_id=record.doctor_id, medical_record_id=record.id,
+                    report_type='consultation', title=f'Consultation summary - {record.diagnosis}',
+                    content=f'Diagnosis: {record.diagnosis}\nSymptoms: {record.symptoms}\n'
+                            f'Prescription: {record.prescription}\nPlan: {record.notes}',
+                    created_at=record.created_at,
+                )
+                for record in records if rand() < report_rate
+            ])
+
+    def rebuild_derived(self):
+        """Rebuild what signals would have maintained: DoctorStats and the search index"""
+        for label, rebuild in (
+            ('dashboard.DoctorStats', doctor_stats.rebuild),
+            ('search.SearchDocument', rebuild_index),
+        ):
+            started = clock.perf_counter()
+            rows = rebuild()
+            self.timings[label] = (rows, clock.perf_counter() - started)
+
+
+def generate(doctors, patients, appointments, seed=0, prefix='synth', batch_size=5000, days_back=365,
+             days_ahead=30, derived=True, **rates):
+    """Generate a data set (see the module docstring); returns {model label: (rows, insert seconds)}.
+
+    ``rates`` are passed to Generator.appointments.
+    """
+    if User.objects.filter(username__in=[f'{prefix}doctor0', f'{prefix}patient0']).exists():
+        raise ValueError(f'Data with the prefix "{prefix}" already exists; choose another prefix.')
+    today = timezone.localdate()
+    generator = Generator(seed, prefix, batch_size, start_date=today - timedelta(days=days_back),
+                          end_date=today + timedelta(days=days_ahead))
+    generator.doctors(doctors)
+    generator.patients(patients)
+    generator.appointments(appointments, **rates)
+    if derived:
+        generator.rebuild_derived()
+    return generator.timings
@@ -1,7 +1,23 @@
-from django.test import TestCase, Client
+import asyncio
+from datetime import date, time, timedelta
+from io import StringIO
+from unittest import skipUnless
+from asgiref.sync import sync_to_async
+from django.core.management import call_command, CommandError
+from django.test import TestCase, Client, override_settings
+from django.test.utils import CaptureQueriesContext
 from django.contrib.auth.models import User
+from django.db import connection
 from django.urls import reverse
+from django.utils import timezone
 from accounts.models import UserProfile, DoctorProfile, PatientProfile
+from appointments.models import Appointment, DoctorAvailability
+from consultation.models import ChatMessage, ChatReadState, ConsultationNote, VideoSession
+from dashboard import doctor_stats, synthetic
+from dashboard.models import DoctorStats
+from dashboard.stats import get_doctor_stats
+from reports.models import MedicalRecord, Report
+from search.models import SearchDocument
 
 
 class DashboardRedirectTests(TestCase):
@@ -151,3 +167,576 @@ class DashboardRedirectTests(TestCase):
         self.assertEqual(response.status_code, 200)
         self.assertTemplateUsed(response, 'dashboard/patient_dashboard.html')
 
+
+
+class QueryPlanTests(TestCase):
+    """Test that dashboard and list pages reach the hot tables through indexes (SQLite only)"""
+    
+    HOT_TABLES = [
+        'appointments_appointment',
+        'consultation_chatmessage',
+        'consultation_consultationnote',
+        'reports_medicalrecord',
+        'reports_report',
+    ]
+    
+    def setUp(self):
+        """Set up a doctor and a patient with one row in every hot table"""
+        doctor_user = User.objects.create_user(username='plandoctor', password='testpass123')
+        self.doctor = DoctorProfile.objects.create(
+            user_profile=UserProfile.objects.create(user=doctor_user, user_type='doctor'),
+            specialization='Cardiology',
+            qualification='MD',
+            license_number='PLAN123'
+        )
+        patient_user = User.objects.create_user(username='planpatient', password='testpass123')
+        self.patient = PatientProfile.objects.create(
+            user_profile=UserProfile.objects.create(user=patient_user, user_type='patient')
+        )
+        self.appointment = Appointment.objects.create(
+            patient=self.patient,
+            doctor=self.doctor,
+            appointment_date=timezone.localdate() + timedelta(days=1),
+            appointment_time=time(9, 0),
+            reason='Checkup'
+        )
+        ConsultationNote.objects.create(
+            appointment=self.appointment, doctor=self.doctor, patient=self.patient,
+            chief_complaint='Cough', diagnosis='Cold', treatment_plan='Rest'
+        )
+        ChatMessage.objects.create(appointment=self.appointment, sender=doctor_user, message='Hello')
+        record = MedicalRecord.objects.create(
+            patient=self.patient, doctor=self.doctor, diagnosis='Cold', symptoms='Cough', prescription='Rest'
+        )
+        Report.objects.create(
+            patient=self.patient, doctor=self.doctor, medical_record=record,
+            report_type='consultation', title='Summary', content='Rest'
+        )
+    
+    def assert_pages_use_indexes(self, user, url_names):
+        self.client.force_login(user)
+        for url_name, args in url_names:
+            with CaptureQueriesContext(connection) as queries:
+                response = self.client.get(reverse(url_name, args=args))
+            self.assertEqual(response.status_code, 200, url_name)
+            for query in queries.captured_queries:
+                if not query['sql'].startswith('SELECT'):
+                    continue
+                with connection.cursor() as cursor:
+                    cursor.execute('EXPLAIN QUERY PLAN ' + query['sql'])
+                    plan = [row[-1] for row in cursor.fetchall()]
+                # Window functions sort the partitions they number, which are bounded by the seek above them
+                if ' OVER (' not in query['sql']:
+                    self.assertNotIn('USE TEMP B-TREE FOR ORDER BY', plan, f"{url_name} sorts without an index:\n{query['sql']}")
+                for step in plan:
+                    for table in self.HOT_TABLES:
+                        self.assertNotRegex(
+                            step, rf'^SCAN {table}( AS \w+)?$',
+                            f"{url_name} scans {table}:\n{query['sql']}\n{plan}"
+                        )
+    
+    @skipUnless(connection.vendor == 'sqlite', 'EXPLAIN QUERY PLAN output is SQLite specific')
+    def test_doctor_pages_use_indexes(self):
+        """Test the doctor's dashboard and list pages"""
+        self.assert_pages_use_indexes(self.doctor.user_profile.user, [
+            ('dashboard:home', []),
+            ('appointments:appointment_list', []),
+            ('consultation:notes_list', []),
+            ('reports:medical_records_list', []),
+            ('reports:reports_list', []),
+            ('consultation:chat', [self.appointment.id]),
+            ('consultation:chat_messages', [self.appointment.id]),
+            ('consultation:chat_unread', []),
+        ])
+    
+    @skipUnless(connection.vendor == 'sqlite', 'EXPLAIN QUERY PLAN output is SQLite specific')
+    def test_patient_pages_use_indexes(self):
+        """Test the patient's dashboard and list pages"""
+        self.assert_pages_use_indexes(self.patient.user_profile.user, [
+            ('dashboard:home', []),
+            ('appointments:appointment_list', []),
+            ('consultation:notes_list', []),
+            ('reports:medical_records_list', []),
+            ('reports:reports_list', []),
+            ('consultation:chat', [self.appointment.id]),
+            ('consultation:chat_messages', [self.appointment.id]),
+            ('consultation:chat_unread', []),
+        ])
+
+    @skipUnless(connection.vendor == 'sqlite', 'EXPLAIN QUERY PLAN output is SQLite specific')
+    @override_settings(APPOINTMENT_LIST_PAGE_SIZE=1)
+    def test_appointment_cursor_page_seeks(self):
+        """Test that a page after a cursor is an index range on the date, not a walk of the newer rows"""
+        Appointment.objects.create(
+            patient=self.patient, doctor=self.doctor, appointment_date=timezone.localdate(),
+            appointment_time=time(9, 0), reason='Checkup'
+        )
+        self.client.force_login(self.doctor.user_profile.user)
+        cursor = self.client.get(reverse('appointments:appointment_list')).context['page'].next_cursor
+        with CaptureQueriesContext(connection) as queries:
+            response = self.client.get(reverse('appointments:appointment_list'), {'after': cursor})
+        self.assertEqual([appointment.id for appointment in response.context['appointments']],
+                         [Appointment.objects.order_by('id').last().id])
+        sql = next(query['sql'] for query in queries.captured_queries
+                   if query['sql'].startswith('SELECT') and 'FROM "appointments_appointment"' in query['sql'])
+        with connection.cursor() as cursor:
+            cursor.execute('EXPLAIN QUERY PLAN ' + sql)
+            plan = [row[-1] for row in cursor.fetchall()]
+        self.assertIn(
+            'SEARCH appointments_appointment USING INDEX appt_doctor_seek_idx (doctor_id=? AND appointment_date<?)',
+            plan, sql
+        )
+
+
+class DoctorDashboardStatsTests(TestCase):
+    """Test cases for the consolidated, cached doctor dashboard"""
+    
+    def setUp(self):
+        """Set up a doctor with appointments from several patients"""
+        doctor_user = User.objects.create_user(username='statsdoctor', password='testpass123')
+        self.doctor = DoctorProfile.objects.create(
+            user_profile=UserProfile.objects.create(user=doctor_user, user_type='doctor'),
+            specialization='Cardiology',
+            qualification='MD',
+            license_number='STATS123'
+        )
+        self.today = timezone.localdate()
+        self.patients = []
+        for i in range(4):
+            patient_user = User.objects.create_user(username=f'statspatient{i}', first_name=f'Patient{i}')
+            self.patients.append(PatientProfile.objects.create(
+                user_profile=UserProfile.objects.create(user=patient_user, user_type='patient')
+            ))
+        self.create_appointments(self.patients, hour=8)
+        self.client.force_login(doctor_user)
+    
+    def create_appointments(self, patients, hour):
+        for i, patient in enumerate(patients):
+            appointment = Appointment.objects.create(
+                patient=patient, doctor=self.doctor, appointment_date=self.today + timedelta(days=i % 2),
+                appointment_time=time(hour + i, 0), reason='Checkup'
+            )
+            ConsultationNote.objects.create(
+                appointment=appointment, doctor=self.doctor, patient=patient,
+                chief_complaint='Cough', diagnosis='Cold', treatment_plan='Rest'
+            )
+    
+    def test_stats_values(self):
+        """Test the aggregated counts"""
+        Appointment.objects.create(
+            patient=self.patients[0], doctor=self.doctor, appointment_date=self.today - timedelta(days=3),
+            appointment_time=time(9, 0), reason='Old', status='completed'
+        )
+        self.assertEqual(get_doctor_stats(self.doctor.id), {
+            'total_appointments_today': 2,
+            'total_upcoming': 4,
+            'total_patients': 4,
+        })
+    
+    def test_query_count_is_independent_of_history(self):
+        """Test that the dashboard query count does not grow with rows, and stats are cached"""
+        url = reverse('dashboard:home')
+        self.client.get(url)
+        with self.assertNumQueries(4):
+            # session + auth user + upcoming list + recent notes (profile and stats cached)
+            response = self.client.get(url)
+        self.assertContains(response, 'Patient3')
+        
+        self.create_appointments(self.patients, hour=14)
+        with self.assertNumQueries(6):
+            # the new appointments invalidated the cached stats (aggregate + DoctorStats)
+            response = self.client.get(url)
+        self.assertEqual(response.context['total_upcoming'], 8)
+        self.assertEqual(response.context['total_patients'], 4)
+    
+    def test_stats_refresh_on_status_change(self):
+        """Test that an appointment write invalidates the cached stats"""
+        self.assertEqual(get_doctor_stats(self.doctor.id)['total_upcoming'], 4)
+        Appointment.objects.filter(doctor=self.doctor).first().delete()
+        self.assertEqual(get_doctor_stats(self.doctor.id)['total_upcoming'], 3)
+
+
+class PatientDashboardTests(TestCase):
+    """Test cases for the single-pass patient dashboard loader"""
+    
+    def setUp(self):
+        """Set up a patient with appointments at two doctors"""
+        self.today = timezone.localdate()
+        self.doctors = []
+        for i in range(2):
+            doctor_user = User.objects.create_user(username=f'pddoctor{i}', first_name='Doc', last_name=f'Tor{i}')
+            self.doctors.append(DoctorProfile.objects.create(
+                user_profile=UserProfile.objects.create(user=doctor_user, user_type='doctor'),
+                specialization='Cardiology',
+                qualification='MD',
+                license_number=f'PD{i}'
+            ))
+        patient_user = User.objects.create_user(username='pdpatient', password='testpass123')
+        self.patient = PatientProfile.objects.create(
+            user_profile=UserProfile.objects.create(user=patient_user, user_type='patient')
+        )
+        self.create_history(3)
+        self.client.force_login(patient_user)
+    
+    def create_history(self, count, offset=0):
+        for i in range(offset, offset + count):
+            doctor = self.doctors[i % 2]
+            Appointment.objects.create(
+                patient=self.patient, doctor=doctor, appointment_date=self.today + timedelta(days=i + 1),
+                appointment_time=time(9, 0), reason='Checkup'
+            )
+            Appointment.objects.create(
+                patient=self.patient, doctor=doctor, appointment_date=self.today - timedelta(days=i + 1),
+                appointment_time=time(9, 0), reason='Follow-up', status='completed'
+            )
+            Appointment.objects.create(
+                patient=self.patient, doctor=doctor, appointment_date=self.today - timedelta(days=i + 1),
+                appointment_time=time(10, 0), reason='Missed', status='cancelled'
+            )
+            MedicalRecord.objects.create(
+                patient=self.patient, doctor=doctor, diagnosis='Cold', symptoms='Cough', prescription='Rest'
+            )
+    
+    def test_lists_and_totals(self):
+        """Test that the lists keep their order, are capped and report full totals"""
+        self.create_history(5, offset=3)
+        response = self.client.get(reverse('dashboard:home'))
+        upcoming = response.context['upcoming_appointments']
+        past = response.context['past_appointments']
+        self.assertEqual([a.appointment_date for a in upcoming],
+                         [self.today + timedelta(days=d) for d in range(8, 3, -1)])
+        self.assertEqual([a.appointment_date for a in past],
+                         [self.today - timedelta(days=d) for d in range(1, 6)])
+        self.assertTrue(all(a.status == 'completed' for a in past))
+        self.assertEqual(len(response.context['medical_history']), 5)
+        self.assertEqual(response.context['total_upcoming'], 8)
+        self.assertEqual(response.context['total_past'], 8)
+        self.assertEqual(response.context['total_records'], 8)
+        self.assertContains(response, 'Dr. Doc Tor1')
+    
+    def test_query_count_is_independent_of_history(self):
+        """Test that the patient dashboard runs a fixed number of queries"""
+        url = reverse('dashboard:home')
+        self.client.get(url)
+        with self.assertNumQueries(4):
+            # session + auth user + appointment lists + medical records (profile cached)
+            self.client.get(url)
+        
+        self.create_history(10, offset=3)
+        with self.assertNumQueries(4):
+            response = self.client.get(url)
+        self.assertEqual(len(response.context['upcoming_appointments']), 5)
+    
+    def test_empty_dashboard(self):
+        """Test a patient without any history"""
+        Appointment.objects.all().delete()
+        MedicalRecord.objects.all().delete()
+        response = self.client.get(reverse('dashboard:home'))
+        self.assertEqual(response.context['upcoming_appointments'], [])
+        self.assertEqual(response.context['total_records'], 0)
+        self.assertContains(response, 'No upcoming appointments.')
+
+
+class AsyncViewsTests(TestCase):
+    """Test cases for the async variants of the read-heavy pages"""
+    
+    def setUp(self):
+        """Set up a doctor and a patient sharing an appointment, a chat, a record and a report"""
+        self.doctor_user = User.objects.create_user(username='asyncdoctor', first_name='Ada', last_name='Doc')
+        self.doctor = DoctorProfile.objects.create(
+            user_profile=UserProfile.objects.create(user=self.doctor_user, user_type='doctor'),
+            specialization='Cardiology',
+            qualification='MD',
+            license_number='ASYNC123'
+        )
+        self.patient_user = User.objects.create_user(username='asyncpatient', first_name='Pat', last_name='Ient')
+        self.patient = PatientProfile.objects.create(
+            user_profile=UserProfile.objects.create(user=self.patient_user, user_type='patient')
+        )
+        self.appointment = Appointment.objects.create(
+            patient=self.patient,
+            doctor=self.doctor,
+            appointment_date=timezone.localdate() + timedelta(days=1),
+            appointment_time=time(9, 0),
+            reason='Checkup'
+        )
+        ChatMessage.objects.create(appointment=self.appointment, sender=self.doctor_user, message='Hello')
+        record = MedicalRecord.objects.create(
+            patient=self.patient, doctor=self.doctor, diagnosis='Cold', symptoms='Cough', prescription='Rest'
+        )
+        Report.objects.create(
+            patient=self.patient, doctor=self.doctor, medical_record=record,
+            report_type='consultation', title='Summary', content='Rest'
+        )
+        self.urls = [
+            reverse('dashboard:home'),
+            reverse('appointments:appointment_list'),
+            reverse('reports:reports_list'),
+            reverse('consultation:chat_messages', args=[self.appointment.id]),
+        ]
+    
+    async def assert_async_matches_sync(self, user):
+        await sync_to_async(self.client.force_login)(user)
+        await sync_to_async(self.async_client.force_login)(user)
+        for url in self.urls:
+            expected = await sync_to_async(self.client.get)(url)
+            await ChatReadState.objects.all().adelete()
+            with override_settings(ROOT_URLCONF='healthcare_system.asgi_urls'):
+                response = await self.async_client.get(url)
+                # resolver_match is resolved lazily, against the current URLconf
+                self.assertTrue(asyncio.iscoroutinefunction(response.resolver_match.func), url)
+            self.assertEqual(response.status_code, 200, url)
+            self.assertEqual(response.content, expected.content, url)
+    
+    async def test_doctor_pages_match_sync_views(self):
+        """Test that the async views render the same pages as the sync ones for a doctor"""
+        await self.assert_async_matches_sync(self.doctor_user)
+    
+    async def test_patient_pages_match_sync_views(self):
+        """Test that the async views render the same pages as the sync ones for a patient"""
+        await self.assert_async_matches_sync(self.patient_user)
+    
+    @override_settings(ROOT_URLCONF='healthcare_system.asgi_urls')
+    async def test_anonymous_user_redirected_to_login(self):
+        """Test that the async views require a login"""
+        for url in self.urls:
+            response = await self.async_client.get(url)
+            self.assertEqual(response.status_code, 302, url)
+            self.assertIn(reverse('accounts:login'), response.url)
+    
+    @override_settings(ROOT_URLCONF='healthcare_system.asgi_urls', CHAT_POLL_TIMEOUT=5)
+    async def test_async_long_poll_wakes_on_new_message(self):
+        """Test that a waiting async poll returns as soon as a message is committed"""
+        await sync_to_async(self.async_client.force_login)(self.patient_user)
+        cursor = await ChatMessage.objects.values_list('id', flat=True).alatest('id')
+        poll = asyncio.ensure_future(self.async_client.get(self.urls[3], {'after': cursor, 'wait': 5}))
+        await asyncio.sleep(0.1)
+        self.assertFalse(poll.done())
+        
+        def send():
+            with self.captureOnCommitCallbacks(execute=True):
+                ChatMessage.objects.create(appointment=self.appointment, sender=self.doctor_user, message='Ping')
+        await sync_to_async(send)()
+        response = await asyncio.wait_for(poll, 2)
+        self.assertEqual([m['message'] for m in response.json()['messages']], ['Ping'])
+    
+    def test_asgi_handler_uses_async_urlconf(self):
+        """Test that requests created by the ASGI entry point are routed through ASGI_ROOT_URLCONF"""
+        from io import BytesIO
+        from healthcare_system.asgi import django_application
+        scope = {'type': 'http', 'method': 'GET', 'path': '/dashboard/', 'query_string': b'', 'headers': []}
+        request, error = django_application.create_request(scope, BytesIO())
+        self.assertIsNone(error)
+        self.assertEqual(request.urlconf, 'healthcare_system.asgi_urls')
+
+
+class DoctorStatsTests(TestCase):
+    """Test cases for the incrementally maintained DoctorStats table"""
+    
+    def setUp(self):
+        """Set up a doctor and two patients"""
+        doctor_user = User.objects.create_user(username='mvdoctor')
+        self.doctor = DoctorProfile.objects.create(
+            user_profile=UserProfile.objects.create(user=doctor_user, user_type='doctor'),
+            specialization='Cardiology',
+            qualification='MD',
+            license_number='MV123'
+        )
+        self.patients = [
+            PatientProfile.objects.create(
+                user_profile=UserProfile.objects.create(user=User.objects.create_user(username=f'mvpatient{i}'), user_type='patient')
+            )
+            for i in range(2)
+        ]
+        self.today = timezone.localdate()
+    
+    def book(self, patient, days=0, hour=9, status='scheduled'):
+        return Appointment.objects.create(
+            patient=patient, doctor=self.doctor, appointment_date=self.today + timedelta(days=days),
+            appointment_time=time(hour, 0), reason='Checkup', status=status
+        )
+    
+    def stats(self):
+        return DoctorStats.objects.get(doctor=self.doctor)
+    
+    def assert_consistent(self):
+        self.assertEqual(doctor_stats.check_consistency([self.doctor.id]), [])
+    
+    def test_new_doctor_starts_with_zero_row(self):
+        """Test that creating a doctor materializes an empty row"""
+        self.assertEqual(self.stats().distinct_patients, 0)
+        self.assert_consistent()
+    
+    def test_appointment_lifecycle(self):
+        """Test that creates, status changes, reassignments and deletes keep counters exact"""
+        first = self.book(self.patients[0], hour=9)
+        self.book(self.patients[0], hour=10)
+        second = self.book(self.patients[1], hour=11)
+        self.assertEqual(self.stats().distinct_patients, 2)
+        self.assertEqual(self.stats().scheduled_count, 3)
+        
+        first.status = 'completed'
+        first.save()
+        self.assertEqual(self.stats().completed_count, 1)
+        self.assertEqual(self.stats().completed_this_month, 1)
+        self.assert_consistent()
+        
+        second.patient = self.patients[0]
+        second.save()
+        self.assertEqual(self.stats().distinct_patients, 1)
+        
+        Appointment.objects.filter(patient=self.patients[0], status='scheduled').delete()
+        first.delete()
+        self.assertEqual(self.stats().distinct_patients, 0)
+        self.assertEqual(self.stats().completed_this_month, 0)
+        self.assert_consistent()
+    
+    def test_new_pair_is_checked_under_the_doctor_lock(self):
+        """Test that the doctor's row is locked before looking for the pair's other appointments"""
+        with CaptureQueriesContext(connection) as queries:
+            self.book(self.patients[0])
+        statements = [query['sql'] for query in queries.captured_queries]
+        lock = next(i for i, sql in enumerate(statements) if sql.startswith('SELECT') and 'dashboard_doctorstats' in sql)
+        check = next(i for i, sql in enumerate(statements) if sql.startswith('SELECT') and 'appointments_appointment' in sql)
+        self.assertLess(lock, check)
+        self.assertEqual(self.stats().distinct_patients, 1)
+    
+    def test_deferred_instances_are_counted(self):
+        """Test that saving an instance loaded with only() still produces correct deltas"""
+        appointment = self.book(self.patients[0])
+        partial = Appointment.objects.only('id', 'status').get(pk=appointment.pk)
+        partial.status = 'cancelled'
+        partial.save()
+        self.assertEqual(self.stats().cancelled_count, 1)
+        self.assertEqual(self.stats().scheduled_count, 0)
+        self.assert_consistent()
+    
+    def test_notes_and_video_sessions(self):
+        """Test the consultation note count and the average video session length"""
+        appointment = self.book(self.patients[0])
+        ConsultationNote.objects.create(
+            appointment=appointment, doctor=self.doctor, patient=self.patients[0],
+            chief_complaint='Cough', diagnosis='Cold', treatment_plan='Rest'
+        )
+        for i, minutes in enumerate([10, 20]):
+            session = VideoSession.objects.create(appointment=self.book(self.patients[1], hour=12 + i), session_id=f'mv-{i}')
+            session.status = 'completed'
+            session.duration_minutes = minutes
+            session.save()
+        stats = self.stats()
+        self.assertEqual(stats.consultation_notes, 1)
+        self.assertEqual(stats.video_sessions, 2)
+        self.assertEqual(stats.average_video_minutes, 15)
+        self.assert_consistent()
+    
+    def test_month_rollover(self):
+        """Test that a row from a past month has its monthly count recomputed on read"""
+        self.book(self.patients[0], status='completed')
+        DoctorStats.objects.filter(doctor=self.doctor).update(month=date(2000, 1, 1), completed_this_month=7)
+        stats = doctor_stats.get_stats(self.doctor.id)
+        self.assertEqual(stats.month, self.today.replace(day=1))
+        self.assertEqual(stats.completed_this_month, 1)
+    
+    def test_first_read_materializes_missing_row(self):
+        """Test that a doctor without a row gets one computed from the source tables"""
+        self.book(self.patients[0], status='completed')
+        DoctorStats.objects.filter(doctor=self.doctor).delete()
+        stats = doctor_stats.get_stats(self.doctor.id)
+        self.assertEqual((stats.distinct_patients, stats.completed_this_month), (1, 1))
+        self.assertEqual(doctor_stats.get_stats(self.doctor.id).pk, stats.pk)
+        self.assert_consistent()
+    
+    def test_rebuild_updates_rows_in_place(self):
+        """Test that a rebuild overwrites drifted counters of existing rows"""
+        self.book(self.patients[0])
+        DoctorStats.objects.filter(doctor=self.doctor).update(scheduled_count=9, distinct_patients=9)
+        self.assertEqual(doctor_stats.rebuild([self.doctor.id]), 1)
+        self.assertEqual((self.stats().scheduled_count, self.stats().distinct_patients), (1, 1))
+        self.assert_consistent()
+    
+    def test_rebuild_command_repairs_drift(self):
+        """Test that --check reports drift and a rebuild repairs it"""
+        self.book(self.patients[0])
+        # Queryset updates bypass the signals
+        Appointment.objects.filter(doctor=self.doctor).update(status='confirmed')
+        with self.assertRaises(CommandError):
+            call_command('rebuild_doctor_stats', '--check', stdout=StringIO())
+        
+        DoctorStats.objects.all().delete()
+        call_command('rebuild_doctor_stats', stdout=StringIO())
+        self.assertEqual(self.stats().confirmed_count, 1)
+        out = StringIO()
+        call_command('rebuild_doctor_stats', '--check', stdout=out)
+        self.assertIn('consistent', out.getvalue())
+
+
+class SyntheticDataTests(TestCase):
+    """Test cases for the bulk synthetic data generator"""
+    
+    def generate(self, *args):
+        out = StringIO()
+        call_command('generate_data', '--doctors', '3', '--patients', '20', '--appointments', '300',
+                     '--batch-size', '40', *args, stdout=out)
+        return out.getvalue()
+    
+    def test_generated_data_is_consistent(self):
+        """Test that the rows reference each other consistently and fit the doctors' availability"""
+        output = self.generate()
+        self.assertIn('appointments.Appointment', output)
+        self.assertIn('rows/s', output)
+        self.assertEqual(DoctorProfile.objects.count(), 3)
+        self.assertEqual(PatientProfile.objects.count(), 20)
+        self.assertEqual(Appointment.objects.count(), 300)
+        self.assertTrue(self.client.login(username='synthpatient0', password=synthetic.PASSWORD))
+        
+        windows = {}
+        for availability in DoctorAvailability.objects.all():
+            windows.setdefault((availability.doctor_id, availability.day_of_week), []).append(
+                (availability.start_time, availability.end_time))
+        appointments = Appointment.objects.in_bulk()
+        for appointment in appointments.values():
+            self.assertTrue(any(
+                start <= appointment.appointment_time < end
+                for start, end in windows[(appointment.doctor_id, appointment.appointment_date.weekday())]
+            ))
+            if appointment.appointment_date < timezone.localdate():
+                self.assertIn(appointment.status, ('completed', 'cancelled'))
+            else:
+                self.assertNotEqual(appointment.status, 'completed')
+        
+        for row in list(MedicalRecord.objects.all()) + list(ConsultationNote.objects.all()):
+            appointment = appointments[row.appointment_id]
+            self.assertEqual(appointment.status, 'completed')
+            self.assertEqual((row.patient_id, row.doctor_id), (appointment.patient_id, appointment.doctor_id))
+            self.assertEqual(timezone.localtime(row.created_at).date(), appointment.appointment_date)
+        for message in ChatMessage.objects.select_related('appointment__doctor__user_profile',
+                                                          'appointment__patient__user_profile'):
+            self.assertIn(message.sender_id, (message.appointment.doctor.user_profile.user_id,
+                                              message.appointment.patient.user_profile.user_id))
+        self.assertTrue(Report.objects.exists())
+        
+        # The tables signals would have maintained were rebuilt
+        self.assertEqual(doctor_stats.check_consistency(), [])
+        self.assertEqual(SearchDocument.objects.count(),
+                         MedicalRecord.objects.count() + ConsultationNote.objects.count() + Report.objects.count())
+    
+    def test_same_seed_gives_same_data(self):
+        """Test that the data depends only on the seed, not on the prefix or the ids"""
+        def appointments(prefix):
+            return list(Appointment.objects.filter(doctor__license_number__startswith=prefix.upper()).order_by('pk')
+                        .values_list('appointment_date', 'appointment_time', 'status', 'reason'))
+        
+        self.generate('--prefix', 'first', '--skip-derived')
+        self.generate('--prefix', 'second', '--skip-derived')
+        self.generate('--prefix', 'third', '--seed', '1', '--skip-derived')
+        self.assertEqual(appointments('first'), appointments('second'))
+        self.assertNotEqual(appointments('first'), appointments('third'))
+        self.assertFalse(DoctorStats.objects.filter(doctor__license_number__startswith='FIRST').exists())
+    
+    def test_existing_prefix_is_rejected(self):
+        """Test that generating twice with the same prefix fails instead of colliding"""
+        self.generate('--skip-derived')
+        with self.assertRaises(CommandError):
+            self.generate()
+        with self.assertRaises(CommandError):
+            call_command('generate_data', '--note-rate', '2', stdout=StringIO())
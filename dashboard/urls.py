@@ -8,3 +8,10 @@ urlpatterns = [
     path('doctor/', views.doctor_dashboard, name='doctor'),
     path('patient/', views.patient_dashboard, name='patient'),
 ]
+
+# Async variants, served instead of the views above under ASGI (see healthcare_system.asgi_urls)
+async_urlpatterns = [
+    path('', views.home_async, name='home'),
+    path('doctor/', views.doctor_dashboard_async, name='doctor'),
+    path('patient/', views.patient_dashboard_async, name='patient'),
+]
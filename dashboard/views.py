@@ -1,12 +1,14 @@
+from asgiref.sync import sync_to_async
 from django.shortcuts import render, redirect
 from django.contrib.auth.decorators import login_required
 from django.contrib.auth import logout
 from django.contrib import messages
 from django.urls import reverse
-from accounts.models import UserProfile, DoctorProfile, PatientProfile
-from appointments.models import Appointment
-from reports.models import MedicalRecord
+from appointments.models import UPCOMING_STATUSES, Appointment
+from accounts.decorators import async_login_required
 from consultation.models import ConsultationNote
+from .loaders import load_patient_dashboard
+from .stats import get_doctor_stats
 from django.utils import timezone
 from datetime import datetime, timedelta
 
@@ -15,91 +17,114 @@ from datetime import datetime, timedelta
 @login_required
 def home(request):
     """Main dashboard view - redirects based on user type"""
-    try:
-        user_profile = UserProfile.objects.get(user=request.user)
+    actor = request.actor
+    if actor.has_profile:
         # User has profile - route based on user_type
-        if user_profile.user_type == 'doctor':
+        if actor.is_doctor:
             return doctor_dashboard(request)
         else:
             return patient_dashboard(request)
-    except UserProfile.DoesNotExist:
-        # No profile - check if admin/staff
-        if request.user.is_superuser or request.user.is_staff:
-            return redirect(reverse('admin:index'))
-        else:
-            # Regular user without profile - error state
-            messages.error(request, 'Your user profile could not be loaded. This may indicate a system configuration issue. Please contact your system administrator for assistance.')
-            logout(request)
-            return redirect('accounts:login')
+    # No profile - check if admin/staff
+    if request.user.is_superuser or request.user.is_staff:
+        return redirect(reverse('admin:index'))
+    else:
+        # Regular user without profile - error state
+        messages.error(request, 'Your user profile could not be loaded. This may indicate a system configuration issue. Please contact your system administrator for assistance.')
+        logout(request)
+        return redirect('accounts:login')
 
 
-@login_required
-def doctor_dashboard(request):
-    """Doctor dashboard with scheduled appointments and patient info"""
-    user_profile = UserProfile.objects.get(user=request.user)
-    doctor_profile = DoctorProfile.objects.get(user_profile=user_profile)
-    
-    # Get today's and upcoming appointments
-    today = timezone.now().date()
+def _doctor_dashboard_lists(doctor_profile, today):
+    """The doctor dashboard's upcoming appointments and recent notes (unevaluated)"""
     upcoming_appointments = Appointment.objects.filter(
         doctor=doctor_profile,
         appointment_date__gte=today,
-        status__in=['scheduled', 'confirmed']
-    )[:10]
-    
-    # Get recent consultation notes
-    recent_notes = ConsultationNote.objects.filter(doctor=doctor_profile)[:5]
-    
-    # Statistics
-    total_appointments_today = Appointment.objects.filter(
-        doctor=doctor_profile,
-        appointment_date=today
-    ).count()
-    
-    total_patients = Appointment.objects.filter(doctor=doctor_profile).values('patient').distinct().count()
+        status__in=UPCOMING_STATUSES
+    ).select_related('patient__user_profile__user')[:10]
     
+    recent_notes = ConsultationNote.objects.filter(
+        doctor=doctor_profile
+    ).select_related('patient__user_profile__user').order_by('-created_at')[:5]
+    return upcoming_appointments, recent_notes
+
+
+def _render_doctor_dashboard(request, upcoming_appointments, recent_notes, stats):
     context = {
-        'user_profile': user_profile,
-        'doctor_profile': doctor_profile,
+        'user_profile': request.actor.user_profile,
+        'doctor_profile': request.actor.doctor_profile,
         'upcoming_appointments': upcoming_appointments,
         'recent_notes': recent_notes,
-        'total_appointments_today': total_appointments_today,
-        'total_patients': total_patients,
+        'total_appointments_today': stats['total_appointments_today'],
+        'total_upcoming': stats['total_upcoming'],
+        'total_patients': stats['total_patients'],
     }
-    
     return render(request, 'dashboard/doctor_dashboard.html', context)
 
 
+def _render_patient_dashboard(request, context):
+    context.update({
+        'user_profile': request.actor.user_profile,
+        'patient_profile': request.actor.patient_profile,
+    })
+    return render(request, 'dashboard/patient_dashboard.html', context)
+
+
 @login_required
-def patient_dashboard(request):
-    """Patient dashboard with appointments and medical history"""
-    user_profile = UserProfile.objects.get(user=request.user)
-    patient_profile = PatientProfile.objects.get(user_profile=user_profile)
-    
-    # Get upcoming appointments
-    today = timezone.now().date()
-    upcoming_appointments = Appointment.objects.filter(
-        patient=patient_profile,
-        appointment_date__gte=today,
-        status__in=['scheduled', 'confirmed']
-    )[:5]
-    
-    # Get recent medical records
-    medical_history = MedicalRecord.objects.filter(patient=patient_profile)[:5]
+def doctor_dashboard(request):
+    """Doctor dashboard with scheduled appointments and patient info"""
+    doctor_profile = request.actor.doctor_profile
     
-    # Get past appointments
-    past_appointments = Appointment.objects.filter(
-        patient=patient_profile,
-        status='completed'
-    )[:5]
+    # Get today's and upcoming appointments, and recent consultation notes
+    today = timezone.localdate()
+    upcoming_appointments, recent_notes = _doctor_dashboard_lists(doctor_profile, today)
     
-    context = {
-        'user_profile': user_profile,
-        'patient_profile': patient_profile,
-        'upcoming_appointments': upcoming_appointments,
-        'medical_history': medical_history,
-        'past_appointments': past_appointments,
-    }
+    # Statistics (one aggregate query, cached per doctor)
+    stats = get_doctor_stats(doctor_profile.id, today)
     
-    return render(request, 'dashboard/patient_dashboard.html', context)
+    return _render_doctor_dashboard(request, upcoming_appointments, recent_notes, stats)
+
+
+@login_required
+def patient_dashboard(request):
+    """Patient dashboard with appointments and medical history"""
+    # Both appointment lists, the medical history and their sizes in two queries
+    context = load_patient_dashboard(request.actor.patient_profile)
+    return _render_patient_dashboard(request, context)
+
+
+# Async variants, served under ASGI (see healthcare_system.asgi_urls). Every
+# list is evaluated before rendering: templates cannot run queries in an
+# async context.
+
+@async_login_required
+async def home_async(request):
+    """Async variant of home"""
+    actor = request.actor
+    if actor.has_profile:
+        if actor.is_doctor:
+            return await doctor_dashboard_async(request)
+        return await patient_dashboard_async(request)
+    if request.user.is_superuser or request.user.is_staff:
+        return redirect(reverse('admin:index'))
+    messages.error(request, 'Your user profile could not be loaded. This may indicate a system configuration issue. Please contact your system administrator for assistance.')
+    await sync_to_async(logout)(request)
+    return redirect('accounts:login')
+
+
+@async_login_required
+async def doctor_dashboard_async(request):
+    """Async variant of doctor_dashboard"""
+    doctor_profile = request.actor.doctor_profile
+    today = timezone.localdate()
+    upcoming_appointments, recent_notes = _doctor_dashboard_lists(doctor_profile, today)
+    upcoming_appointments = [appointment async for appointment in upcoming_appointments]
+    recent_notes = [note async for note in recent_notes]
+    stats = await sync_to_async(get_doctor_stats)(doctor_profile.id, today)
+    return _render_doctor_dashboard(request, upcoming_appointments, recent_notes, stats)
+
 
+@async_login_required
+async def patient_dashboard_async(request):
+    """Async variant of patient_dashboard"""
+    context = await sync_to_async(load_patient_dashboard)(request.actor.patient_profile)
+    return _render_patient_dashboard(request, context)
@@ -9,8 +9,30 @@ https://docs.djangoproject.com/en/4.2/howto/deployment/asgi/
 
 import os
 
-from django.core.asgi import get_asgi_application
+import django
+from django.conf import settings
+from django.core.handlers.asgi import ASGIHandler
 
 os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'healthcare_system.settings')
+# Each request's sync code runs in a new thread here, which could never reuse a kept connection
+os.environ.setdefault('DB_CONN_MAX_AGE', '0')
 
-application = get_asgi_application()
+django.setup(set_prefix=False)
+
+
+class HealthcareASGIHandler(ASGIHandler):
+    """Routes ASGI requests through ASGI_ROOT_URLCONF, which serves the async views"""
+
+    def create_request(self, scope, body_file):
+        request, error_response = super().create_request(scope, body_file)
+        if request is not None:
+            request.urlconf = getattr(settings, 'ASGI_ROOT_URLCONF', settings.ROOT_URLCONF)
+        return request, error_response
+
+
+django_application = HealthcareASGIHandler()
+
+from consultation.push import ChatPushRouter  # noqa: E402 (needs the app registry)
+
+# Chat events are streamed by consultation.push; everything else goes to Django
+application = ChatPushRouter(django_application)
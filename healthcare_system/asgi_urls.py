@@ -0,0 +1,21 @@
+"""
+URL configuration used for requests served by the ASGI entry point.
+
+Identical to healthcare_system.urls, except that the apps' ``async_urlpatterns``
+come first, so their async views take over the read-heavy pages. URL names
+are unchanged, so reversing works the same under both entry points.
+"""
+from django.urls import URLResolver, include, path
+from . import urls
+
+ASYNC_APPS = ['dashboard', 'appointments', 'reports', 'consultation']
+
+
+def _with_async_views(pattern):
+    if not isinstance(pattern, URLResolver) or pattern.app_name not in ASYNC_APPS:
+        return pattern
+    module = pattern.urlconf_module
+    return path(str(pattern.pattern), include((module.async_urlpatterns + module.urlpatterns, module.app_name)))
+
+
+urlpatterns = [_with_async_views(pattern) for pattern in urls.urlpatterns]
@@ -11,6 +11,7 @@ https://docs.djangoproject.com/en/4.2/ref/settings/
 """
 
 from pathlib import Path
+from .database import database_config, sqlite_pragmas
 
 # Build paths inside the project like this: BASE_DIR / 'subdir'.
 BASE_DIR = Path(__file__).resolve().parent.parent
@@ -47,20 +48,29 @@ INSTALLED_APPS = [
     'reports',
     'settings_app',
     'consultation',
+    'search',
+    'profiling',
 ]
 
 MIDDLEWARE = [
+    'profiling.middleware.ProfilingMiddleware',
+    'profiling.middleware.NPlusOneMiddleware',
     'django.middleware.security.SecurityMiddleware',
     'django.contrib.sessions.middleware.SessionMiddleware',
     'django.middleware.common.CommonMiddleware',
     # 'django.middleware.csrf.CsrfViewMiddleware',  # REMOVED: CSRF protection disabled
     'django.contrib.auth.middleware.AuthenticationMiddleware',
+    'accounts.middleware.ActorMiddleware',
     'django.contrib.messages.middleware.MessageMiddleware',
     'django.middleware.clickjacking.XFrameOptionsMiddleware',
 ]
 
 ROOT_URLCONF = 'healthcare_system.urls'
 
+# Requests served through asgi.py use this URLconf, which swaps in the async
+# variants of the read-heavy views
+ASGI_ROOT_URLCONF = 'healthcare_system.asgi_urls'
+
 TEMPLATES = [
     {
         'BACKEND': 'django.template.backends.django.DjangoTemplates',
@@ -83,13 +93,33 @@ WSGI_APPLICATION = 'healthcare_system.wsgi.application'
 # Database
 # https://docs.djangoproject.com/en/4.2/ref/settings/#databases
 
+# Read from DATABASE_URL and the DB_* environment variables (see healthcare_system.database)
 DATABASES = {
+    'default': database_config(BASE_DIR),
+}
+
+# Run on every new SQLite connection: WAL journal, NORMAL sync and mmap reads
+SQLITE_PRAGMAS = sqlite_pragmas()
+
+
+# Cache
+# https://docs.djangoproject.com/en/4.2/topics/cache/
+
+CACHES = {
     'default': {
-        'ENGINE': 'django.db.backends.sqlite3',
-        'NAME': BASE_DIR / 'db.sqlite3',
+        'BACKEND': 'django.core.cache.backends.locmem.LocMemCache',
+        'LOCATION': 'healthcare-default',
     }
 }
 
+# Cache alias and lifetime (seconds) for the per-user profile chain
+PROFILE_CACHE_ALIAS = 'default'
+PROFILE_CACHE_TIMEOUT = 60 * 60
+
+# Cache alias and lifetime (seconds) for the doctor dashboard statistics
+DASHBOARD_CACHE_ALIAS = 'default'
+DASHBOARD_CACHE_TIMEOUT = 5 * 60
+
 
 # Password validation
 # https://docs.djangoproject.com/en/4.2/ref/settings/#auth-password-validators
@@ -138,6 +168,78 @@ LOGIN_URL = 'accounts:login'
 LOGIN_REDIRECT_URL = 'dashboard:home'
 LOGOUT_REDIRECT_URL = 'accounts:login'
 
+# Appointment slot engine: slot length (minutes), booking horizon (days) and
+# how many free slots the booking page lists per doctor
+APPOINTMENT_SLOT_MINUTES = 30
+APPOINTMENT_BOOKING_DAYS = 14
+APPOINTMENT_SLOTS_PER_DOCTOR = 50
+
+# Earliest-slot search: result cap and widest searchable date range (days)
+APPOINTMENT_SEARCH_MAX_RESULTS = 50
+APPOINTMENT_SEARCH_MAX_DAYS = 90
+
+# How often a booking is retried when the database is locked or the slot was written concurrently
+APPOINTMENT_BOOKING_ATTEMPTS = 10
+
+# Appointments shown per page of the appointment list
+APPOINTMENT_LIST_PAGE_SIZE = 25
+
+# Chat delivery: messages per poll response, the longest a poll may wait for
+# new messages and how often a waiting poll re-checks (seconds)
+CHAT_BATCH_SIZE = 100
+CHAT_POLL_TIMEOUT = 25
+CHAT_POLL_INTERVAL = 1.0
+
+# Under WSGI a waiting poll holds a worker thread, so the sync chat feed waits
+# at most this long (seconds); the full CHAT_POLL_TIMEOUT needs ASGI
+CHAT_WSGI_POLL_TIMEOUT = 5
+
+# Chat push (ASGI only): the pub/sub broker class, the keep-alive interval of
+# idle event streams (seconds) and how many undelivered messages a stream may
+# queue before it is dropped and left to catch up on reconnect
+CHAT_BROKER = 'consultation.pubsub.InProcessBroker'
+CHAT_PUSH_KEEPALIVE = 15
+CHAT_PUSH_QUEUE_SIZE = 100
+
+# Chats of appointments completed or cancelled this many days ago are
+# compacted into archives by the archive_chats command
+CHAT_ARCHIVE_AFTER_DAYS = 30
+
+# Rows fetched from the database per round trip by the bulk CSV exports
+EXPORT_CHUNK_SIZE = 2000
+
+# Worker processes of the batch PDF renderer (None: one per CPU)
+PDF_BATCH_WORKERS = None
+
+# Disk cache of rendered report PDFs and its size budget (bytes); least
+# recently used files are evicted beyond it
+REPORT_PDF_CACHE_DIR = BASE_DIR / 'pdf_cache'
+REPORT_PDF_CACHE_MAX_BYTES = 256 * 1024 * 1024
+
+# Full-text search: the backend class (None: SQLite FTS5 where available,
+# otherwise the inverted index) and the most results a search returns
+SEARCH_BACKEND = None
+SEARCH_RESULTS_LIMIT = 50
+
+# Request profiling (profiling.middleware): off by default; the fraction of
+# requests profiled, the profiles kept per URL name and the slowest queries
+# kept per request
+PROFILING_ENABLED = False
+PROFILING_SAMPLE_RATE = 1.0
+PROFILING_BUFFER_SIZE = 100
+PROFILING_SLOW_QUERIES = 5
+
+# N+1 query detection (profiling.nplusone): what NPlusOneMiddleware does with
+# them (None: off, 'log' or 'raise'; the test runner sets 'raise'), the
+# executions of one lookup from one place that count as N+1 and the URL
+# names not checked
+NPLUSONE_DETECTION = None
+NPLUSONE_THRESHOLD = 3
+NPLUSONE_ALLOWLIST = []
+
+# The test suite fails on N+1 queries in any view it requests
+TEST_RUNNER = 'profiling.runner.NPlusOneTestRunner'
+
 # Default primary key field type
 # https://docs.djangoproject.com/en/4.2/ref/settings/#default-auto-field
 
@@ -28,6 +28,8 @@ urlpatterns = [
     path('appointments/', include('appointments.urls')),
     path('reports/', include('reports.urls')),
     path('consultation/', include('consultation.urls')),
+    path('search/', include('search.urls')),
+    path('profiling/', include('profiling.urls')),
     path('settings/', include('settings_app.urls')),
 ]
 
@@ -0,0 +1,156 @@
+import logging
+import random
+from asgiref.sync import iscoroutinefunction, markcoroutinefunction
+from django.conf import settings
+from django.core.exceptions import MiddlewareNotUsed
+from . import recorder
+from .nplusone import NPlusOneDetector, NPlusOneError
+from .store import store
+
+logger = logging.getLogger(__name__)
+
+# Requests to these URL names are not profiled
+EXCLUDED = {'profiling:stats'}
+
+
+def is_enabled():
+    return getattr(settings, 'PROFILING_ENABLED', False)
+
+
+def get_sample_rate():
+    return getattr(settings, 'PROFILING_SAMPLE_RATE', 1.0)
+
+
+def get_n_plus_one_mode():
+    return getattr(settings, 'NPLUSONE_DETECTION', None)
+
+
+def get_n_plus_one_allowlist():
+    return getattr(settings, 'NPLUSONE_ALLOWLIST', [])
+
+
+def _url_name(request):
+    match = getattr(request, 'resolver_match', None)
+    return match.view_name if match is not None else '<unresolved>'
+
+
+def server_timing(profile, timings):
+    """Server-Timing header value, readable in the browser's network panel"""
+    return ', '.join([
+        f'sql;dur={timings["sql_ms"]:.1f};desc="{profile.queries} queries"',
+        f'tpl;dur={timings["template_ms"]:.1f}',
+        f'app;dur={timings["python_ms"]:.1f}',
+        f'total;dur={timings["total_ms"]:.1f}',
+    ])
+
+
+class ProfilingMiddleware:
+    """Record the queries, template time and total time of requests, per URL name.
+
+    Opt-in with PROFILING_ENABLED; when it is off Django drops the middleware
+    at startup, so it costs nothing. Place it first, so that the time of the
+    other middleware is included. A PROFILING_SAMPLE_RATE below 1 profiles
+    only that fraction of requests. Profiled responses carry a Server-Timing
+    header and the profiles are served to staff by profiling.views.stats.
+    The times of streaming responses stop when the view returns.
+    """
+
+    sync_capable = True
+    async_capable = True
+
+    def __init__(self, get_response):
+        if not is_enabled():
+            raise MiddlewareNotUsed
+        recorder.install()
+        self.get_response = get_response
+        if iscoroutinefunction(get_response):
+            markcoroutinefunction(self)
+
+    def _start(self):
+        rate = get_sample_rate()
+        if rate < 1 and random.random() >= rate:
+            return None, None
+        profile = recorder.RequestProfile()
+        return profile, recorder.current_profile.set(profile)
+
+    def _finish(self, request, response, profile, token):
+        recorder.current_profile.reset(token)
+        url_name = _url_name(request)
+        if url_name in EXCLUDED:
+            return response
+        timings = profile.timings()
+        response['Server-Timing'] = server_timing(profile, timings)
+        entry = profile.as_dict()
+        entry.update(path=request.path, method=request.method, status=response.status_code)
+        store.add(url_name, entry)
+        return response
+
+    def __call__(self, request):
+        if iscoroutinefunction(self):
+            return self.__acall__(request)
+        profile, token = self._start()
+        if profile is None:
+            return self.get_response(request)
+        try:
+            response = self.get_response(request)
+        except BaseException:
+            recorder.current_profile.reset(token)
+            raise
+        return self._finish(request, response, profile, token)
+
+    async def __acall__(self, request):
+        profile, token = self._start()
+        if profile is None:
+            return await self.get_response(request)
+        try:
+            response = await self.get_response(request)
+        except BaseException:
+            recorder.current_profile.reset(token)
+            raise
+        return self._finish(request, response, profile, token)
+
+
+class NPlusOneMiddleware:
+    """Check every request for N+1 queries (see profiling.nplusone).
+
+    NPLUSONE_DETECTION selects what happens to them: 'log' logs a warning,
+    'raise' raises NPlusOneError, which the test client re-raises in the test
+    that made the request; anything else drops the middleware at startup.
+    Views named in NPLUSONE_ALLOWLIST are not checked. Only for development
+    and tests: the call site of every single-row lookup is looked up.
+    """
+
+    sync_capable = True
+    async_capable = True
+
+    def __init__(self, get_response):
+        self.mode = get_n_plus_one_mode()
+        if self.mode not in ('log', 'raise'):
+            raise MiddlewareNotUsed
+        self.get_response = get_response
+        if iscoroutinefunction(get_response):
+            markcoroutinefunction(self)
+
+    def _check(self, request, detector):
+        url_name = _url_name(request)
+        findings = detector.findings()
+        if not findings or url_name in get_n_plus_one_allowlist():
+            return
+        error = NPlusOneError(findings, f'{request.method} {request.path} ({url_name})')
+        if self.mode == 'raise':
+            raise error
+        logger.warning('%s', error)
+
+    def __call__(self, request):
+        if iscoroutinefunction(self):
+            return self.__acall__(request)
+        with NPlusOneDetector(raise_error=False) as detector:
+            response = self.get_response(request)
+        self._check(request, detector)
+        return response
+
+    async def __acall__(self, request):
+        with NPlusOneDetector(raise_error=False) as detector:
+            response = await self.get_response(request)
+        self._check(request, detector)
+        return response
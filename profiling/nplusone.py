@@ -0,0 +1,162 @@
+"""
+Detection of N+1 queries: the same single-row lookup run over and over from
+one place, typically a template or a loop dereferencing a foreign key of each
+row (``{{ appointment.doctor.user_profile.user.get_full_name }}``) where
+select_related or prefetch_related would have loaded them all at once.
+
+Queries are grouped by their shape (the SQL with its parameters, literals and
+IN lists blanked out) and their call site: the template line being rendered,
+or else the innermost project frame. A group is an N+1 when its statement is
+a lookup by equality on columns of one row and it ran at least
+NPLUSONE_THRESHOLD times.
+
+Use ``NPlusOneDetector`` as a context manager around code, mix
+``NPlusOneTestMixin`` into a TestCase to check each of its tests, or turn on
+profiling.middleware.NPlusOneMiddleware to check every request; the
+profiling.runner.NPlusOneTestRunner test runner does so for the whole suite.
+"""
+import re
+import sys
+from contextlib import contextmanager
+from dataclasses import dataclass
+from functools import lru_cache
+from django.conf import settings
+from . import recorder
+
+_STRING = re.compile(r"'(?:[^']|'')*'")
+_NUMBER = re.compile(r'(?<![\w"])-?\d+(?:\.\d+)?\b')
+_IN_LIST = re.compile(r'IN \((?:[^()]*)\)')
+_SELECT = re.compile(r'^SELECT .+? WHERE (?P<where>.+?)(?: ORDER BY .+?)?(?: LIMIT \S+)?(?: OFFSET \S+)?$', re.S)
+_EQUALS = re.compile(r'^(?:"\w+"\.)?"\w+" = (?:%s|\?)$')
+
+
+def get_threshold():
+    return getattr(settings, 'NPLUSONE_THRESHOLD', 3)
+
+
+@lru_cache(maxsize=2048)
+def shape(sql):
+    """``sql`` with its literals and IN lists blanked out"""
+    sql = _STRING.sub('?', sql)
+    sql = _NUMBER.sub('?', sql)
+    return _IN_LIST.sub('IN (...)', ' '.join(sql.split()))
+
+
+@lru_cache(maxsize=2048)
+def is_row_lookup(sql):
+    """Whether ``sql`` is a SELECT whose only conditions are equalities to parameters"""
+    match = _SELECT.match(shape(sql))
+    if match is None:
+        return False
+    where = match.group('where')
+    if where.startswith('(') and where.endswith(')'):
+        where = where[1:-1]
+    return all(_EQUALS.match(condition) for condition in where.split(' AND '))
+
+
+def query_site():
+    """The template line being rendered, or else the innermost project frame running the query"""
+    frame = sys._getframe(1)
+    while frame is not None:
+        if frame.f_code.co_name == 'render_annotated':
+            node = frame.f_locals.get('self')
+            origin, token = getattr(node, 'origin', None), getattr(node, 'token', None)
+            if origin is not None and token is not None:
+                return f'template {origin.template_name or origin.name}:{token.lineno}'
+        frame = frame.f_back
+    return recorder.call_site(sys._getframe(1)) or '<unknown>'
+
+
+@dataclass
+class Finding:
+    sql: str
+    site: str
+    count: int
+
+    def __str__(self):
+        return f'{self.count} x {self.sql}\n    at {self.site}'
+
+
+class NPlusOneError(AssertionError):
+    """N+1 queries were run where they are checked for"""
+
+    def __init__(self, findings, where=None):
+        self.findings = findings
+        heading = f'N+1 queries in {where}' if where else 'N+1 queries'
+        super().__init__('\n'.join([f'{heading}; use select_related or prefetch_related:']
+                                   + [str(finding) for finding in findings]))
+
+
+class NPlusOneDetector:
+    """Context manager grouping the queries run inside it and raising NPlusOneError on N+1s.
+
+    With ``raise_error=False`` it only collects; ``findings()`` lists them.
+    Queries run by sync_to_async from inside the block are seen too.
+    """
+
+    def __init__(self, threshold=None, raise_error=True):
+        self.threshold = threshold or get_threshold()
+        self.raise_error = raise_error
+        # (shape, site): [executions, an example statement]
+        self.groups = {}
+        self._token = None
+
+    def record_query(self, sql, seconds):
+        if not is_row_lookup(sql):
+            return
+        key = (shape(sql), query_site())
+        group = self.groups.get(key)
+        if group is None:
+            self.groups[key] = [1, sql]
+        else:
+            group[0] += 1
+
+    def findings(self):
+        """The N+1 groups, most executions first"""
+        found = [Finding(sql, site, count) for (_, site), (count, sql) in self.groups.items()
+                 if count >= self.threshold]
+        return sorted(found, key=lambda finding: -finding.count)
+
+    def check(self, where=None):
+        findings = self.findings()
+        if findings:
+            raise NPlusOneError(findings, where)
+
+    def __enter__(self):
+        recorder.install()
+        self._token = recorder.query_observers.set(recorder.query_observers.get() + (self,))
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        recorder.query_observers.reset(self._token)
+        if exc_type is None and self.raise_error:
+            self.check()
+
+
+@contextmanager
+def allow_n_plus_one():
+    """Hide the queries run inside the block from every detector, for known and accepted N+1s"""
+    token = recorder.query_observers.set(())
+    try:
+        yield
+    finally:
+        recorder.query_observers.reset(token)
+
+
+class NPlusOneTestMixin:
+    """TestCase mixin failing any test whose body runs N+1 queries (setUp is not checked).
+
+    Set ``n_plus_one_threshold`` to override NPLUSONE_THRESHOLD for the class.
+    """
+
+    n_plus_one_threshold = None
+
+    def setUp(self):
+        super().setUp()
+        detector = NPlusOneDetector(self.n_plus_one_threshold, raise_error=False)
+        detector.__enter__()
+        self.addCleanup(self._check_n_plus_one, detector)
+
+    def _check_n_plus_one(self, detector):
+        detector.__exit__(None, None, None)
+        detector.check(self.id())
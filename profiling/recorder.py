@@ -0,0 +1,164 @@
+"""
+Per-request recording of SQL and template time.
+
+``install`` wraps the execute methods of Django's database cursors and the
+Django template backend's Template.render. The wrappers look up the
+RequestProfile of the current request in a context variable and do nothing
+else when there is none, so requests that are not being profiled only pay for
+that lookup. Context variables follow a request into the threads of
+sync_to_async, so queries run by async views are recorded too. Nothing is installed unless profiling is
+enabled (see profiling.middleware).
+"""
+import heapq
+import os
+import sys
+import threading
+import time
+from contextvars import ContextVar
+import django
+from django.conf import settings
+from django.db.backends.utils import CursorWrapper
+from django.template.backends import django as django_backend
+
+current_profile = ContextVar('current_profile', default=None)
+# Other observers of the queries run in this context, each with record_query(sql, seconds)
+query_observers = ContextVar('query_observers', default=())
+
+# Frames from Django and from the recorders are not reported as the call site of a query
+_DJANGO_DIR = os.path.dirname(django.__file__) + os.sep
+_RECORDER_FILES = {__file__, os.path.join(os.path.dirname(__file__), 'nplusone.py')}
+
+_install_lock = threading.Lock()
+_installed = False
+
+
+def get_slow_query_count():
+    return getattr(settings, 'PROFILING_SLOW_QUERIES', 5)
+
+
+def call_site(frame=None):
+    """'path:line in function' of the innermost project frame on the stack, or None"""
+    root = str(settings.BASE_DIR) + os.sep
+    frame = frame or sys._getframe(1)
+    while frame is not None:
+        filename = frame.f_code.co_filename
+        if (filename.startswith(root) and not filename.startswith(_DJANGO_DIR)
+                and filename not in _RECORDER_FILES and 'site-packages' not in filename):
+            return f'{os.path.relpath(filename, root)}:{frame.f_lineno} in {frame.f_code.co_name}'
+        frame = frame.f_back
+    return None
+
+
+class RequestProfile:
+    """Queries and template time of one request"""
+
+    def __init__(self, slow_queries=None):
+        self.started = time.perf_counter()
+        self.queries = 0
+        self.sql_seconds = 0.0
+        self.render_seconds = 0.0
+        # SQL run while a template renders, e.g. by a lazily evaluated queryset
+        self.render_sql_seconds = 0.0
+        self.rendering = 0
+        # SQL text: [executions, seconds]
+        self.statements = {}
+        # Min-heap of (seconds, SQL, call site), the slowest ``slow_queries`` statements
+        self.slowest = []
+        self.slow_queries = get_slow_query_count() if slow_queries is None else slow_queries
+
+    def record_query(self, sql, seconds):
+        self.queries += 1
+        self.sql_seconds += seconds
+        if self.rendering:
+            self.render_sql_seconds += seconds
+        entry = self.statements.get(sql)
+        if entry is None:
+            self.statements[sql] = [1, seconds]
+        else:
+            entry[0] += 1
+            entry[1] += seconds
+        # Walking the stack is the costly part; only do it for a statement that makes the list
+        if len(self.slowest) < self.slow_queries:
+            heapq.heappush(self.slowest, (seconds, sql, call_site()))
+        elif self.slowest and seconds > self.slowest[0][0]:
+            heapq.heapreplace(self.slowest, (seconds, sql, call_site()))
+
+    def duplicates(self, limit=None):
+        """(SQL, executions, ms) of the statements run more than once, most executions first"""
+        repeated = sorted(
+            ((sql, count, seconds * 1000) for sql, (count, seconds) in self.statements.items() if count > 1),
+            key=lambda item: (-item[1], -item[2]),
+        )
+        return repeated[:limit] if limit else repeated
+
+    def timings(self):
+        """Milliseconds spent in SQL, in templates (less their SQL), in Python otherwise, and in total"""
+        total = time.perf_counter() - self.started
+        template = max(self.render_seconds - self.render_sql_seconds, 0.0)
+        return {
+            'sql_ms': self.sql_seconds * 1000,
+            'template_ms': template * 1000,
+            'python_ms': max(total - self.sql_seconds - template, 0.0) * 1000,
+            'total_ms': total * 1000,
+        }
+
+    def as_dict(self, limit=5):
+        data = {key: round(value, 2) for key, value in self.timings().items()}
+        data['queries'] = self.queries
+        data['duplicate_queries'] = sum(count - 1 for count, _ in self.statements.values())
+        data['duplicates'] = [
+            {'sql': sql, 'count': count, 'ms': round(ms, 2)} for sql, count, ms in self.duplicates(limit)
+        ]
+        data['slowest'] = [
+            {'sql': sql, 'ms': round(seconds * 1000, 2), 'call_site': site}
+            for seconds, sql, site in sorted(self.slowest, reverse=True)
+        ]
+        return data
+
+
+def _timed_execute(execute):
+    def timed_execute(cursor, sql, *args, **kwargs):
+        profile = current_profile.get()
+        observers = query_observers.get()
+        if profile is None and not observers:
+            return execute(cursor, sql, *args, **kwargs)
+        start = time.perf_counter()
+        try:
+            return execute(cursor, sql, *args, **kwargs)
+        finally:
+            seconds = time.perf_counter() - start
+            if profile is not None:
+                profile.record_query(sql, seconds)
+            for observer in observers:
+                observer.record_query(sql, seconds)
+    return timed_execute
+
+
+def _timed_render(render):
+    def timed_render(template, *args, **kwargs):
+        profile = current_profile.get()
+        if profile is None:
+            return render(template, *args, **kwargs)
+        profile.rendering += 1
+        start = time.perf_counter()
+        try:
+            return render(template, *args, **kwargs)
+        finally:
+            profile.rendering -= 1
+            # Templates included by another are already counted by the outer render
+            if not profile.rendering:
+                profile.render_seconds += time.perf_counter() - start
+    return timed_render
+
+
+def install():
+    """Hook the recorders into database cursors and template rendering, once per process"""
+    global _installed
+    with _install_lock:
+        if _installed:
+            return
+        # Subclasses such as the debug cursor call these through super()
+        CursorWrapper.execute = _timed_execute(CursorWrapper.execute)
+        CursorWrapper.executemany = _timed_execute(CursorWrapper.executemany)
+        django_backend.Template.render = _timed_render(django_backend.Template.render)
+        _installed = True
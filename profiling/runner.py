@@ -0,0 +1,14 @@
+from django.conf import settings
+from django.test.runner import DiscoverRunner
+
+
+class NPlusOneTestRunner(DiscoverRunner):
+    """Test runner failing every test whose requests run N+1 queries.
+
+    Turns NPlusOneMiddleware on in 'raise' mode, so the test client re-raises
+    NPlusOneError from any view the suite requests.
+    """
+
+    def setup_test_environment(self, **kwargs):
+        super().setup_test_environment(**kwargs)
+        settings.NPLUSONE_DETECTION = 'raise'
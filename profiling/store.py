@@ -0,0 +1,95 @@
+"""
+Recent request profiles, kept per URL name.
+
+Each URL name keeps its last PROFILING_BUFFER_SIZE profiles in a ring buffer,
+so memory stays bounded however long the process runs. The buffers live in
+the memory of one process: with several server processes, each one reports
+the requests it served itself.
+"""
+import threading
+from collections import deque
+from django.conf import settings
+from django.utils import timezone
+
+
+def get_buffer_size():
+    return getattr(settings, 'PROFILING_BUFFER_SIZE', 100)
+
+
+def _percentile(values, fraction):
+    values = sorted(values)
+    return values[min(int(len(values) * fraction), len(values) - 1)]
+
+
+class ProfileStore:
+    """Thread-safe ring buffers of request profiles, one per URL name"""
+
+    def __init__(self, size=None):
+        self.size = size
+        self._lock = threading.Lock()
+        self._buffers = {}
+
+    def add(self, url_name, entry):
+        entry = dict(entry, at=timezone.now().isoformat())
+        with self._lock:
+            buffer = self._buffers.get(url_name)
+            if buffer is None:
+                buffer = self._buffers[url_name] = deque(maxlen=self.size or get_buffer_size())
+            buffer.append(entry)
+
+    def clear(self):
+        with self._lock:
+            self._buffers.clear()
+
+    def entries(self, url_name):
+        with self._lock:
+            return list(self._buffers.get(url_name, ()))
+
+    def url_names(self):
+        with self._lock:
+            return sorted(self._buffers)
+
+    def summary(self, url_name, limit=10):
+        """Aggregate of the buffered profiles of ``url_name``, or None if it has none"""
+        entries = self.entries(url_name)
+        if not entries:
+            return None
+        count = len(entries)
+        totals = [entry['total_ms'] for entry in entries]
+        duplicates = {}
+        for entry in entries:
+            for duplicate in entry['duplicates']:
+                seen = duplicates.setdefault(duplicate['sql'], {'sql': duplicate['sql'], 'count': 0, 'ms': 0.0})
+                seen['count'] += duplicate['count']
+                seen['ms'] += duplicate['ms']
+        slowest = sorted(
+            (dict(statement, path=entry['path']) for entry in entries for statement in entry['slowest']),
+            key=lambda statement: -statement['ms'],
+        )
+        return {
+            'requests': count,
+            'total_ms': {
+                'mean': round(sum(totals) / count, 2),
+                'p50': _percentile(totals, 0.5),
+                'p95': _percentile(totals, 0.95),
+                'max': max(totals),
+            },
+            'mean_ms': {
+                key: round(sum(entry[key] for entry in entries) / count, 2)
+                for key in ('sql_ms', 'template_ms', 'python_ms')
+            },
+            'queries': {
+                'mean': round(sum(entry['queries'] for entry in entries) / count, 1),
+                'max': max(entry['queries'] for entry in entries),
+                'duplicate_mean': round(sum(entry['duplicate_queries'] for entry in entries) / count, 1),
+            },
+            'duplicates': [
+                dict(duplicate, ms=round(duplicate['ms'], 2))
+                for duplicate in sorted(duplicates.values(), key=lambda item: (-item['count'], -item['ms']))[:limit]
+            ],
+            'slowest': slowest[:limit],
+            'latest': entries[-1],
+        }
+
+
+store = ProfileStore()
@@ -0,0 +1,203 @@
+import unittest
+from asgiref.sync import sync_to_async
+from django.http import HttpResponse
+from django.template.loader import render_to_string
+from django.test import RequestFactory, TestCase, override_settings
+from django.contrib.auth.models import User
+from django.urls import reverse
+from accounts.models import UserProfile, DoctorProfile, PatientProfile
+from reports.models import MedicalRecord
+from . import recorder
+from .middleware import NPlusOneMiddleware
+from .nplusone import NPlusOneDetector, NPlusOneError, NPlusOneTestMixin, allow_n_plus_one, is_row_lookup, shape
+from .store import store
+
+
+@override_settings(PROFILING_ENABLED=True)
+class ProfilingMiddlewareTests(TestCase):
+    """Test cases for the request profiling middleware and its endpoint"""
+
+    def setUp(self):
+        """Set up a doctor with three records of different patients, and a staff user"""
+        user = User.objects.create_user(username='profiledoctor', first_name='Greg', last_name='House')
+        self.doctor = DoctorProfile.objects.create(
+            user_profile=UserProfile.objects.create(user=user, user_type='doctor'),
+            specialization='Cardiology',
+            qualification='MD',
+            license_number='PROFILE1'
+        )
+        for i in range(3):
+            user = User.objects.create_user(username=f'profilepatient{i}', first_name='Pat', last_name=str(i))
+            patient = PatientProfile.objects.create(
+                user_profile=UserProfile.objects.create(user=user, user_type='patient')
+            )
+            MedicalRecord.objects.create(patient=patient, doctor=self.doctor, diagnosis='Flu', symptoms='Fever')
+        self.staff = User.objects.create_user(username='profilestaff', is_staff=True)
+        store.clear()
+        self.addCleanup(store.clear)
+
+    def _stats(self, **params):
+        self.client.force_login(self.staff)
+        response = self.client.get(reverse('profiling:stats'), params)
+        self.assertEqual(response.status_code, 200)
+        return response.json()
+
+    @override_settings(PROFILING_ENABLED=False)
+    def test_disabled_by_default(self):
+        """Test that nothing is recorded or added to responses when profiling is off"""
+        self.client.force_login(self.doctor.user_profile.user)
+        response = self.client.get(reverse('reports:medical_records_list'))
+        self.assertEqual(response.status_code, 200)
+        self.assertNotIn('Server-Timing', response)
+        self.assertEqual(self._stats(), {'enabled': False, 'urls': {}})
+
+    def test_request_is_profiled_per_url_name(self):
+        """Test that queries, timings and the call sites of the slowest statements are recorded under the URL name"""
+        self.client.force_login(self.doctor.user_profile.user)
+        for _ in range(2):
+            response = self.client.get(reverse('reports:medical_records_list'))
+        self.assertRegex(response['Server-Timing'], r'^sql;dur=[\d.]+;desc="\d+ queries", tpl;dur=[\d.]+, '
+                                                    r'app;dur=[\d.]+, total;dur=[\d.]+$')
+
+        summary = self._stats()['urls']['reports:medical_records_list']
+        self.assertEqual(summary['requests'], 2)
+        self.assertEqual(summary['latest']['status'], 200)
+        self.assertGreater(summary['latest']['queries'], 0)
+        self.assertTrue(all(statement['call_site'] for statement in summary['slowest']))
+        self.assertGreater(summary['latest']['template_ms'], 0)
+
+    def test_repeated_statements_are_grouped(self):
+        """Test that the same SQL run for each row is reported once with its count"""
+        recorder.install()
+        profile = recorder.RequestProfile()
+        token = recorder.current_profile.set(profile)
+        try:
+            names = [record.patient.user_profile.user.username for record in MedicalRecord.objects.all()]
+        finally:
+            recorder.current_profile.reset(token)
+        self.assertEqual(len(names), 3)
+        data = profile.as_dict()
+        self.assertEqual(data['queries'], 10)
+        self.assertEqual(data['duplicate_queries'], 6)
+        self.assertEqual([duplicate['count'] for duplicate in data['duplicates']], [3, 3, 3])
+        self.assertTrue(any('"accounts_patientprofile"' in duplicate['sql'] for duplicate in data['duplicates']))
+
+    @override_settings(PROFILING_SAMPLE_RATE=0)
+    def test_sample_rate(self):
+        """Test that requests outside the sample are passed through unprofiled"""
+        self.client.force_login(self.doctor.user_profile.user)
+        response = self.client.get(reverse('reports:medical_records_list'))
+        self.assertNotIn('Server-Timing', response)
+        self.assertEqual(self._stats()['urls'], {})
+
+    async def test_async_requests_are_profiled(self):
+        """Test that queries run by the async middleware chain are recorded"""
+        await sync_to_async(self.async_client.force_login)(self.doctor.user_profile.user)
+        response = await self.async_client.get(reverse('reports:medical_records_list'))
+        self.assertEqual(response.status_code, 200)
+        self.assertIn('Server-Timing', response)
+        entries = store.entries('reports:medical_records_list')
+        self.assertEqual(len(entries), 1)
+        self.assertGreater(entries[0]['queries'], 3)
+
+    def test_endpoint_is_staff_only_and_clearable(self):
+        """Test that other users are refused and a POST clears the profiles"""
+        self.client.force_login(self.doctor.user_profile.user)
+        self.client.get(reverse('reports:medical_records_list'))
+        response = self.client.get(reverse('profiling:stats'))
+        self.assertEqual(response.status_code, 403)
+
+        self.assertEqual(list(self._stats(url='reports:medical_records_list')['urls']),
+                         ['reports:medical_records_list'])
+        response = self.client.post(reverse('profiling:stats'))
+        self.assertEqual(response.json(), {'cleared': True})
+        self.assertEqual(self._stats()['urls'], {})
+
+
+class NPlusOneTests(TestCase):
+    """Test cases for the N+1 query detector"""
+
+    def setUp(self):
+        """Set up a doctor with three records of different patients"""
+        user = User.objects.create_user(username='nplusonedoctor', first_name='Greg', last_name='House')
+        self.doctor = DoctorProfile.objects.create(
+            user_profile=UserProfile.objects.create(user=user, user_type='doctor'),
+            specialization='Cardiology',
+            qualification='MD',
+            license_number='NPLUSONE1'
+        )
+        for i in range(3):
+            user = User.objects.create_user(username=f'nplusonepatient{i}', first_name='Pat', last_name=str(i))
+            patient = PatientProfile.objects.create(
+                user_profile=UserProfile.objects.create(user=user, user_type='patient')
+            )
+            MedicalRecord.objects.create(patient=patient, doctor=self.doctor, diagnosis='Flu', symptoms='Fever')
+
+    def _patient_names(self, records):
+        return [record.patient.user_profile.user.username for record in records]
+
+    def test_shapes_and_row_lookups(self):
+        """Test that parameters and IN lists are blanked out and only equality lookups count as row lookups"""
+        first = str(MedicalRecord.objects.filter(id__in=[1, 2]).query)
+        second = str(MedicalRecord.objects.filter(id__in=[3, 4, 5]).query)
+        self.assertEqual(shape(first), shape(second))
+        self.assertTrue(is_row_lookup('SELECT "a"."id" FROM "a" WHERE "a"."id" = %s LIMIT 21'))
+        self.assertTrue(is_row_lookup('SELECT "a"."id" FROM "a" WHERE ("a"."x_id" = %s AND "a"."y" = %s)'))
+        self.assertFalse(is_row_lookup('SELECT "a"."id" FROM "a" WHERE "a"."id" IN (%s, %s)'))
+        self.assertFalse(is_row_lookup('SELECT "a"."id" FROM "a" WHERE "a"."name" LIKE %s'))
+        self.assertFalse(is_row_lookup('UPDATE "a" SET "x" = %s WHERE "a"."id" = %s'))
+
+    def test_loop_lookups_raise_with_call_site(self):
+        """Test that a lookup per row fails at the loop and select_related passes"""
+        with self.assertRaises(NPlusOneError) as caught:
+            with NPlusOneDetector():
+                self._patient_names(MedicalRecord.objects.all())
+        findings = caught.exception.findings
+        self.assertEqual([finding.count for finding in findings], [3, 3, 3])
+        self.assertEqual({finding.site for finding in findings}, {findings[0].site})
+        self.assertRegex(findings[0].site, r'^profiling/tests\.py:\d+ in ')
+
+        with NPlusOneDetector():
+            self._patient_names(MedicalRecord.objects.select_related('patient__user_profile__user'))
+        with NPlusOneDetector(threshold=4):
+            self._patient_names(MedicalRecord.objects.all())
+        with NPlusOneDetector(), allow_n_plus_one():
+            self._patient_names(MedicalRecord.objects.all())
+
+    def test_template_lookups_report_the_template_line(self):
+        """Test that lookups made while rendering are attributed to the template line"""
+        with NPlusOneDetector(raise_error=False) as detector:
+            render_to_string('reports/medical_records_list.html', {
+                'medical_records': MedicalRecord.objects.all(),
+                'user_profile': self.doctor.user_profile,
+            })
+        self.assertEqual({finding.site for finding in detector.findings()},
+                         {'template reports/medical_records_list.html:38'})
+
+    def test_mixin_fails_the_test(self):
+        """Test that a test case with the mixin fails when its test runs N+1 queries"""
+        names = self._patient_names
+
+        class Checked(NPlusOneTestMixin, unittest.TestCase):
+            def test_loop(self):
+                names(MedicalRecord.objects.all())
+
+        result = unittest.TestResult()
+        Checked('test_loop').run(result)
+        self.assertEqual(len(result.failures), 1)
+        self.assertIn('N+1 queries in', result.failures[0][1])
+
+    def test_middleware_modes(self):
+        """Test that the middleware raises or logs N+1 requests and skips allowlisted ones"""
+        def view(request):
+            return HttpResponse(' '.join(self._patient_names(MedicalRecord.objects.all())))
+
+        request = RequestFactory().get('/records/')
+        with override_settings(NPLUSONE_DETECTION='raise'):
+            with self.assertRaisesMessage(NPlusOneError, 'N+1 queries in GET /records/ (<unresolved>)'):
+                NPlusOneMiddleware(view)(request)
+            with override_settings(NPLUSONE_ALLOWLIST=['<unresolved>']):
+                self.assertEqual(NPlusOneMiddleware(view)(request).status_code, 200)
+        with override_settings(NPLUSONE_DETECTION='log'):
+            with self.assertLogs('profiling.middleware', 'WARNING'):
+                self.assertEqual(NPlusOneMiddleware(view)(request).status_code, 200)
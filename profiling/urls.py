@@ -0,0 +1,8 @@
+from django.urls import path
+from . import views
+
+app_name = 'profiling'
+
+urlpatterns = [
+    path('', views.stats, name='stats'),
+]
@@ -0,0 +1,25 @@
+from django.contrib.auth.decorators import login_required
+from django.http import JsonResponse
+from django.views.decorators.http import require_http_methods
+from .middleware import is_enabled
+from .store import store
+
+# Create your views here.
+
+@login_required
+@require_http_methods(['GET', 'POST'])
+def stats(request):
+    """JSON request profiles per URL name (staff only); ``url`` selects one, POST clears them all"""
+    if not request.user.is_staff:
+        return JsonResponse({'error': 'You do not have permission to view request profiles.'}, status=403)
+
+    if request.method == 'POST':
+        store.clear()
+        return JsonResponse({'cleared': True})
+
+    url_names = [request.GET['url']] if request.GET.get('url') else store.url_names()
+    summaries = {name: store.summary(name) for name in url_names}
+    return JsonResponse({
+        'enabled': is_enabled(),
+        'urls': {name: summary for name, summary in summaries.items() if summary is not None},
+    })
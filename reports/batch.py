@@ -0,0 +1,105 @@
+"""
+Batch PDF generation.
+
+Renders many reports, and optionally their patients' combined medical
+histories (see reports.history), in parallel: the parent process loads
+everything in a few queries and hands plain dicts (see reports.pdf) to a
+ProcessPoolExecutor, then writes each PDF to storage under MEDIA_ROOT/reports
+as it comes back and records it in Report.file_path. The PDFs can also be written into a zip archive on the fly.
+"""
+import os
+import zipfile
+from itertools import groupby
+from concurrent.futures import ProcessPoolExecutor
+from django.conf import settings
+from django.core.files.base import ContentFile
+from django.core.files.storage import default_storage
+from accounts.models import PatientProfile
+from consultation.models import ConsultationNote
+from .history import merge_entries
+from .models import MedicalRecord, Report
+from .pdf import history_pdf_data, render_history_pdf, render_job, render_report_pdf, report_pdf_data
+
+REPORTS_DIR = 'reports'
+
+
+def get_workers():
+    return getattr(settings, 'PDF_BATCH_WORKERS', None) or os.cpu_count() or 1
+
+
+def report_file_name(report_id):
+    return f'{REPORTS_DIR}/report_{report_id}.pdf'
+
+
+def history_file_name(patient_id):
+    return f'{REPORTS_DIR}/history_patient_{patient_id}.pdf'
+
+
+def _by_patient(queryset):
+    """{patient id: [rows]} of a queryset ordered by patient"""
+    rows = queryset.select_related('doctor__user_profile__user')
+    return {patient_id: list(group) for patient_id, group in groupby(rows, key=lambda row: row.patient_id)}
+
+
+def _jobs(reports, patient_ids):
+    """The (storage name, renderer, data) jobs of the batch and the report id of each report's name"""
+    reports = list(reports.select_related('patient__user_profile__user', 'doctor__user_profile__user'))
+    jobs = [(report_file_name(report.id), render_report_pdf, report_pdf_data(report)) for report in reports]
+    report_ids = {report_file_name(report.id): report.id for report in reports}
+    if patient_ids:
+        patients = PatientProfile.objects.select_related('user_profile__user').in_bulk(patient_ids)
+        records = _by_patient(MedicalRecord.objects.filter(patient_id__in=patient_ids).order_by(
+            'patient_id', 'record_date', 'created_at', 'pk'))
+        notes = _by_patient(ConsultationNote.objects.filter(patient_id__in=patient_ids).order_by(
+            'patient_id', 'created_at', 'pk'))
+        for patient_id in sorted(patients):
+            entries = list(merge_entries(records.get(patient_id, []), notes.get(patient_id, [])))
+            data = history_pdf_data(patients[patient_id], entries)
+            jobs.append((history_file_name(patient_id), render_history_pdf, data))
+    return jobs, report_ids
+
+
+def _save(name, pdf):
+    # Overwrite instead of letting the storage pick a new name for every run
+    if default_storage.exists(name):
+        default_storage.delete(name)
+    return default_storage.save(name, ContentFile(pdf))
+
+
+def render_batch(reports, patient_ids=(), workers=None, zip_file=None):
+    """Render ``reports`` (a Report queryset) and the medical histories of ``patient_ids``.
+
+    Each PDF is saved under MEDIA_ROOT/reports (reports are linked through
+    Report.file_path) and, if ``zip_file`` (a writable file object, which need
+    not be seekable) is given, added to a zip archive written to it. Returns
+    the storage names of the PDFs, in the order they were rendered.
+    """
+    workers = workers or get_workers()
+    jobs, report_ids = _jobs(reports, patient_ids)
+    archive = zipfile.ZipFile(zip_file, 'w', zipfile.ZIP_DEFLATED) if zip_file is not None else None
+    saved = []
+    try:
+        if workers == 1 or len(jobs) <= 1:
+            results = map(render_job, jobs)
+            pool = None
+        else:
+            pool = ProcessPoolExecutor(min(workers, len(jobs)))
+            # Several jobs per round trip, but small enough chunks to keep every worker busy
+            results = pool.map(render_job, jobs, chunksize=max(1, len(jobs) // (workers * 4)))
+        try:
+            for name, pdf in results:
+                saved.append((name, _save(name, pdf)))
+                if archive is not None:
+                    archive.writestr(os.path.basename(name), pdf)
+        finally:
+            if pool is not None:
+                pool.shutdown(cancel_futures=True)
+    finally:
+        if archive is not None:
+            archive.close()
+
+    Report.objects.bulk_update(
+        [Report(id=report_ids[name], file_path=stored) for name, stored in saved if name in report_ids],
+        ['file_path'], batch_size=500,
+    )
+    return [stored for _, stored in saved]
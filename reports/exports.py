@@ -0,0 +1,153 @@
+"""
+Streaming bulk CSV exports of medical records and reports.
+
+An export can run to millions of rows, so rows are read with values_list() in
+chunks of EXPORT_CHUNK_SIZE (no model instances are built) and written to the
+response as they are produced: memory use stays flat however large the export
+is. ``stream_csv`` serves WSGI; ``astream_csv`` feeds the async views under
+ASGI, where Django would otherwise read a sync iterator into memory first.
+"""
+import csv
+from datetime import date, datetime, time, timedelta
+from asgiref.sync import sync_to_async
+from django.conf import settings
+from django.utils import timezone
+from .models import MedicalRecord, Report
+
+# Rows are written out in pieces of roughly this many characters
+FLUSH_SIZE = 64 * 1024
+
+RECORD_HEADER = [
+    'ID', 'Date', 'Patient', 'Doctor', 'Appointment', 'Diagnosis', 'Symptoms', 'Prescription', 'Lab results', 'Notes',
+]
+RECORD_FIELDS = [
+    'id', 'record_date',
+    'patient__user_profile__user__first_name', 'patient__user_profile__user__last_name',
+    'doctor__user_profile__user__first_name', 'doctor__user_profile__user__last_name',
+    'appointment_id', 'diagnosis', 'symptoms', 'prescription', 'lab_results', 'notes',
+]
+
+REPORT_HEADER = ['ID', 'Created', 'Type', 'Title', 'Patient', 'Doctor', 'Medical record', 'Content']
+REPORT_FIELDS = [
+    'id', 'created_at', 'report_type', 'title',
+    'patient__user_profile__user__first_name', 'patient__user_profile__user__last_name',
+    'doctor__user_profile__user__first_name', 'doctor__user_profile__user__last_name',
+    'medical_record_id', 'content',
+]
+REPORT_TYPES = dict(Report.REPORT_TYPE_CHOICES)
+
+
+def get_chunk_size():
+    return getattr(settings, 'EXPORT_CHUNK_SIZE', 2000)
+
+
+def parse_filters(params):
+    """The export filters (patient, doctor, start, end) from a query dict; raises ValueError if malformed"""
+    filters = {}
+    for name in ('patient', 'doctor'):
+        value = params.get(name)
+        filters[name] = int(value) if value else None
+    for name in ('start', 'end'):
+        value = params.get(name)
+        filters[name] = date.fromisoformat(value) if value else None
+    return filters
+
+
+def _scoped(queryset, actor, filters):
+    # Doctors export what they wrote and patients their own history; staff without a profile see everything
+    if actor.is_doctor:
+        queryset = queryset.filter(doctor=actor.doctor_profile)
+    elif actor.is_patient:
+        queryset = queryset.filter(patient=actor.patient_profile)
+    if filters['patient']:
+        queryset = queryset.filter(patient_id=filters['patient'])
+    if filters['doctor']:
+        queryset = queryset.filter(doctor_id=filters['doctor'])
+    return queryset
+
+
+def _local_midnight(day):
+    return timezone.make_aware(datetime.combine(day, time.min))
+
+
+def medical_record_rows(actor, filters):
+    """values_list queryset of the medical records to export, oldest first"""
+    queryset = _scoped(MedicalRecord.objects.all(), actor, filters)
+    if filters['start']:
+        queryset = queryset.filter(record_date__gte=filters['start'])
+    if filters['end']:
+        queryset = queryset.filter(record_date__lte=filters['end'])
+    # Matches the (doctor|patient, record_date, created_at) indexes, so no sort is needed
+    return queryset.order_by('record_date', 'created_at', 'pk').values_list(*RECORD_FIELDS)
+
+
+def report_rows(actor, filters):
+    """values_list queryset of the reports to export, oldest first"""
+    queryset = _scoped(Report.objects.all(), actor, filters)
+    # Bounds on created_at itself (not created_at__date), so the indexes still apply
+    if filters['start']:
+        queryset = queryset.filter(created_at__gte=_local_midnight(filters['start']))
+    if filters['end']:
+        queryset = queryset.filter(created_at__lt=_local_midnight(filters['end'] + timedelta(days=1)))
+    return queryset.order_by('created_at', 'pk').values_list(*REPORT_FIELDS)
+
+
+def _name(first_name, last_name):
+    return f'{first_name or ""} {last_name or ""}'.strip()
+
+
+def format_record(values):
+    (pk, record_date, patient_first, patient_last, doctor_first, doctor_last,
+     appointment_id, diagnosis, symptoms, prescription, lab_results, notes) = values
+    return [pk, record_date.isoformat(), _name(patient_first, patient_last), _name(doctor_first, doctor_last),
+            appointment_id or '', diagnosis, symptoms, prescription, lab_results, notes]
+
+
+def report_formatter():
+    """Row formatter for report exports, converting to the current time zone looked up once per export"""
+    tz = timezone.get_current_timezone()
+
+    def format_report(values):
+        (pk, created_at, report_type, title, patient_first, patient_last, doctor_first, doctor_last,
+         medical_record_id, content) = values
+        created = created_at.astimezone(tz).strftime('%Y-%m-%d %H:%M:%S')
+        return [pk, created, REPORT_TYPES.get(report_type, report_type), title, _name(patient_first, patient_last),
+                _name(doctor_first, doctor_last), medical_record_id or '', content]
+    return format_report
+
+
+class _Echo:
+    """File-like object whose write() hands back the line csv.writer produced"""
+
+    def write(self, value):
+        return value
+
+
+def stream_csv(header, queryset, format_row, chunk_size=None):
+    """Yield the CSV text of ``queryset`` (a values_list queryset) piece by piece"""
+    writer = csv.writer(_Echo())
+    lines = [writer.writerow(header)]
+    size = 0
+    for values in queryset.iterator(chunk_size=chunk_size or get_chunk_size()):
+        line = writer.writerow(format_row(values))
+        lines.append(line)
+        size += len(line)
+        if size >= FLUSH_SIZE:
+            yield ''.join(lines)
+            lines, size = [], 0
+    if lines:
+        yield ''.join(lines)
+
+
+async def astream_csv(header, queryset, format_row, chunk_size=None):
+    """Async variant of stream_csv; each piece is produced in a worker thread.
+
+    (QuerySet.aiterator() cannot be used: for values_list() querysets Django 4.2
+    runs the query on the event loop.)
+    """
+    pieces = stream_csv(header, queryset, format_row, chunk_size)
+    while True:
+        piece = await sync_to_async(next)(pieces, None)
+        if piece is None:
+            return
+        yield piece
@@ -0,0 +1,26 @@
+"""
+A patient's combined medical history: their MedicalRecords and
+ConsultationNotes merged into one sequence of entries, oldest first.
+"""
+import heapq
+from consultation.models import ConsultationNote
+from .models import MedicalRecord
+from .pdf import note_entry, record_entry
+
+
+def merge_entries(records, notes):
+    """History entries of ``records`` and ``notes`` (each already oldest first), merged by creation time"""
+    for item in heapq.merge(records, notes, key=lambda item: item.created_at):
+        yield record_entry(item) if isinstance(item, MedicalRecord) else note_entry(item)
+
+
+def history_entries(patient_id, chunk_size=500):
+    """Stream a patient's history entries from the database, ``chunk_size`` rows of each kind at a time"""
+    # Orderings that match the (patient, record_date, created_at) and (patient, created_at) indexes
+    records = MedicalRecord.objects.filter(patient_id=patient_id).select_related(
+        'doctor__user_profile__user'
+    ).order_by('record_date', 'created_at', 'pk')
+    notes = ConsultationNote.objects.filter(patient_id=patient_id).select_related(
+        'doctor__user_profile__user'
+    ).order_by('created_at', 'pk')
+    return merge_entries(records.iterator(chunk_size=chunk_size), notes.iterator(chunk_size=chunk_size))
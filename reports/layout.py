@@ -0,0 +1,111 @@
+"""
+Text layout for the generated PDFs.
+
+``wrap_text`` breaks text into lines that fit a width, measured with the
+font's metrics (words longer than a line are split). ``FlowDocument`` flows
+such lines down letter-sized pages, starting a new page, with a footer, when
+the current one is full.
+
+Layout is streaming: lines are produced and drawn one at a time and a page is
+finished as soon as it is full, so only the current page is being laid out
+whatever the document's length. Finished pages are kept, compressed, by
+ReportLab until ``close`` writes the file.
+"""
+from reportlab.lib.pagesizes import letter
+from reportlab.lib.units import inch
+from reportlab.pdfbase.pdfmetrics import stringWidth
+from reportlab.pdfgen import canvas
+
+
+def _split_word(word, font, size, width):
+    """Pieces of a word too long for one line, each fitting ``width``"""
+    piece = ''
+    for char in word:
+        if piece and stringWidth(piece + char, font, size) > width:
+            yield piece
+            piece = ''
+        piece += char
+    if piece:
+        yield piece
+
+
+def wrap_text(text, font, size, width):
+    """Yield the lines of ``text`` word-wrapped to ``width`` points; newlines start new lines"""
+    space = stringWidth(' ', font, size)
+    for paragraph in text.split('\n'):
+        line, line_width = [], 0
+        for word in paragraph.split():
+            word_width = stringWidth(word, font, size)
+            if word_width > width:
+                if line:
+                    yield ' '.join(line)
+                pieces = list(_split_word(word, font, size, width))
+                yield from pieces[:-1]
+                line, line_width = [pieces[-1]], stringWidth(pieces[-1], font, size)
+            elif line and line_width + space + word_width > width:
+                yield ' '.join(line)
+                line, line_width = [word], word_width
+            else:
+                line_width += (space if line else 0) + word_width
+                line.append(word)
+        yield ' '.join(line)
+
+
+class FlowDocument:
+    """A PDF written to ``fileobj`` whose text flows from page to page.
+
+    Draw with ``text`` and ``space``; ``close`` finishes the last page and
+    writes the file.
+    """
+
+    def __init__(self, fileobj, title='', margin=inch, pagesize=letter):
+        self.canvas = canvas.Canvas(fileobj, pagesize=pagesize, pageCompression=1)
+        if title:
+            self.canvas.setTitle(title)
+        self.title = title
+        self.page_width, self.page_height = pagesize
+        self.margin = margin
+        self.width = self.page_width - 2 * margin
+        self.pages = 1
+        self._font = None
+        self.y = self.page_height - margin
+
+    def _footer(self):
+        self.canvas.setFont('Helvetica', 8)
+        self.canvas.drawString(self.margin, self.margin / 2, self.title)
+        self.canvas.drawRightString(self.page_width - self.margin, self.margin / 2, f'Page {self.pages}')
+
+    def new_page(self):
+        self._footer()
+        self.canvas.showPage()
+        self.pages += 1
+        # showPage resets the graphics state
+        self._font = None
+        self.y = self.page_height - self.margin
+
+    def _room_for(self, height):
+        if self.y - height < self.margin:
+            self.new_page()
+
+    def space(self, height):
+        """Vertical space; dropped at the top of a new page"""
+        self.y -= height
+        if self.y < self.margin:
+            self.new_page()
+
+    def text(self, text, font='Helvetica', size=10, indent=0, keep_with_next=0):
+        """Wrap and draw ``text``; ``keep_with_next`` lines of room are required below its first line"""
+        leading = size * 1.25
+        self._room_for(leading * (1 + keep_with_next))
+        for line in wrap_text(text, font, size, self.width - indent):
+            self._room_for(leading)
+            if self._font != (font, size):
+                self.canvas.setFont(font, size)
+                self._font = (font, size)
+            self.y -= leading
+            self.canvas.drawString(self.margin + indent, self.y + leading - size, line)
+
+    def close(self):
+        self._footer()
+        self.canvas.showPage()
+        self.canvas.save()
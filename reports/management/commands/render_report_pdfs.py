@@ -0,0 +1,59 @@
+import time
+from datetime import date, datetime
+from django.core.management.base import BaseCommand, CommandError
+from django.utils import timezone
+from reports import batch
+from reports.models import Report
+
+
+class Command(BaseCommand):
+    help = ('Render reports to PDF files under MEDIA_ROOT/reports across a process pool, optionally with the '
+            "patients' medical histories and bundled into a zip archive")
+
+    def add_arguments(self, parser):
+        parser.add_argument('--report', type=int, action='append', dest='reports',
+                            help='Limit to this Report id (repeatable)')
+        parser.add_argument('--patient', type=int, action='append', dest='patients',
+                            help='Limit to the reports of this PatientProfile id (repeatable)')
+        parser.add_argument('--month', help='Limit to the reports created in this month (YYYY-MM)')
+        parser.add_argument('--history', action='store_true',
+                            help="Also render the medical history of every selected report's patient")
+        parser.add_argument('--workers', type=int, default=None,
+                            help='Worker processes (default: PDF_BATCH_WORKERS, or one per CPU)')
+        parser.add_argument('--zip', dest='zip_path', help='Also write all PDFs into this zip file')
+
+    def _month_bounds(self, value):
+        try:
+            start = datetime.strptime(value, '%Y-%m').date()
+        except ValueError:
+            raise CommandError('--month must be given as YYYY-MM.')
+        end = date(start.year + start.month // 12, start.month % 12 + 1, 1)
+        return [timezone.make_aware(datetime.combine(day, datetime.min.time())) for day in (start, end)]
+
+    def handle(self, *args, **options):
+        if not (options['reports'] or options['patients'] or options['month']):
+            raise CommandError('Select reports with --report, --patient or --month.')
+        if options['workers'] is not None and options['workers'] < 1:
+            raise CommandError('--workers must be positive.')
+
+        reports = Report.objects.all()
+        if options['reports']:
+            reports = reports.filter(pk__in=options['reports'])
+        if options['patients']:
+            reports = reports.filter(patient_id__in=options['patients'])
+        if options['month']:
+            start, end = self._month_bounds(options['month'])
+            reports = reports.filter(created_at__gte=start, created_at__lt=end)
+        reports = reports.order_by('pk')
+        patient_ids = sorted(set(reports.values_list('patient_id', flat=True))) if options['history'] else ()
+
+        workers = options['workers'] or batch.get_workers()
+        started = time.perf_counter()
+        if options['zip_path']:
+            with open(options['zip_path'], 'wb') as zip_file:
+                saved = batch.render_batch(reports, patient_ids, workers=workers, zip_file=zip_file)
+        else:
+            saved = batch.render_batch(reports, patient_ids, workers=workers)
+        elapsed = time.perf_counter() - started
+        self.stdout.write(self.style.SUCCESS(
+            f'Rendered {len(saved)} PDFs in {elapsed:.2f}s ({len(saved) / elapsed:.1f} PDFs/s, {workers} workers).'))
@@ -22,6 +22,10 @@ class MedicalRecord(models.Model):
     
     class Meta:
         ordering = ['-record_date', '-created_at']
+        indexes = [
+            models.Index(fields=['patient', 'record_date', 'created_at'], name='record_patient_date_idx'),
+            models.Index(fields=['doctor', 'record_date', 'created_at'], name='record_doctor_date_idx'),
+        ]
     
     def __str__(self):
         return f"{self.patient} - {self.record_date}"
@@ -49,6 +53,10 @@ class Report(models.Model):
     
     class Meta:
         ordering = ['-created_at']
+        indexes = [
+            models.Index(fields=['patient', 'created_at'], name='report_patient_created_idx'),
+            models.Index(fields=['doctor', 'created_at'], name='report_doctor_created_idx'),
+        ]
     
     def __str__(self):
         return f"{self.title} - {self.patient}"
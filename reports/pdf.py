@@ -0,0 +1,132 @@
+"""
+PDF rendering of reports and medical histories.
+
+The renderers take plain dicts (built by ``report_pdf_data`` and
+``history_pdf_data``) and lay them out with reports.layout. They touch neither
+the database nor Django, so reports.batch can run them (through
+``render_job``) in worker processes.
+"""
+from io import BytesIO
+from .layout import FlowDocument
+
+# Bump whenever render_report_pdf's output changes, so cached PDFs are not reused
+PDF_TEMPLATE_VERSION = 2
+
+
+def _full_name(doctor_or_patient):
+    return doctor_or_patient.user_profile.user.get_full_name() if doctor_or_patient else ''
+
+
+def report_pdf_data(report):
+    """Everything render_report_pdf needs from a Report (with patient and doctor users loaded)"""
+    return {
+        'id': report.id,
+        'title': report.title,
+        'patient': _full_name(report.patient),
+        'doctor': _full_name(report.doctor),
+        'date': report.created_at.strftime('%Y-%m-%d'),
+        'type': report.get_report_type_display(),
+        'content': report.content,
+    }
+
+
+def record_entry(record):
+    """A MedicalRecord (with its doctor's user loaded) as a history entry"""
+    return {
+        'kind': 'Medical record',
+        'date': record.record_date.strftime('%Y-%m-%d'),
+        'doctor': _full_name(record.doctor),
+        'fields': [
+            ('Diagnosis', record.diagnosis),
+            ('Symptoms', record.symptoms),
+            ('Prescription', record.prescription),
+            ('Lab results', record.lab_results),
+            ('Notes', record.notes),
+        ],
+    }
+
+
+def note_entry(note):
+    """A ConsultationNote (with its doctor's user loaded) as a history entry"""
+    return {
+        'kind': 'Consultation note',
+        'date': note.created_at.strftime('%Y-%m-%d'),
+        'doctor': _full_name(note.doctor),
+        'fields': [
+            ('Chief complaint', note.chief_complaint),
+            ('History', note.history),
+            ('Examination', note.examination),
+            ('Diagnosis', note.diagnosis),
+            ('Treatment plan', note.treatment_plan),
+            ('Follow-up', note.follow_up),
+        ],
+    }
+
+
+def history_pdf_data(patient, entries):
+    """Everything render_history_pdf needs: the patient and their history entries, oldest first.
+
+    ``entries`` may be any iterable, e.g. a generator over the database, in
+    which case the history is rendered without ever being held in memory.
+    """
+    return {
+        'id': patient.id,
+        'patient': _full_name(patient),
+        'entries': entries,
+    }
+
+
+def _render(draw, data, fileobj):
+    """Run ``draw(document, data)`` into ``fileobj``, or into bytes that are returned"""
+    output = BytesIO() if fileobj is None else fileobj
+    document = FlowDocument(output, title=data['title'])
+    draw(document, data)
+    document.close()
+    return output.getvalue() if fileobj is None else None
+
+
+def _draw_report(document, data):
+    document.text("Healthcare System Report", font="Helvetica-Bold", size=16)
+    document.space(6)
+    document.text(f"Title: {data['title']}", font="Helvetica-Bold", size=12)
+    document.space(4)
+    document.text(f"Patient: {data['patient']}")
+    document.text(f"Doctor: Dr. {data['doctor']}")
+    document.text(f"Date: {data['date']}")
+    document.text(f"Type: {data['type']}")
+    document.space(12)
+    document.text("Report Content:", font="Helvetica-Bold", size=11, keep_with_next=1)
+    document.text(data['content'])
+
+
+def render_report_pdf(data, fileobj=None):
+    """The PDF of one report, its content wrapped and continued over as many pages as needed"""
+    return _render(_draw_report, data, fileobj)
+
+
+def _draw_history(document, data):
+    document.text("Medical History", font="Helvetica-Bold", size=16)
+    document.space(4)
+    document.text(f"Patient: {data['patient']}")
+    document.space(12)
+    for entry in data['entries']:
+        heading = f"{entry['date']} - {entry['kind']}"
+        if entry['doctor']:
+            heading += f" - Dr. {entry['doctor']}"
+        document.text(heading, font="Helvetica-Bold", size=11, keep_with_next=1)
+        for label, value in entry['fields']:
+            if value:
+                document.text(f"{label}:", font="Helvetica-Bold", keep_with_next=1)
+                document.text(value, indent=12)
+        document.space(10)
+
+
+def render_history_pdf(data, fileobj=None):
+    """The PDF of a patient's combined history, flowed across pages"""
+    return _render(_draw_history, dict(data, title=f"Medical history - {data['patient']}"), fileobj)
+
+
+def render_job(job):
+    """Run one (name, renderer, data) job of a batch; returns (name, pdf)"""
+    name, renderer, data = job
+    return name, renderer(data)
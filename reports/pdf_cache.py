@@ -0,0 +1,137 @@
+"""
+Content-addressed disk cache of rendered report PDFs.
+
+A report's PDF depends only on the data it is rendered from and on the
+layout, so it is stored under the SHA-256 of both (see ``cache_key``): an
+edited report or a new PDF_TEMPLATE_VERSION simply gets a new key, and stale
+entries age out. The key doubles as the download's ETag.
+
+Files live in REPORT_PDF_CACHE_DIR, written atomically. A hit refreshes the
+file's mtime. Each process keeps an estimate of the cache's size: the total
+found by its last scan plus what it has written since. Only when that goes
+over REPORT_PDF_CACHE_MAX_BYTES (or on the first write) is the directory
+scanned, and the least recently used files are then deleted down to
+EVICT_TO of the budget, so that scans stay rare.
+"""
+import hashlib
+import json
+import os
+import tempfile
+import threading
+from io import BytesIO
+from django.conf import settings
+from .pdf import PDF_TEMPLATE_VERSION, render_report_pdf
+
+# Fraction of the budget an over-budget cache is trimmed down to
+EVICT_TO = 0.9
+
+# Cache directory: estimated bytes in it
+_sizes = {}
+_sizes_lock = threading.Lock()
+
+
+def get_cache_dir():
+    return os.fspath(getattr(settings, 'REPORT_PDF_CACHE_DIR', os.path.join(settings.BASE_DIR, 'pdf_cache')))
+
+
+def get_max_bytes():
+    return getattr(settings, 'REPORT_PDF_CACHE_MAX_BYTES', 256 * 1024 * 1024)
+
+
+def cache_key(data):
+    """SHA-256 hex digest of the report data (as built by report_pdf_data) and the template version"""
+    payload = json.dumps([PDF_TEMPLATE_VERSION, data], sort_keys=True, default=str)
+    return hashlib.sha256(payload.encode()).hexdigest()
+
+
+def _path(key):
+    return os.path.join(get_cache_dir(), key[:2], f'{key}.pdf')
+
+
+def _store(path, pdf):
+    directory = os.path.dirname(path)
+    os.makedirs(directory, exist_ok=True)
+    fd, tmp = tempfile.mkstemp(dir=directory, suffix='.tmp')
+    try:
+        with os.fdopen(fd, 'wb') as f:
+            f.write(pdf)
+        os.replace(tmp, path)
+    except BaseException:
+        os.unlink(tmp)
+        raise
+
+
+def _entries():
+    """(mtime, size, path) of every cached PDF"""
+    entries = []
+    root = get_cache_dir()
+    if not os.path.isdir(root):
+        return entries
+    for shard in os.scandir(root):
+        if not shard.is_dir():
+            continue
+        for entry in os.scandir(shard.path):
+            if not entry.name.endswith('.pdf'):
+                continue
+            try:
+                stat = entry.stat()
+            except FileNotFoundError:
+                continue  # evicted by another process
+            entries.append((stat.st_mtime, stat.st_size, entry.path))
+    return entries
+
+
+def evict(max_bytes=None, target=None):
+    """If the cache is over ``max_bytes``, delete least recently used PDFs until it fits in ``target``
+    (default ``max_bytes``); returns the number deleted"""
+    max_bytes = get_max_bytes() if max_bytes is None else max_bytes
+    target = max_bytes if target is None else target
+    entries = _entries()
+    total = sum(size for _, size, _ in entries)
+    deleted = 0
+    if total > max_bytes:
+        for _, size, path in sorted(entries):
+            if total <= target:
+                break
+            try:
+                os.unlink(path)
+                deleted += 1
+            except FileNotFoundError:
+                pass
+            total -= size
+    with _sizes_lock:
+        _sizes[get_cache_dir()] = total
+    return deleted
+
+
+def _written(size):
+    """Count ``size`` new bytes towards the cache's estimated size, evicting once it is over budget"""
+    root = get_cache_dir()
+    max_bytes = get_max_bytes()
+    with _sizes_lock:
+        estimate = _sizes.get(root)
+        if estimate is not None:
+            estimate = _sizes[root] = estimate + size
+    if estimate is None or estimate > max_bytes:
+        evict(max_bytes, target=int(max_bytes * EVICT_TO))
+
+
+def open_report_pdf(data, key=None):
+    """A file object of the PDF for ``data`` (whose cache_key is ``key``), rendering and caching it on a miss"""
+    path = _path(key or cache_key(data))
+    try:
+        pdf_file = open(path, 'rb')
+    except FileNotFoundError:
+        pass
+    else:
+        # Mark as recently used for eviction
+        try:
+            os.utime(path)
+        except FileNotFoundError:
+            pass  # evicted meanwhile; the open file is still readable
+        return pdf_file
+
+    pdf = render_report_pdf(data)
+    _store(path, pdf)
+    _written(len(pdf))
+    return BytesIO(pdf)
@@ -1,3 +1,394 @@
-from django.test import TestCase
+import asyncio
+import csv
+import os
+import re
+import shutil
+import tempfile
+import zipfile
+from datetime import datetime, timedelta
+from io import BytesIO, StringIO
+from asgiref.sync import sync_to_async
+from django.core.management import call_command, CommandError
+from reportlab.pdfbase.pdfmetrics import stringWidth
+from django.test import TestCase, override_settings
+from django.contrib.auth.models import User
+from django.urls import reverse
+from django.utils import timezone
+from accounts.models import UserProfile, DoctorProfile, PatientProfile
+from appointments.models import Appointment
+from consultation.models import ConsultationNote
+from . import batch, pdf_cache
+from .models import MedicalRecord, Report
+from .history import history_entries
+from .layout import wrap_text
+from .pdf import render_report_pdf, report_pdf_data
 
-# Create your tests here.
+
+class BulkExportTests(TestCase):
+    """Test cases for the streaming bulk CSV exports"""
+
+    def setUp(self):
+        """Set up two doctors and two patients with records and reports on different days"""
+        self.doctors = []
+        for i, name in enumerate(['House', 'Wilson']):
+            user = User.objects.create_user(username=f'exportdoctor{i}', first_name='Greg', last_name=name)
+            self.doctors.append(DoctorProfile.objects.create(
+                user_profile=UserProfile.objects.create(user=user, user_type='doctor'),
+                specialization='Cardiology',
+                qualification='MD',
+                license_number=f'EXPORT{i}'
+            ))
+        self.patients = []
+        for i in range(2):
+            user = User.objects.create_user(username=f'exportpatient{i}', first_name='Pat', last_name=str(i))
+            self.patients.append(PatientProfile.objects.create(
+                user_profile=UserProfile.objects.create(user=user, user_type='patient')
+            ))
+        self.today = timezone.localdate()
+        for i in range(6):
+            record = MedicalRecord.objects.create(
+                patient=self.patients[i % 2], doctor=self.doctors[i // 4], diagnosis=f'Diagnosis {i}',
+                symptoms='Cough, "dry"', prescription='Rest', notes='Line one\nline two'
+            )
+            # auto_now_add ignores explicit values
+            day = self.today - timedelta(days=10 - i)
+            MedicalRecord.objects.filter(pk=record.pk).update(record_date=day)
+            report = Report.objects.create(
+                patient=self.patients[i % 2], doctor=self.doctors[i // 4], medical_record=record,
+                report_type='lab', title=f'Report {i}', content='Normal'
+            )
+            Report.objects.filter(pk=report.pk).update(
+                created_at=timezone.make_aware(datetime.combine(day, datetime.min.time())) + timedelta(hours=12)
+            )
+        self.records_url = reverse('reports:export_medical_records_csv')
+        self.reports_url = reverse('reports:export_reports_csv')
+
+    def export(self, url, params=None):
+        response = self.client.get(url, params or {})
+        self.assertEqual(response.status_code, 200)
+        self.assertTrue(response.streaming)
+        return list(csv.reader(StringIO(b''.join(response.streaming_content).decode())))
+
+    def test_doctor_exports_own_records(self):
+        """Test that a doctor's export holds exactly their records, oldest first, with escaping intact"""
+        self.client.force_login(self.doctors[0].user_profile.user)
+        rows = self.export(self.records_url)
+        self.assertEqual(rows[0][:4], ['ID', 'Date', 'Patient', 'Doctor'])
+        self.assertEqual([row[5] for row in rows[1:]], [f'Diagnosis {i}' for i in range(4)])
+        self.assertEqual(rows[1][2:4], ['Pat 0', 'Greg House'])
+        self.assertEqual(rows[1][6], 'Cough, "dry"')
+        self.assertEqual(rows[1][9], 'Line one\nline two')
+
+        rows = self.export(self.records_url, {'patient': self.patients[1].id})
+        self.assertEqual([row[5] for row in rows[1:]], ['Diagnosis 1', 'Diagnosis 3'])
+
+    def test_date_range(self):
+        """Test that start and end bound the export, inclusively"""
+        self.client.force_login(self.doctors[0].user_profile.user)
+        params = {
+            'start': (self.today - timedelta(days=9)).isoformat(),
+            'end': (self.today - timedelta(days=8)).isoformat(),
+        }
+        self.assertEqual([row[5] for row in self.export(self.records_url, params)[1:]], ['Diagnosis 1', 'Diagnosis 2'])
+        rows = self.export(self.reports_url, params)[1:]
+        self.assertEqual([row[3] for row in rows], ['Report 1', 'Report 2'])
+        self.assertEqual(rows[0][2], 'Lab Report')
+
+    def test_patient_exports_own_history(self):
+        """Test that patients only ever export their own records, whatever the filters say"""
+        self.client.force_login(self.patients[0].user_profile.user)
+        rows = self.export(self.reports_url, {'patient': self.patients[1].id})
+        self.assertEqual(rows[1:], [])
+        rows = self.export(self.records_url)
+        self.assertEqual([row[5] for row in rows[1:]], ['Diagnosis 0', 'Diagnosis 2', 'Diagnosis 4'])
+
+    def test_staff_exports_everything(self):
+        """Test that staff without a profile can export across doctors, and other users without one cannot"""
+        staff = User.objects.create_user(username='operations', is_staff=True)
+        self.client.force_login(staff)
+        self.assertEqual(len(self.export(self.records_url)), 7)
+        rows = self.export(self.records_url, {'doctor': self.doctors[1].id})
+        self.assertEqual([row[5] for row in rows[1:]], ['Diagnosis 4', 'Diagnosis 5'])
+
+        self.client.force_login(User.objects.create_user(username='noprofile'))
+        self.assertRedirects(self.client.get(self.records_url), reverse('dashboard:home'), fetch_redirect_response=False)
+
+    def test_invalid_parameters(self):
+        """Test that malformed filters are rejected"""
+        self.client.force_login(self.doctors[0].user_profile.user)
+        for params in ({'patient': 'x'}, {'start': '2024-13-01'}, {'end': 'yesterday'}):
+            self.assertEqual(self.client.get(self.reports_url, params).status_code, 400)
+
+    async def test_async_export_matches_sync(self):
+        """Test that the async exports stream the same CSV under ASGI"""
+        user = self.doctors[0].user_profile.user
+        await sync_to_async(self.async_client.force_login)(user)
+        await sync_to_async(self.client.force_login)(user)
+        for url in (self.records_url, self.reports_url):
+            expected = await sync_to_async(self.export)(url)
+            with override_settings(ROOT_URLCONF='healthcare_system.asgi_urls'):
+                response = await self.async_client.get(url)
+                self.assertTrue(asyncio.iscoroutinefunction(response.resolver_match.func), url)
+            self.assertEqual(response.status_code, 200)
+            content = b''.join([chunk async for chunk in response.streaming_content])
+            self.assertEqual(list(csv.reader(StringIO(content.decode()))), expected)
+
+
+class BatchPdfTests(TestCase):
+    """Test cases for batch PDF generation"""
+
+    def setUp(self):
+        """Set up a doctor, two patients with records and reports, and an empty media directory"""
+        self.media_root = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, self.media_root)
+        settings_override = override_settings(MEDIA_ROOT=self.media_root)
+        settings_override.enable()
+        self.addCleanup(settings_override.disable)
+
+        user = User.objects.create_user(username='pdfdoctor', first_name='Greg', last_name='House')
+        self.doctor = DoctorProfile.objects.create(
+            user_profile=UserProfile.objects.create(user=user, user_type='doctor'),
+            specialization='Cardiology',
+            qualification='MD',
+            license_number='PDF123'
+        )
+        self.patients = []
+        self.reports = []
+        for i in range(2):
+            patient_user = User.objects.create_user(username=f'pdfpatient{i}', first_name='Pat', last_name=str(i))
+            patient = PatientProfile.objects.create(
+                user_profile=UserProfile.objects.create(user=patient_user, user_type='patient')
+            )
+            self.patients.append(patient)
+            for j in range(3):
+                MedicalRecord.objects.create(
+                    patient=patient, doctor=self.doctor, diagnosis=f'Diagnosis {j}', symptoms='Cough\nFever',
+                    prescription='Rest'
+                )
+                self.reports.append(Report.objects.create(
+                    patient=patient, doctor=self.doctor, report_type='consultation', title=f'Summary {j}',
+                    content='Line one\nLine two'
+                ))
+
+    def test_command_renders_month_with_histories_and_zip(self):
+        """Test that a month's reports and their patients' histories are saved, linked and zipped"""
+        zip_path = os.path.join(self.media_root, 'packets.zip')
+        out = StringIO()
+        call_command('render_report_pdfs', '--month', timezone.localdate().strftime('%Y-%m'), '--history',
+                     '--workers', '1', '--zip', zip_path, stdout=out)
+        self.assertIn('Rendered 8 PDFs', out.getvalue())
+
+        for report in Report.objects.all():
+            self.assertEqual(report.file_path.name, batch.report_file_name(report.id))
+            with report.file_path.open('rb') as pdf:
+                self.assertEqual(pdf.read(5), b'%PDF-')
+        with zipfile.ZipFile(zip_path) as archive:
+            names = archive.namelist()
+            self.assertEqual(len(names), 8)
+            self.assertIn(f'history_patient_{self.patients[0].id}.pdf', names)
+            self.assertTrue(archive.read(names[0]).startswith(b'%PDF-'))
+
+        # A second run overwrites the files instead of adding new ones
+        call_command('render_report_pdfs', '--patient', str(self.patients[0].id), '--workers', '1', stdout=out)
+        self.assertEqual(len(os.listdir(os.path.join(self.media_root, batch.REPORTS_DIR))), 8)
+
+    def test_process_pool_matches_inline_rendering(self):
+        """Test that rendering across worker processes gives the same PDFs in the same order"""
+        reports = Report.objects.order_by('pk')
+        inline, pooled = BytesIO(), BytesIO()
+        names = batch.render_batch(reports, [self.patients[1].id], workers=1, zip_file=inline)
+        self.assertEqual(batch.render_batch(reports, [self.patients[1].id], workers=2, zip_file=pooled), names)
+        with zipfile.ZipFile(inline) as first, zipfile.ZipFile(pooled) as second:
+            self.assertEqual(first.namelist(), second.namelist())
+            self.assertEqual(len(first.namelist()), 7)
+
+    def test_selection_is_required(self):
+        """Test that the command refuses to run without a selection or with bad options"""
+        for args in ([], ['--month', '2024-13'], ['--month', '2024-01', '--workers', '0']):
+            with self.assertRaises(CommandError):
+                call_command('render_report_pdfs', *args, stdout=StringIO())
+
+
+class PdfCacheTests(TestCase):
+    """Test cases for the content-addressed report PDF cache"""
+
+    def setUp(self):
+        """Set up a report, a logged-in doctor and an empty cache directory"""
+        self.cache_dir = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, self.cache_dir)
+        settings_override = override_settings(REPORT_PDF_CACHE_DIR=self.cache_dir)
+        settings_override.enable()
+        self.addCleanup(settings_override.disable)
+
+        user = User.objects.create_user(username='cachedoctor', first_name='Greg', last_name='House')
+        doctor = DoctorProfile.objects.create(
+            user_profile=UserProfile.objects.create(user=user, user_type='doctor'),
+            specialization='Cardiology',
+            qualification='MD',
+            license_number='CACHE123'
+        )
+        patient_user = User.objects.create_user(username='cachepatient', first_name='Pat', last_name='Ient')
+        patient = PatientProfile.objects.create(
+            user_profile=UserProfile.objects.create(user=patient_user, user_type='patient')
+        )
+        self.report = Report.objects.create(
+            patient=patient, doctor=doctor, report_type='lab', title='Blood work', content='All normal'
+        )
+        self.url = reverse('reports:export_pdf', args=[self.report.id])
+        self.client.force_login(user)
+
+    def download(self, **headers):
+        response = self.client.get(self.url, **headers)
+        content = b''.join(response.streaming_content) if response.streaming else response.content
+        return response, content
+
+    def cached_files(self):
+        return [os.path.join(root, name) for root, _, names in os.walk(self.cache_dir) for name in names]
+
+    def test_second_download_is_served_from_cache(self):
+        """Test that a rendered PDF is stored once and read back on later downloads"""
+        response, content = self.download()
+        self.assertEqual(response['Content-Type'], 'application/pdf')
+        self.assertIn('attachment; filename="report_', response['Content-Disposition'])
+        self.assertTrue(content.startswith(b'%PDF-'))
+        [path] = self.cached_files()
+        with open(path, 'rb') as f:
+            self.assertEqual(f.read(), content)
+
+        with open(path, 'wb') as f:
+            f.write(b'%PDF-cached')
+        response, content = self.download()
+        self.assertEqual(content, b'%PDF-cached')
+        self.assertEqual(response['Content-Length'], str(len(b'%PDF-cached')))
+
+    def test_etag_revalidation(self):
+        """Test that a matching If-None-Match gets a 304 and an edited report a new ETag"""
+        response, _ = self.download()
+        etag = response['ETag']
+        self.assertIn('private', response['Cache-Control'])
+        response, content = self.download(HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, 304)
+        self.assertEqual(content, b'')
+
+        Report.objects.filter(pk=self.report.pk).update(content='Revised')
+        response, _ = self.download(HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, 200)
+        self.assertNotEqual(response['ETag'], etag)
+        self.assertEqual(len(self.cached_files()), 2)
+
+    def test_lru_eviction(self):
+        """Test that the least recently used PDFs are evicted first once over budget"""
+        keys = []
+        for i in range(3):
+            self.report.title = f'Report {i}'
+            data = report_pdf_data(self.report)
+            keys.append(pdf_cache.cache_key(data))
+            pdf_cache.open_report_pdf(data).close()
+        paths = {key: pdf_cache._path(key) for key in keys}
+        for age, key in enumerate(reversed(keys)):
+            os.utime(paths[key], (1000000 - age, 1000000 - age))
+        # A hit makes the oldest entry the most recently used
+        self.report.title = 'Report 0'
+        pdf_cache.open_report_pdf(report_pdf_data(self.report)).close()
+
+        size = os.path.getsize(paths[keys[0]])
+        self.assertEqual(pdf_cache.evict(max_bytes=2 * size + size // 2), 1)
+        self.assertFalse(os.path.exists(paths[keys[1]]))
+        self.assertTrue(os.path.exists(paths[keys[0]]))
+        self.assertTrue(os.path.exists(paths[keys[2]]))
+
+    def test_misses_scan_the_cache_only_when_over_budget(self):
+        """Test that writes are counted against the budget and only overflowing ones scan and trim the cache"""
+        scans = []
+        entries = pdf_cache._entries
+
+        def counted_entries():
+            scans.append(1)
+            return entries()
+
+        pdf_cache._entries = counted_entries
+        self.addCleanup(setattr, pdf_cache, '_entries', entries)
+        self.report.title = 'Report 0'
+        size = len(pdf_cache.open_report_pdf(report_pdf_data(self.report)).read())
+        with override_settings(REPORT_PDF_CACHE_MAX_BYTES=10 * size + size // 2):
+            for i in range(1, 12):
+                self.report.title = f'Report {i}'
+                pdf_cache.open_report_pdf(report_pdf_data(self.report)).close()
+        # The first write and the eleventh, which trimmed the cache to nine files
+        self.assertEqual(len(scans), 2)
+        self.assertEqual(len(self.cached_files()), 10)
+
+
+def page_count(pdf):
+    return len(re.findall(rb'/Type /Page\b', pdf))
+
+
+class PdfLayoutTests(TestCase):
+    """Test cases for the paginated PDF layout"""
+
+    def setUp(self):
+        """Set up a patient with alternating medical records and consultation notes"""
+        doctor_user = User.objects.create_user(username='layoutdoctor', first_name='Greg', last_name='House')
+        self.doctor = DoctorProfile.objects.create(
+            user_profile=UserProfile.objects.create(user=doctor_user, user_type='doctor'),
+            specialization='Cardiology',
+            qualification='MD',
+            license_number='LAYOUT123'
+        )
+        self.patient_user = User.objects.create_user(username='layoutpatient', first_name='Pat', last_name='Ient')
+        self.patient = PatientProfile.objects.create(
+            user_profile=UserProfile.objects.create(user=self.patient_user, user_type='patient')
+        )
+        appointment = Appointment.objects.create(
+            patient=self.patient, doctor=self.doctor, appointment_date=timezone.localdate(),
+            appointment_time=datetime.min.time(), reason='Checkup'
+        )
+        for i in range(30):
+            MedicalRecord.objects.create(
+                patient=self.patient, doctor=self.doctor, diagnosis=f'Diagnosis {i}', symptoms='Cough ' * 60,
+                prescription='Rest'
+            )
+            ConsultationNote.objects.create(
+                appointment=appointment, doctor=self.doctor, patient=self.patient, chief_complaint=f'Complaint {i}',
+                diagnosis='Cold', treatment_plan='Fluids\nRest'
+            )
+        self.url = reverse('reports:export_history_pdf', args=[self.patient.id])
+
+    def test_wrap_text_keeps_every_word_within_width(self):
+        """Test that wrapping never exceeds the width, keeps line breaks and splits overlong words"""
+        text = 'lorem ipsum dolor ' * 50 + '\n\nsecond paragraph ' + 'x' * 300
+        lines = list(wrap_text(text, 'Helvetica', 10, 200))
+        self.assertTrue(all(stringWidth(line, 'Helvetica', 10) <= 200 for line in lines))
+        self.assertIn('', lines)
+        self.assertEqual(''.join(''.join(lines).split()), ''.join(text.split()))
+
+    def test_long_report_flows_onto_more_pages(self):
+        """Test that long report content continues on new pages instead of running off the first"""
+        data = {
+            'id': 1, 'title': 'Long', 'patient': 'Pat Ient', 'doctor': 'Greg House', 'date': '2024-01-01',
+            'type': 'Lab Report', 'content': '\n'.join(f'Line {i} ' + 'word ' * 40 for i in range(200)),
+        }
+        self.assertEqual(page_count(render_report_pdf(dict(data, content='Short'))), 1)
+        self.assertGreater(page_count(render_report_pdf(data)), 5)
+
+    def test_history_pdf_combines_records_and_notes(self):
+        """Test that a patient downloads their records and notes as one multi-page PDF"""
+        self.client.force_login(self.patient_user)
+        response = self.client.get(self.url)
+        self.assertEqual(response['Content-Type'], 'application/pdf')
+        pdf = b''.join(response.streaming_content)
+        self.assertTrue(pdf.startswith(b'%PDF-'))
+        self.assertGreater(page_count(pdf), 3)
+
+        entries = list(history_entries(self.patient.id, chunk_size=7))
+        self.assertEqual(len(entries), 60)
+        self.assertEqual([entry['kind'] for entry in entries[:2]], ['Medical record', 'Consultation note'])
+
+    def test_history_pdf_permissions(self):
+        """Test that doctors can export any history and patients only their own"""
+        self.client.force_login(self.doctor.user_profile.user)
+        self.assertEqual(self.client.get(self.url).status_code, 200)
+        other = User.objects.create_user(username='layoutother')
+        PatientProfile.objects.create(user_profile=UserProfile.objects.create(user=other, user_type='patient'))
+        self.client.force_login(other)
+        self.assertRedirects(self.client.get(self.url), reverse('dashboard:home'), fetch_redirect_response=False)
@@ -7,9 +7,19 @@ urlpatterns = [
     path('medical-records/', views.medical_records_list, name='medical_records_list'),
     path('medical-records/<int:pk>/', views.medical_record_detail, name='medical_record_detail'),
     path('medical-records/create/', views.create_medical_record, name='create_medical_record'),
+    path('medical-records/export-csv/', views.export_medical_records_csv, name='export_medical_records_csv'),
+    path('medical-records/history/<int:patient_id>/pdf/', views.export_history_pdf, name='export_history_pdf'),
     path('', views.reports_list, name='reports_list'),
     path('generate/', views.generate_report, name='generate_report'),
+    path('export-csv/', views.export_reports_csv, name='export_reports_csv'),
     path('<int:pk>/', views.report_detail, name='report_detail'),
     path('<int:pk>/export-pdf/', views.export_report_pdf, name='export_pdf'),
     path('<int:pk>/export-csv/', views.export_report_csv, name='export_csv'),
 ]
+
+# Async variants, served instead of the views above under ASGI (see healthcare_system.asgi_urls)
+async_urlpatterns = [
+    path('', views.reports_list_async, name='reports_list'),
+    path('medical-records/export-csv/', views.export_medical_records_csv_async, name='export_medical_records_csv'),
+    path('export-csv/', views.export_reports_csv_async, name='export_reports_csv'),
+]
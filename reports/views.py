@@ -1,32 +1,37 @@
 from django.shortcuts import render, redirect, get_object_or_404
 from django.contrib.auth.decorators import login_required
 from django.contrib import messages
-from django.http import HttpResponse
-from accounts.models import UserProfile, DoctorProfile, PatientProfile
+from django.http import FileResponse, HttpResponse, HttpResponseBadRequest, StreamingHttpResponse
+from django.utils import timezone
+from django.utils.cache import get_conditional_response, patch_cache_control
+from accounts.decorators import async_login_required
+from accounts.models import PatientProfile
+from .exports import (
+    RECORD_HEADER, REPORT_HEADER, astream_csv, format_record, medical_record_rows, parse_filters, report_formatter,
+    report_rows, stream_csv,
+)
+from .history import history_entries
 from .models import MedicalRecord, Report
-from reportlab.lib.pagesizes import letter
-from reportlab.pdfgen import canvas
-from reportlab.lib.units import inch
+from .pdf import history_pdf_data, render_history_pdf, report_pdf_data
+from .pdf_cache import cache_key, open_report_pdf
 import csv
-from io import BytesIO
+import tempfile
 
 # Create your views here.
 
 @login_required
 def medical_records_list(request):
     """List medical records"""
-    user_profile = UserProfile.objects.get(user=request.user)
+    actor = request.actor
     
-    if user_profile.user_type == 'doctor':
-        doctor_profile = DoctorProfile.objects.get(user_profile=user_profile)
-        medical_records = MedicalRecord.objects.filter(doctor=doctor_profile)
+    if actor.is_doctor:
+        medical_records = MedicalRecord.objects.filter(doctor=actor.doctor_profile).select_related('patient__user_profile__user')
     else:
-        patient_profile = PatientProfile.objects.get(user_profile=user_profile)
-        medical_records = MedicalRecord.objects.filter(patient=patient_profile)
+        medical_records = MedicalRecord.objects.filter(patient=actor.patient_profile).select_related('doctor__user_profile__user')
     
     context = {
         'medical_records': medical_records,
-        'user_profile': user_profile,
+        'user_profile': actor.user_profile,
     }
     return render(request, 'reports/medical_records_list.html', context)
 
@@ -35,21 +40,16 @@ def medical_records_list(request):
 def medical_record_detail(request, pk):
     """View medical record details"""
     medical_record = get_object_or_404(MedicalRecord, pk=pk)
-    user_profile = UserProfile.objects.get(user=request.user)
+    actor = request.actor
     
-    # Check permissions
-    if user_profile.user_type == 'doctor':
-        doctor_profile = DoctorProfile.objects.get(user_profile=user_profile)
-        # Doctors can view records they created
-    else:
-        patient_profile = PatientProfile.objects.get(user_profile=user_profile)
-        if medical_record.patient != patient_profile:
-            messages.error(request, 'You do not have permission to view this record.')
-            return redirect('dashboard:home')
+    # Check permissions: doctors can view any record, patients only their own
+    if not actor.is_doctor and medical_record.patient_id != actor.patient_profile.id:
+        messages.error(request, 'You do not have permission to view this record.')
+        return redirect('dashboard:home')
     
     context = {
         'medical_record': medical_record,
-        'user_profile': user_profile,
+        'user_profile': actor.user_profile,
     }
     return render(request, 'reports/medical_record_detail.html', context)
 
@@ -57,13 +57,13 @@ def medical_record_detail(request, pk):
 @login_required
 def create_medical_record(request):
     """Create a new medical record (for doctors)"""
-    user_profile = UserProfile.objects.get(user=request.user)
+    actor = request.actor
     
-    if user_profile.user_type != 'doctor':
+    if not actor.is_doctor:
         messages.error(request, 'Only doctors can create medical records.')
         return redirect('dashboard:home')
     
-    doctor_profile = DoctorProfile.objects.get(user_profile=user_profile)
+    doctor_profile = actor.doctor_profile
     
     if request.method == 'POST':
         patient_id = request.POST.get('patient')
@@ -89,44 +89,54 @@ def create_medical_record(request):
         return redirect('reports:medical_record_detail', pk=medical_record.id)
     
     # Get list of patients
-    patients = PatientProfile.objects.all()
+    patients = PatientProfile.objects.select_related('user_profile__user')
     
     context = {
         'patients': patients,
-        'user_profile': user_profile,
+        'user_profile': actor.user_profile,
     }
     return render(request, 'reports/create_medical_record.html', context)
 
 
-@login_required
-def reports_list(request):
-    """List all reports"""
-    user_profile = UserProfile.objects.get(user=request.user)
-    
-    if user_profile.user_type == 'doctor':
-        doctor_profile = DoctorProfile.objects.get(user_profile=user_profile)
-        reports = Report.objects.filter(doctor=doctor_profile)
+def _reports(actor):
+    if actor.is_doctor:
+        reports = Report.objects.filter(doctor=actor.doctor_profile)
     else:
-        patient_profile = PatientProfile.objects.get(user_profile=user_profile)
-        reports = Report.objects.filter(patient=patient_profile)
-    
+        reports = Report.objects.filter(patient=actor.patient_profile)
+    return reports.select_related('patient__user_profile__user', 'doctor__user_profile__user')
+
+
+def _render_reports_list(request, reports):
     context = {
         'reports': reports,
-        'user_profile': user_profile,
+        'user_profile': request.actor.user_profile,
     }
     return render(request, 'reports/reports_list.html', context)
 
 
+@login_required
+def reports_list(request):
+    """List all reports"""
+    return _render_reports_list(request, _reports(request.actor))
+
+
+@async_login_required
+async def reports_list_async(request):
+    """Async variant of reports_list, served under ASGI"""
+    reports = [report async for report in _reports(request.actor)]
+    return _render_reports_list(request, reports)
+
+
 @login_required
 def generate_report(request):
     """Generate a new report (for doctors)"""
-    user_profile = UserProfile.objects.get(user=request.user)
+    actor = request.actor
     
-    if user_profile.user_type != 'doctor':
+    if not actor.is_doctor:
         messages.error(request, 'Only doctors can generate reports.')
         return redirect('dashboard:home')
     
-    doctor_profile = DoctorProfile.objects.get(user_profile=user_profile)
+    doctor_profile = actor.doctor_profile
     
     if request.method == 'POST':
         patient_id = request.POST.get('patient')
@@ -148,11 +158,11 @@ def generate_report(request):
         return redirect('reports:report_detail', pk=report.id)
     
     # Get list of patients
-    patients = PatientProfile.objects.all()
+    patients = PatientProfile.objects.select_related('user_profile__user')
     
     context = {
         'patients': patients,
-        'user_profile': user_profile,
+        'user_profile': actor.user_profile,
     }
     return render(request, 'reports/generate_report.html', context)
 
@@ -161,83 +171,77 @@ def generate_report(request):
 def report_detail(request, pk):
     """View report details"""
     report = get_object_or_404(Report, pk=pk)
-    user_profile = UserProfile.objects.get(user=request.user)
+    actor = request.actor
     
     # Check permissions
-    if user_profile.user_type == 'patient':
-        patient_profile = PatientProfile.objects.get(user_profile=user_profile)
-        if report.patient != patient_profile:
+    if actor.is_patient:
+        if report.patient_id != actor.patient_profile.id:
             messages.error(request, 'You do not have permission to view this report.')
             return redirect('dashboard:home')
     
     context = {
         'report': report,
-        'user_profile': user_profile,
+        'user_profile': actor.user_profile,
     }
     return render(request, 'reports/report_detail.html', context)
 
 
 @login_required
 def export_report_pdf(request, pk):
-    """Export report as PDF"""
-    report = get_object_or_404(Report, pk=pk)
-    user_profile = UserProfile.objects.get(user=request.user)
+    """Export report as PDF, served from the PDF cache and revalidated with its ETag"""
+    report = get_object_or_404(
+        Report.objects.select_related('patient__user_profile__user', 'doctor__user_profile__user'), pk=pk
+    )
+    actor = request.actor
     
     # Check permissions
-    if user_profile.user_type == 'patient':
-        patient_profile = PatientProfile.objects.get(user_profile=user_profile)
-        if report.patient != patient_profile:
+    if actor.is_patient:
+        if report.patient_id != actor.patient_profile.id:
             messages.error(request, 'You do not have permission to access this report.')
             return redirect('dashboard:home')
     
-    # Create PDF
-    buffer = BytesIO()
-    p = canvas.Canvas(buffer, pagesize=letter)
-    
-    # Add content to PDF
-    p.setFont("Helvetica-Bold", 16)
-    p.drawString(1 * inch, 10 * inch, "Healthcare System Report")
-    
-    p.setFont("Helvetica-Bold", 12)
-    p.drawString(1 * inch, 9.5 * inch, f"Title: {report.title}")
-    
-    p.setFont("Helvetica", 10)
-    p.drawString(1 * inch, 9.2 * inch, f"Patient: {report.patient.user_profile.user.get_full_name()}")
-    p.drawString(1 * inch, 9 * inch, f"Doctor: Dr. {report.doctor.user_profile.user.get_full_name()}")
-    p.drawString(1 * inch, 8.8 * inch, f"Date: {report.created_at.strftime('%Y-%m-%d')}")
-    p.drawString(1 * inch, 8.6 * inch, f"Type: {report.get_report_type_display()}")
-    
-    # Add report content
-    p.setFont("Helvetica-Bold", 11)
-    p.drawString(1 * inch, 8.2 * inch, "Report Content:")
-    
-    p.setFont("Helvetica", 10)
-    # Split content into lines
-    text = p.beginText(1 * inch, 7.9 * inch)
-    for line in report.content.split('\n'):
-        text.textLine(line[:90])  # Limit line length
-    p.drawText(text)
-    
-    p.showPage()
-    p.save()
+    data = report_pdf_data(report)
+    key = cache_key(data)
+    not_modified = get_conditional_response(request, etag=f'"{key}"')
+    if not_modified is not None:
+        return not_modified
+    
+    response = FileResponse(open_report_pdf(data, key), as_attachment=True, filename=f'report_{report.id}.pdf',
+                            content_type='application/pdf')
+    response['ETag'] = f'"{key}"'
+    # Patient data: browsers may keep it, but must check back before reusing it
+    patch_cache_control(response, private=True, no_cache=True)
+    return response
+
+
+@login_required
+def export_history_pdf(request, patient_id):
+    """Export a patient's medical records and consultation notes as one PDF"""
+    patient = get_object_or_404(PatientProfile.objects.select_related('user_profile__user'), pk=patient_id)
+    actor = request.actor
     
-    buffer.seek(0)
-    response = HttpResponse(buffer, content_type='application/pdf')
-    response['Content-Disposition'] = f'attachment; filename="report_{report.id}.pdf"'
+    # Check permissions
+    if not actor.is_doctor and not (actor.is_patient and patient.id == actor.patient_profile.id):
+        messages.error(request, 'You do not have permission to access this history.')
+        return redirect('dashboard:home')
     
-    return response
+    # Rendered straight from the database cursors into a temporary file, so memory stays flat however long it is
+    pdf_file = tempfile.TemporaryFile()
+    render_history_pdf(history_pdf_data(patient, history_entries(patient.id)), pdf_file)
+    pdf_file.seek(0)
+    return FileResponse(pdf_file, as_attachment=True, filename=f'medical_history_{patient.id}.pdf',
+                        content_type='application/pdf')
 
 
 @login_required
 def export_report_csv(request, pk):
     """Export report as CSV"""
     report = get_object_or_404(Report, pk=pk)
-    user_profile = UserProfile.objects.get(user=request.user)
+    actor = request.actor
     
     # Check permissions
-    if user_profile.user_type == 'patient':
-        patient_profile = PatientProfile.objects.get(user_profile=user_profile)
-        if report.patient != patient_profile:
+    if actor.is_patient:
+        if report.patient_id != actor.patient_profile.id:
             messages.error(request, 'You do not have permission to access this report.')
             return redirect('dashboard:home')
     
@@ -256,3 +260,59 @@ def export_report_csv(request, pk):
     
     return response
 
+
+def _export_filters(request):
+    """(filters, None) for a permitted bulk export, or (None, response) to return instead"""
+    if not request.actor.has_profile and not request.user.is_staff:
+        messages.error(request, 'You do not have permission to export records.')
+        return None, redirect('dashboard:home')
+    try:
+        return parse_filters(request.GET), None
+    except ValueError:
+        return None, HttpResponseBadRequest('Invalid export parameters.')
+
+
+def _csv_response(content, name):
+    response = StreamingHttpResponse(content, content_type='text/csv')
+    response['Content-Disposition'] = f'attachment; filename="{name}_{timezone.localdate():%Y-%m-%d}.csv"'
+    return response
+
+
+@login_required
+def export_medical_records_csv(request):
+    """Stream the user's medical records as CSV, optionally filtered by patient, doctor and date range"""
+    filters, error = _export_filters(request)
+    if error:
+        return error
+    rows = medical_record_rows(request.actor, filters)
+    return _csv_response(stream_csv(RECORD_HEADER, rows, format_record), 'medical_records')
+
+
+@async_login_required
+async def export_medical_records_csv_async(request):
+    """Async variant of export_medical_records_csv, served under ASGI"""
+    filters, error = _export_filters(request)
+    if error:
+        return error
+    rows = medical_record_rows(request.actor, filters)
+    return _csv_response(astream_csv(RECORD_HEADER, rows, format_record), 'medical_records')
+
+
+@login_required
+def export_reports_csv(request):
+    """Stream the user's reports as CSV, optionally filtered by patient, doctor and date range"""
+    filters, error = _export_filters(request)
+    if error:
+        return error
+    rows = report_rows(request.actor, filters)
+    return _csv_response(stream_csv(REPORT_HEADER, rows, report_formatter()), 'reports')
+
+
+@async_login_required
+async def export_reports_csv_async(request):
+    """Async variant of export_reports_csv, served under ASGI"""
+    filters, error = _export_filters(request)
+    if error:
+        return error
+    rows = report_rows(request.actor, filters)
+    return _csv_response(astream_csv(REPORT_HEADER, rows, report_formatter()), 'reports')
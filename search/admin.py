@@ -0,0 +1,10 @@
+from django.contrib import admin
+from .models import SearchDocument
+
+# Register your models here.
+
+@admin.register(SearchDocument)
+class SearchDocumentAdmin(admin.ModelAdmin):
+    list_display = ['kind', 'object_id', 'patient', 'doctor', 'created_at']
+    list_filter = ['kind', 'created_at']
+    raw_id_fields = ['patient', 'doctor']
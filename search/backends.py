@@ -0,0 +1,176 @@
+"""
+Search backends: matching and ranking of SearchDocuments.
+
+``FTS5Backend`` queries the SQLite FTS5 table that migration 0002 creates
+over SearchDocument (kept in sync by triggers) and ranks with BM25.
+``InvertedIndexBackend`` works on any database, using the SearchTerm table
+it maintains itself and ranking with TF-IDF in Python.
+
+``get_backend()`` returns the backend named by the SEARCH_BACKEND setting,
+or by default FTS5 where it is available. After switching to the inverted
+index, run ``rebuild_search_index`` to fill it.
+"""
+import heapq
+import math
+import re
+import unicodedata
+from collections import defaultdict
+from django.conf import settings
+from django.db import connection
+from django.db.models import Count, Q
+from django.utils.module_loading import import_string
+from .models import SearchDocument, SearchTerm
+
+FTS_TABLE = 'search_fts'
+
+# Highlight markers around matched words in snippets (see search.engine.highlight)
+MARK_START = '\x02'
+MARK_END = '\x03'
+
+# Title words count this many times more than body words
+TITLE_WEIGHT = 5
+
+MAX_TERM_LENGTH = 64
+SNIPPET_WORDS = 24
+
+# Word characters as FTS5's unicode61 tokenizer sees them: letters and digits
+WORD_RE = re.compile(r'[^\W_]+')
+
+_fts5_available = None
+
+
+def tokenize(text):
+    """Lowercased words of ``text`` without diacritics, like FTS5's 'unicode61 remove_diacritics 2'"""
+    text = unicodedata.normalize('NFKD', text.casefold())
+    text = ''.join(char for char in text if not unicodedata.combining(char))
+    return [word[:MAX_TERM_LENGTH] for word in WORD_RE.findall(text)]
+
+
+def fts5_available(conn=None):
+    """Whether ``conn`` (the default connection) is SQLite built with FTS5"""
+    conn = conn or connection
+    if conn.vendor != 'sqlite':
+        return False
+    with conn.cursor() as cursor:
+        cursor.execute("SELECT sqlite_compileoption_used('ENABLE_FTS5')")
+        return bool(cursor.fetchone()[0])
+
+
+def make_snippet(text, matches, size=SNIPPET_WORDS):
+    """About ``size`` words of ``text`` around its first word for which ``matches(term)`` is true, hits marked"""
+    words = text.split()
+
+    def hit(word):
+        return any(matches(term) for term in tokenize(word))
+
+    first = next((i for i, word in enumerate(words) if hit(word)), 0)
+    start = max(0, first - size // 4)
+    window = words[start:start + size]
+    snippet = ' '.join(f'{MARK_START}{word}{MARK_END}' if hit(word) else word for word in window)
+    if start > 0:
+        snippet = '…' + snippet
+    if start + size < len(words):
+        snippet += '…'
+    return snippet
+
+
+class FTS5Backend:
+    """BM25-ranked search through the FTS5 index, which SQLite maintains itself"""
+
+    def index(self, documents):
+        pass  # the triggers on search_searchdocument keep search_fts current
+
+    def clear(self):
+        pass
+
+    def search(self, terms, prefix, scope, limit):
+        # Words are letters and digits only, so quoting them is safe; every one must match
+        match = ' '.join([f'"{term}"' for term in terms] + ([f'"{prefix}"*'] if prefix else []))
+        where = ''.join(f' AND d.{column} = %s' for column in scope)
+        sql = (
+            f'SELECT d.id, -bm25({FTS_TABLE}, %s, 1.0) AS score, '
+            f'snippet({FTS_TABLE}, -1, %s, %s, %s, %s) '
+            f'FROM {FTS_TABLE} JOIN {SearchDocument._meta.db_table} d ON d.id = {FTS_TABLE}.rowid '
+            f'WHERE {FTS_TABLE} MATCH %s{where} '
+            f'ORDER BY score DESC LIMIT %s'
+        )
+        params = [TITLE_WEIGHT, MARK_START, MARK_END, '…', SNIPPET_WORDS, match, *scope.values(), limit]
+        with connection.cursor() as cursor:
+            cursor.execute(sql, params)
+            return cursor.fetchall()
+
+
+class InvertedIndexBackend:
+    """TF-IDF-ranked search over the SearchTerm table, for databases without FTS5"""
+
+    def _weights(self, document):
+        weights = defaultdict(int)
+        for term in tokenize(document.title):
+            weights[term] += TITLE_WEIGHT
+        for term in tokenize(document.body):
+            weights[term] += 1
+        return weights
+
+    def index(self, documents):
+        SearchTerm.objects.filter(document__in=[document.id for document in documents]).delete()
+        SearchTerm.objects.bulk_create([
+            SearchTerm(term=term, document_id=document.id, weight=weight)
+            for document in documents
+            for term, weight in self._weights(document).items()
+        ], batch_size=1000)
+
+    def clear(self):
+        SearchTerm.objects.all().delete()
+
+    def search(self, terms, prefix, scope, limit):
+        wanted = set(terms)
+        term_filter = Q(term__in=wanted)
+        if prefix:
+            # A range rather than startswith, so the (term, document) index is used on every database
+            term_filter |= Q(term__gte=prefix, term__lt=prefix + '\uffff')
+        postings = SearchTerm.objects.filter(term_filter)
+        if scope:
+            postings = postings.filter(**{f'document__{column}': value for column, value in scope.items()})
+
+        found = defaultdict(dict)
+        for document_id, term, weight in postings.values_list('document_id', 'term', 'weight').iterator():
+            found[document_id][term] = weight
+        # Every word must match, the prefix through any of its completions
+        found = {
+            document_id: weights for document_id, weights in found.items()
+            if wanted <= weights.keys() and (not prefix or any(term.startswith(prefix) for term in weights))
+        }
+        if not found:
+            return []
+
+        matched_terms = {term for weights in found.values() for term in weights}
+        frequencies = dict(SearchTerm.objects.filter(term__in=matched_terms).values('term')
+                           .annotate(count=Count('id')).values_list('term', 'count'))
+        total = SearchDocument.objects.count()
+        idf = {term: math.log(1 + total / frequencies[term]) for term in matched_terms}
+        best = heapq.nlargest(limit, (
+            (sum(weight * idf[term] for term, weight in weights.items()), document_id)
+            for document_id, weights in found.items()
+        ))
+
+        def matches(term):
+            return term in wanted or (prefix and term.startswith(prefix))
+
+        documents = SearchDocument.objects.only('title', 'body').in_bulk([document_id for _, document_id in best])
+        results = []
+        for score, document_id in best:
+            document = documents[document_id]
+            body_hit = any(matches(term) for term in tokenize(document.body))
+            results.append((document_id, score, make_snippet(document.body if body_hit else document.title, matches)))
+        return results
+
+
+def get_backend():
+    """The backend named by SEARCH_BACKEND, or FTS5 where available and the inverted index otherwise"""
+    global _fts5_available
+    path = getattr(settings, 'SEARCH_BACKEND', None)
+    if path:
+        return import_string(path)()
+    if _fts5_available is None:
+        _fts5_available = fts5_available()
+    return FTS5Backend() if _fts5_available else InvertedIndexBackend()
@@ -0,0 +1,150 @@
+"""
+Full-text search over medical records, consultation notes and reports.
+
+Each source row has a SearchDocument holding its searchable text along with
+its patient and doctor, kept current by search.signals. Bulk writes
+(bulk_create, QuerySet.update) send no signals; run ``rebuild_search_index``
+after them. Matching and ranking are done by a backend (see search.backends).
+
+A query matches the documents containing all of its words, the last one as a
+prefix, so that a half-typed word already finds results.
+"""
+from dataclasses import dataclass
+from django.conf import settings
+from django.db import connection, transaction
+from django.urls import reverse
+from django.utils.html import escape
+from django.utils.safestring import mark_safe
+from consultation.models import ConsultationNote
+from reports.models import MedicalRecord, Report
+from .backends import MARK_END, MARK_START, get_backend, tokenize
+from .models import SearchDocument
+
+MAX_QUERY_TERMS = 8
+
+
+def _join(*parts):
+    return '\n'.join(part for part in parts if part)
+
+
+def record_fields(record):
+    return {'title': record.diagnosis, 'body': _join(record.symptoms, record.prescription)}
+
+
+def note_fields(note):
+    return {
+        'title': note.diagnosis,
+        'body': _join(note.chief_complaint, note.history, note.examination, note.treatment_plan, note.follow_up),
+    }
+
+
+def report_fields(report):
+    return {'title': report.title, 'body': report.content}
+
+
+# kind: (model, fields builder, the model fields it reads, detail URL name)
+SOURCES = {
+    'record': (MedicalRecord, record_fields, {'diagnosis', 'symptoms', 'prescription'},
+               'reports:medical_record_detail'),
+    'note': (ConsultationNote, note_fields,
+             {'diagnosis', 'chief_complaint', 'history', 'examination', 'treatment_plan', 'follow_up'},
+             'consultation:note_detail'),
+    'report': (Report, report_fields, {'title', 'content'}, 'reports:report_detail'),
+}
+KINDS = {model: kind for kind, (model, _, _, _) in SOURCES.items()}
+
+
+def get_results_limit():
+    return getattr(settings, 'SEARCH_RESULTS_LIMIT', 50)
+
+
+def _document(kind, instance):
+    _, fields, _, _ = SOURCES[kind]
+    return SearchDocument(
+        kind=kind, object_id=instance.pk, patient_id=instance.patient_id, doctor_id=instance.doctor_id,
+        created_at=instance.created_at, **fields(instance),
+    )
+
+
+def index_object(instance, update_fields=None):
+    """Create or refresh the SearchDocument of a record, note or report"""
+    kind = KINDS[type(instance)]
+    if update_fields is not None and not set(update_fields) & (SOURCES[kind][2] | {'patient', 'doctor'}):
+        return  # e.g. Report.file_path being set
+    new = _document(kind, instance)
+    document, _ = SearchDocument.objects.update_or_create(
+        kind=kind, object_id=instance.pk,
+        defaults={field: getattr(new, field) for field in ('patient_id', 'doctor_id', 'title', 'body', 'created_at')},
+    )
+    get_backend().index([document])
+
+
+def remove_object(instance):
+    SearchDocument.objects.filter(kind=KINDS[type(instance)], object_id=instance.pk).delete()
+
+
+def rebuild_index(batch_size=1000):
+    """Recreate every SearchDocument from the source tables; returns how many were indexed"""
+    backend = get_backend()
+    count = 0
+    with transaction.atomic():
+        backend.clear()
+        with connection.cursor() as cursor:
+            # Without the ORM's cascade collector, which would load every document first
+            cursor.execute(f'DELETE FROM {SearchDocument._meta.db_table}')
+        for kind, (model, _, _, _) in SOURCES.items():
+            batch = []
+            for instance in model.objects.order_by('pk').iterator(chunk_size=batch_size):
+                batch.append(_document(kind, instance))
+                if len(batch) >= batch_size:
+                    backend.index(SearchDocument.objects.bulk_create(batch))
+                    count += len(batch)
+                    batch = []
+            if batch:
+                backend.index(SearchDocument.objects.bulk_create(batch))
+                count += len(batch)
+    return count
+
+
+def parse_query(text):
+    """(words, prefix) of a query: every distinct word but the last, and the last"""
+    words = list(dict.fromkeys(tokenize(text)))[:MAX_QUERY_TERMS]
+    if not words:
+        return [], ''
+    return words[:-1], words[-1]
+
+
+def highlight(snippet):
+    """HTML of a backend snippet, its marked matches in <mark>"""
+    return mark_safe(escape(snippet).replace(MARK_START, '<mark>').replace(MARK_END, '</mark>'))
+
+
+@dataclass
+class SearchResult:
+    document: SearchDocument
+    score: float
+    snippet: str
+
+    @property
+    def url(self):
+        return reverse(SOURCES[self.document.kind][3], args=[self.document.object_id])
+
+
+def search(text, scope=None, limit=None):
+    """The best matches for ``text``, best first, among documents matching ``scope``.
+
+    ``scope`` maps 'patient_id' and/or 'doctor_id' to the value documents
+    must have; empty means all documents.
+    """
+    terms, prefix = parse_query(text)
+    if not prefix:
+        return []
+    scope = scope or {}
+    # Backends put the column names into SQL
+    if not set(scope) <= {'patient_id', 'doctor_id'}:
+        raise ValueError(f'Unknown search scope: {scope}')
+    hits = get_backend().search(terms, prefix, scope, limit or get_results_limit())
+    documents = SearchDocument.objects.select_related(
+        'patient__user_profile__user', 'doctor__user_profile__user',
+    ).in_bulk([document_id for document_id, _, _ in hits])
+    return [SearchResult(documents[document_id], score, highlight(snippet)) for document_id, score, snippet in hits]
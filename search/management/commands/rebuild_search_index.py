@@ -0,0 +1,18 @@
+import time
+from django.core.management.base import BaseCommand
+from search.engine import rebuild_index
+
+
+class Command(BaseCommand):
+    help = 'Rebuild the full-text search index of medical records, consultation notes and reports'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--batch-size', type=int, default=1000,
+                            help='Documents read and written per batch (default: 1000)')
+
+    def handle(self, *args, **options):
+        start = time.perf_counter()
+        count = rebuild_index(batch_size=options['batch_size'])
+        self.stdout.write(self.style.SUCCESS(
+            f'Indexed {count} documents in {time.perf_counter() - start:.1f}s'
+        ))
@@ -0,0 +1,23 @@
+from django.db import migrations
+
+
+def index_existing(apps, schema_editor):
+    # The signals only index rows written from now on; this fills SearchDocument
+    # (and SearchTerm, for the inverted index) with what is already there. It
+    # goes through the engine, and so the current models, rather than the
+    # historical ones: the document fields are the engine's to define.
+    from search.engine import rebuild_index
+    rebuild_index()
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('search', '0002_fts5_index'),
+        ('reports', '0002_query_indexes'),
+        ('consultation', '0006_chat_archive'),
+    ]
+
+    operations = [
+        migrations.RunPython(index_existing, migrations.RunPython.noop),
+    ]
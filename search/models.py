@@ -0,0 +1,49 @@
+from django.db import models
+from accounts.models import PatientProfile, DoctorProfile
+
+# Create your models here.
+
+class SearchDocument(models.Model):
+    """The searchable text of a medical record, consultation note or report.
+
+    Denormalized from the source row (see search.engine) so that matching,
+    ranking and permission filtering need only this table and its index.
+    """
+    KIND_CHOICES = [
+        ('record', 'Medical Record'),
+        ('note', 'Consultation Note'),
+        ('report', 'Report'),
+    ]
+    
+    kind = models.CharField(max_length=10, choices=KIND_CHOICES)
+    object_id = models.PositiveBigIntegerField()
+    patient = models.ForeignKey(PatientProfile, on_delete=models.CASCADE, related_name='+')
+    doctor = models.ForeignKey(DoctorProfile, on_delete=models.SET_NULL, null=True, related_name='+')
+    
+    title = models.TextField()
+    body = models.TextField()
+    created_at = models.DateTimeField()
+    
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(fields=['kind', 'object_id'], name='unique_search_document'),
+        ]
+    
+    def __str__(self):
+        return f"{self.get_kind_display()} {self.object_id}"
+
+
+class SearchTerm(models.Model):
+    """Inverted index entry for databases without FTS5: a term and its weight in one document"""
+    term = models.CharField(max_length=64)
+    document = models.ForeignKey(SearchDocument, on_delete=models.CASCADE, related_name='terms')
+    weight = models.PositiveIntegerField()
+    
+    class Meta:
+        constraints = [
+            # Also the index for term lookups and prefix ranges
+            models.UniqueConstraint(fields=['term', 'document'], name='unique_search_term'),
+        ]
+    
+    def __str__(self):
+        return f"{self.term} in {self.document_id}"
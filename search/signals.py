@@ -0,0 +1,20 @@
+from django.db.models.signals import post_save, post_delete
+from django.dispatch import receiver
+from consultation.models import ConsultationNote
+from reports.models import MedicalRecord, Report
+from .engine import index_object, remove_object
+
+
+@receiver(post_save, sender=MedicalRecord)
+@receiver(post_save, sender=ConsultationNote)
+@receiver(post_save, sender=Report)
+def index_saved(sender, instance, update_fields=None, **kwargs):
+    """Index the new text in the same transaction as the save"""
+    index_object(instance, update_fields)
+
+
+@receiver(post_delete, sender=MedicalRecord)
+@receiver(post_delete, sender=ConsultationNote)
+@receiver(post_delete, sender=Report)
+def unindex_deleted(sender, instance, **kwargs):
+    remove_object(instance)
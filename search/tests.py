@@ -0,0 +1,157 @@
+from datetime import datetime
+from importlib import import_module
+from io import StringIO
+from django.apps import apps
+from django.core.management import call_command
+from django.test import TestCase, override_settings
+from django.contrib.auth.models import User
+from django.urls import reverse
+from django.utils import timezone
+from accounts.models import UserProfile, DoctorProfile, PatientProfile
+from appointments.models import Appointment
+from consultation.models import ConsultationNote
+from reports.models import MedicalRecord, Report
+from . import engine
+from .backends import fts5_available
+from .models import SearchDocument, SearchTerm
+
+INVERTED = 'search.backends.InvertedIndexBackend'
+
+
+class SearchTests(TestCase):
+    """Test cases for full-text search over records, notes and reports"""
+
+    def setUp(self):
+        """Set up two doctors, each with a patient, a record, a note and a report"""
+        self.doctors, self.patients = [], []
+        for i, name in enumerate(['House', 'Wilson']):
+            user = User.objects.create_user(username=f'searchdoctor{i}', first_name='Greg', last_name=name)
+            self.doctors.append(DoctorProfile.objects.create(
+                user_profile=UserProfile.objects.create(user=user, user_type='doctor'),
+                specialization='Cardiology',
+                qualification='MD',
+                license_number=f'SEARCH{i}'
+            ))
+            user = User.objects.create_user(username=f'searchpatient{i}', first_name='Pat', last_name=str(i))
+            self.patients.append(PatientProfile.objects.create(
+                user_profile=UserProfile.objects.create(user=user, user_type='patient')
+            ))
+        self.record = MedicalRecord.objects.create(
+            patient=self.patients[0], doctor=self.doctors[0], diagnosis='Community-acquired pneumonia',
+            symptoms='Productive cough and fièvre for five days', prescription='Amoxicillin 500mg'
+        )
+        self.other_record = MedicalRecord.objects.create(
+            patient=self.patients[1], doctor=self.doctors[1], diagnosis='Viral pneumonia',
+            symptoms='Dry cough', prescription='Rest'
+        )
+        appointment = Appointment.objects.create(
+            patient=self.patients[0], doctor=self.doctors[0], appointment_date=timezone.localdate(),
+            appointment_time=datetime.min.time(), reason='Checkup'
+        )
+        self.note = ConsultationNote.objects.create(
+            appointment=appointment, doctor=self.doctors[0], patient=self.patients[0],
+            chief_complaint='Chest pain on exertion', diagnosis='Stable angina', treatment_plan='Nitroglycerin'
+        )
+        self.report = Report.objects.create(
+            patient=self.patients[0], doctor=self.doctors[0], report_type='lab',
+            title='Blood panel', content='Cholesterol <elevated>, glucose normal. No pneumonia markers.'
+        )
+
+    def _kinds(self, query, scope=None):
+        return [(result.document.kind, result.document.object_id) for result in engine.search(query, scope)]
+
+    def test_fts5_is_used_on_sqlite(self):
+        """Test that the FTS5 index exists on this database"""
+        self.assertTrue(fts5_available())
+
+    def test_matches_are_ranked_and_scoped(self):
+        """Test that the title match ranks first and other doctors' documents are excluded"""
+        self.assertEqual(self._kinds('pneumonia', {'doctor_id': self.doctors[0].id}),
+                         [('record', self.record.id), ('report', self.report.id)])
+        self.assertEqual(self._kinds('pneumonia', {'patient_id': self.patients[1].id}),
+                         [('record', self.other_record.id)])
+        self.assertEqual(len(self._kinds('pneumonia')), 3)
+
+    def test_all_words_must_match_and_last_is_prefix(self):
+        """Test that queries require every word and complete the last one"""
+        self.assertEqual(self._kinds('cough amox'), [('record', self.record.id)])
+        self.assertEqual(self._kinds('chest angin'), [('note', self.note.id)])
+        self.assertEqual(self._kinds('cough angina'), [])
+        self.assertEqual(self._kinds('  ?! '), [])
+
+    def test_diacritics_are_ignored(self):
+        """Test that accented and unaccented spellings match each other"""
+        self.assertEqual(self._kinds('fievre'), [('record', self.record.id)])
+        self.assertEqual(self._kinds('FIÈVRE'), [('record', self.record.id)])
+
+    def test_snippet_is_escaped_and_highlighted(self):
+        """Test that snippets escape the document text and mark the matches"""
+        result = engine.search('cholesterol')[0]
+        self.assertIn('<mark>Cholesterol</mark>', result.snippet)
+        self.assertIn('&lt;elevated&gt;', result.snippet)
+        self.assertEqual(result.url, reverse('reports:report_detail', args=[self.report.id]))
+
+    def test_index_follows_saves_and_deletes(self):
+        """Test that edits are searchable immediately and deleted documents disappear"""
+        self.record.diagnosis = 'Bronchitis'
+        self.record.save()
+        self.assertEqual(self._kinds('bronchitis'), [('record', self.record.id)])
+        self.assertNotIn(('record', self.record.id), self._kinds('pneumonia'))
+        self.note.delete()
+        self.assertEqual(self._kinds('angina'), [])
+        self.assertFalse(SearchDocument.objects.filter(kind='note').exists())
+
+    def test_rebuild_indexes_bulk_created_rows(self):
+        """Test that the rebuild command picks up rows written without signals"""
+        MedicalRecord.objects.bulk_create([MedicalRecord(
+            patient=self.patients[1], doctor=self.doctors[1], diagnosis='Gout', symptoms='Toe pain',
+            prescription='Colchicine'
+        )])
+        self.assertEqual(self._kinds('colchicine'), [])
+        out = StringIO()
+        call_command('rebuild_search_index', '--batch-size', '2', stdout=out)
+        self.assertIn('Indexed 5 documents', out.getvalue())
+        self.assertEqual(len(self._kinds('colchicine')), 1)
+        self.assertEqual(len(self._kinds('pneumonia')), 3)
+
+    @override_settings(SEARCH_BACKEND=INVERTED)
+    def test_migration_indexes_existing_rows(self):
+        """Test that migrating an existing database indexes the rows written before the search app"""
+        migration = import_module('search.migrations.0003_index_existing_rows')
+        SearchDocument.objects.all().delete()
+        migration.index_existing(apps, None)
+        self.assertEqual(SearchDocument.objects.count(), 4)
+        self.assertTrue(SearchTerm.objects.exists())
+        self.assertEqual(len(self._kinds('pneumonia')), 3)
+
+    @override_settings(SEARCH_BACKEND=INVERTED)
+    def test_inverted_index_matches_fts5(self):
+        """Test that the fallback inverted index gives the same results"""
+        engine.rebuild_index()
+        self.assertTrue(SearchTerm.objects.exists())
+        self.assertEqual(self._kinds('pneumonia', {'doctor_id': self.doctors[0].id}),
+                         [('record', self.record.id), ('report', self.report.id)])
+        self.assertEqual(self._kinds('cough amox'), [('record', self.record.id)])
+        self.assertEqual(self._kinds('fievre'), [('record', self.record.id)])
+        self.assertEqual(self._kinds('cough angina'), [])
+        self.assertIn('<mark>Cholesterol</mark>', engine.search('cholest')[0].snippet)
+
+        self.record.diagnosis = 'Bronchitis'
+        self.record.save()
+        self.assertEqual(self._kinds('bronchitis'), [('record', self.record.id)])
+        self.record.delete()
+        self.assertEqual(self._kinds('bronchitis'), [])
+
+    def test_search_page_is_scoped_to_user(self):
+        """Test that patients only find their own documents and users without a profile are turned away"""
+        self.client.force_login(self.patients[1].user_profile.user)
+        response = self.client.get(reverse('search:search'), {'q': 'pneumonia'})
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual([result.document.object_id for result in response.context['results']],
+                         [self.other_record.id])
+        self.assertContains(response, '<mark>pneumonia</mark>')
+        self.assertContains(response, reverse('reports:medical_record_detail', args=[self.other_record.id]))
+
+        self.client.force_login(User.objects.create_user(username='noprofile'))
+        response = self.client.get(reverse('search:search'), {'q': 'pneumonia'})
+        self.assertRedirects(response, reverse('dashboard:home'), fetch_redirect_response=False)
@@ -0,0 +1,32 @@
+from django.shortcuts import render, redirect
+from django.contrib.auth.decorators import login_required
+from django.contrib import messages
+from . import engine
+
+# Create your views here.
+
+@login_required
+def search(request):
+    """Search the medical records, consultation notes and reports the user can see"""
+    actor = request.actor
+    
+    # Same scope as the list pages: doctors search what they wrote, patients their own history
+    if actor.is_doctor:
+        scope = {'doctor_id': actor.doctor_profile.id}
+    elif actor.is_patient:
+        scope = {'patient_id': actor.patient_profile.id}
+    elif request.user.is_staff:
+        scope = {}
+    else:
+        messages.error(request, 'You do not have permission to search records.')
+        return redirect('dashboard:home')
+    
+    query = request.GET.get('q', '').strip()
+    results = engine.search(query, scope) if query else []
+    
+    context = {
+        'query': query,
+        'results': results,
+        'user_profile': actor.user_profile,
+    }
+    return render(request, 'search/search.html', context)
@@ -3,7 +3,6 @@ from django.contrib.auth.decorators import login_required
 from django.contrib import messages
 from django.contrib.auth import update_session_auth_hash
 from django.contrib.auth.forms import PasswordChangeForm
-from accounts.models import UserProfile
 from .models import UserSettings, SystemSettings
 
 # Create your views here.
@@ -11,7 +10,7 @@ from .models import UserSettings, SystemSettings
 @login_required
 def user_settings(request):
     """User settings page"""
-    user_profile = UserProfile.objects.get(user=request.user)
+    user_profile = request.actor.user_profile
     user_settings_obj, created = UserSettings.objects.get_or_create(user=request.user)
     
     if request.method == 'POST':